@@ -0,0 +1,274 @@
+#!/usr/bin/env python
+"""
+An archive of the raw pages the scraper extracted data from.
+
+With `ARCHIVE_DIR` set, every worker process appends the pages it parses to
+its own file there, along with where they came from (subject, course, term,
+...). When the parser is fixed, the data can be extracted again from the
+archive on all the cores instead of scraping SOLUS again:
+
+    python archive.py extract [ARCHIVE_DIR] [--output DIR] [--processes N]
+    python archive.py stats [ARCHIVE_DIR]
+
+Each record in a file is a line of JSON describing it, followed by the
+zlib-compressed page. Records are only ever appended, so a file is readable
+up to the last complete record even if its worker died while writing.
+"""
+
+import os
+import json
+import time
+import glob
+import zlib
+import socket
+import logging
+import argparse
+from collections import OrderedDict
+from multiprocessing import Pool, cpu_count
+
+import parsecache
+
+try:
+    from config import ARCHIVE_DIR
+except ImportError:
+    ARCHIVE_DIR = None
+
+# The records that hold a whole page of data, the deep pages go with the page they were visited from
+PAGE_KINDS = ("subjects", "course", "sections", "search")
+DEEP_KINDS = ("section", "search_section")
+
+# How many of the latest pages to remember so repeats aren't archived again
+SEEN_SIZE = 1024
+
+
+class Archive(object):
+    """Appends pages to a file in `directory` (a new one for every process)"""
+
+    def __init__(self, directory=ARCHIVE_DIR):
+        self.directory = directory
+        self.filename = None
+        self._file = None
+        self._next_id = 0
+
+        # Pages that come up more than once (ex: a letter page split between jobs) are only kept once
+        self._seen = OrderedDict()
+
+    def add(self, kind, body, **context):
+        """Archives a page, returns the id of its record (to refer to it from others)"""
+
+        key = (kind, json.dumps(context, sort_keys=True), parsecache.digest(body))
+        if key in self._seen:
+            self._seen[key] = self._seen.pop(key)
+            return self._seen[key]
+
+        if self._file is None:
+            try:
+                os.makedirs(self.directory)
+            except OSError:
+                pass
+            name = u"{0}-{1}-{2}.arc".format(socket.gethostname(), os.getpid(), time.strftime("%Y%m%d-%H%M%S"))
+            self.filename = os.path.join(self.directory, name)
+            self._file = open(self.filename, "ab")
+
+        record_id = self._seen[key] = self._next_id
+        self._next_id += 1
+        while len(self._seen) > SEEN_SIZE:
+            self._seen.popitem(last=False)
+
+        data = zlib.compress(body)
+        header = dict(id=record_id, kind=kind, context=context, size=len(data), t=round(time.time(), 3))
+        self._file.write(json.dumps(header, sort_keys=True).encode("utf-8") + b"\n" + data)
+
+        # Workers can exit without cleaning up (ex: when they're recycled)
+        self._file.flush()
+        return record_id
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_headers(filename):
+    """Yields the (offset of the page, header) of every complete record in an archive file"""
+    with open(filename, "rb") as f:
+        end = os.fstat(f.fileno()).st_size
+        while True:
+            line = f.readline()
+            if not line.endswith(b"\n"):
+                return
+            header = json.loads(line.decode("utf-8"))
+            offset = f.tell()
+            if offset + header["size"] > end:
+                logging.warning(u"%s ends with an incomplete record", filename)
+                return
+            yield offset, header
+            f.seek(header["size"], os.SEEK_CUR)
+
+
+def read_page(f, offset, header):
+    f.seek(offset)
+    return zlib.decompress(f.read(header["size"]))
+
+
+def groups(filenames):
+    """
+    Returns the work for `extract`: lists of the (filename, offset, header) of
+    a page record, followed by those of the deep pages visited from it.
+    They're in the order the pages were archived in (across all the files).
+    """
+    ret = []
+    for filename in filenames:
+        pages = {}
+        for offset, header in read_headers(filename):
+            if header["kind"] in PAGE_KINDS:
+                pages[header["id"]] = [(filename, offset, header)]
+                ret.append(pages[header["id"]])
+            elif header["context"].get("page") in pages:
+                pages[header["context"]["page"]].append((filename, offset, header))
+            else:
+                logging.warning(u"Deep page without its section list in %s, skipping it", filename)
+
+    # Later pages overwrite the data of earlier ones (ex: a deep tier after a shallow one), like when scraping
+    ret.sort(key=lambda x: (x[0][2]["t"], x[0][0], x[0][2]["id"]))
+    return ret
+
+
+#-----------------------Extraction (in the worker processes)-----------------------------
+
+_parser = None
+
+
+def _init_worker():
+    global _parser
+
+    from parser import SolusParser
+    from parsecache import ParseCache
+
+    # Stored results came from the old parser, that's what's being replaced
+    _parser = SolusParser()
+    _parser.cache = ParseCache(size=0, path=None)
+
+
+def _extract_group(group):
+    """
+    Extracts the data from a page and its deep pages.
+    Returns a list of the (kind, data) to write out, None if it couldn't be extracted.
+    """
+
+    from models import Section
+    from scraper import complete_section
+
+    ret = []
+    try:
+        pages = []
+        with open(group[0][0], "rb") as f:
+            for filename, offset, header in group:
+                pages.append((header, read_page(f, offset, header)))
+
+        (header, body), deep_pages = pages[0], pages[1:]
+        context = header["context"]
+        _parser.update_html(body, "utf-8")
+
+        if header["kind"] == "subjects":
+            for subject in _parser.all_subjects():
+                ret.append(("subjects", subject))
+
+        elif header["kind"] == "course":
+            course = _parser.course_attrs()
+            course["basic"]["subject"] = context["subject"]
+            ret.append(("courses", course))
+
+        else:
+            if header["kind"] == "sections":
+                sections = [(context["course"], x) for x in _parser.all_section_data()]
+                deep_key = "section"
+            else:
+                sections = list(_parser.all_search_sections())
+                deep_key = "class_num"
+
+            # Parse the deep pages before the parser moves on from the section list
+            deep = {}
+            for deep_header, deep_body in deep_pages:
+                _parser.update_html(deep_body, "utf-8")
+                deep[deep_header["context"][deep_key]] = _parser.section_deep_attrs()
+
+            for number, section in sections:
+                section = Section.from_dict(section)
+                if context.get("deep_status") and section.status != context["deep_status"]:
+                    continue
+                key = section.unique if deep_key == "section" else section.class_num
+                if key in deep:
+                    section.add_deep_attrs(deep[key])
+                ret.append(("sections", complete_section(section, number, context["subject"], context["term"])))
+
+    except Exception:
+        logging.exception(u"Couldn't extract the %s page %s from %s", group[0][2]["kind"], group[0][2]["context"], group[0][0])
+        return None
+
+    return ret
+
+
+def extract(directory=ARCHIVE_DIR, output_dir=None, processes=None):
+    """
+    Extracts the data from all the archives in `directory` again, using `processes` processes (all the cores by default).
+    The data is written out in the order the pages were archived in.
+    """
+
+    import writer
+
+    if output_dir:
+        writer.OUTPUT_DIR = output_dir
+    write = dict(subjects=writer.write_subject, courses=writer.write_course, sections=writer.write_section)
+
+    start = time.time()
+    filenames = sorted(glob.glob(os.path.join(directory, "*.arc")))
+    work = groups(filenames)
+    logging.info(u"Extracting %s pages from %s archive files", len(work), len(filenames))
+
+    totals = {}
+    pool = Pool(processes or cpu_count(), initializer=_init_worker)
+    try:
+        for items in pool.imap(_extract_group, work, chunksize=8):
+            if items is None:
+                totals["errors"] = totals.get("errors", 0) + 1
+                continue
+            for kind, data in items:
+                write[kind](data)
+                totals[kind] = totals.get(kind, 0) + 1
+    finally:
+        pool.close()
+        pool.join()
+
+    logging.info(u"Extracted %s in %.1fs", ", ".join(u"{0} {1}".format(v, k) for k, v in sorted(totals.items())) or "nothing", time.time() - start)
+    return totals
+
+
+def stats(directory=ARCHIVE_DIR):
+    """Returns the number of records and bytes of each kind of page in the archive"""
+    ret = {}
+    for filename in glob.glob(os.path.join(directory, "*.arc")):
+        for offset, header in read_headers(filename):
+            kind = ret.setdefault(header["kind"], dict(records=0, compressed_bytes=0))
+            kind["records"] += 1
+            kind["compressed_bytes"] += header["size"]
+    return ret
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="[%(asctime)s][%(levelname)s][%(processName)s]: %(message)s")
+
+    parser = argparse.ArgumentParser(description="Works with archives of the raw SOLUS pages")
+    parser.add_argument("command", choices=("extract", "stats"))
+    parser.add_argument("directory", nargs="?", default=ARCHIVE_DIR, help="the ARCHIVE_DIR of the scrape")
+    parser.add_argument("--output", help="where to write the data (OUTPUT_DIR by default)")
+    parser.add_argument("--processes", type=int, help="number of processes to extract with (one per core by default)")
+    args = parser.parse_args()
+
+    if not args.directory:
+        parser.error("no archive directory given, and ARCHIVE_DIR isn't set")
+
+    if args.command == "extract":
+        extract(args.directory, args.output, args.processes)
+    else:
+        print(json.dumps(stats(args.directory), indent=4, sort_keys=True))
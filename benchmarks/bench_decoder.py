@@ -0,0 +1,99 @@
+"""
+Benchmarks decoding of meeting table cells with and without the memoized decoder.
+
+Usage: python benchmarks/bench_decoder.py [saved_course_page.html ...]
+"""
+
+import re
+import sys
+import timeit
+from datetime import datetime
+
+import corpus
+
+import decoder
+from parser import SolusParser
+
+
+def naive_decode(values, instructor):
+    """The decoding `section_attrs_at_index` did before the decoder was added"""
+    TIME_INFO = re.compile("(\d+:\d+[AP]M)")
+    DATE_INFO = re.compile("^([\S]+)\s*-\s*([\S]+)$")
+
+    instructors = []
+    if instructor and instructor not in decoder.NON_INSTRUCTORS:
+        lis = re.sub(r'\s+', ' ', instructor).split(",")
+        for i in range(0, len(lis), 2):
+            instructors.append(u"{0}, {1}".format(lis[i].strip(), lis[i+1].strip()))
+
+    m = TIME_INFO.search(values[1])
+    start_time = datetime.strptime(m.group(1), "%I:%M%p").time() if m else None
+    m = TIME_INFO.search(values[2])
+    end_time = datetime.strptime(m.group(1), "%I:%M%p").time() if m else None
+
+    m = DATE_INFO.search(values[4])
+    term_start = datetime.strptime(m.group(1), "%Y/%m/%d").date() if m else None
+    term_end = datetime.strptime(m.group(2), "%Y/%m/%d").date() if m else None
+
+    days = []
+    all_days = values[0].lower()
+    while len(all_days) > 0:
+        day_abbr = all_days[-2:]
+        all_days = all_days[:-2]
+        if day_abbr in decoder.DAY_MAP:
+            days.append(decoder.DAY_MAP[day_abbr])
+        else:
+            days = [None]
+            break
+
+    return days, start_time, end_time, instructors, term_start, term_end
+
+
+def memoized_decode(values, instructor):
+    return (decoder.decode_days(values[0]), decoder.decode_time(values[1]), decoder.decode_time(values[2]),
+            decoder.decode_instructors(instructor)) + decoder.decode_date_range(values[4])
+
+
+def extract_rows(pages):
+    """Pulls the raw meeting rows out of the pages"""
+    p = SolusParser()
+    rows = []
+    for page in pages:
+        p.update_html(page)
+        for table in p.soup.find_all("table", id=re.compile("CLASS_MTGPAT\$scroll\$[0-9]+")):
+            values = [p._clean_html(x.string) for x in table.find_all("span", {"class": "PSEDITBOX_DISPONLY"})]
+            insts = [x.string for x in table.find_all("span", {"class": "PSLONGEDITBOX"})]
+            for x in range(0, len(values), 5):
+                rows.append((values[x:x+5], insts[x//5]))
+    return rows
+
+
+def main(args):
+    pages = corpus.load_pages(args)
+    rows = extract_rows(pages)
+    print("Corpus: {0} pages, {1} meeting rows".format(len(pages), len(rows)))
+
+    def run(func):
+        for values, instructor in rows:
+            func(values, instructor)
+
+    number = 20
+    naive = min(timeit.repeat(lambda: run(naive_decode), number=number, repeat=3)) / number
+
+    decoder.cache_clear()
+    memo = min(timeit.repeat(lambda: run(memoized_decode), number=number, repeat=3)) / number
+
+    print("naive:    {0:8.2f} us/row".format(naive / len(rows) * 1e6))
+    print("memoized: {0:8.2f} us/row ({1:.1f}x)".format(memo / len(rows) * 1e6, naive / memo))
+
+    # End to end, the time spent in `all_section_data`
+    p = SolusParser()
+    total = 0
+    for page in pages:
+        p.update_html(page)
+        total += min(timeit.repeat(lambda: list(p.all_section_data()), number=1, repeat=3))
+    print("all_section_data over the corpus: {0:.1f} ms".format(total * 1e3))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,138 @@
+"""
+Benchmarks walking the catalog of a letter (every subject and course, like a
+shallow scrape) with and without the navigation map (see `navmap`).
+
+Both walks make the same requests, PeopleSoft only accepts the actions of the
+links on the current page. With the map, the pages in between (the letter page
+before a subject is dropped down or rolled up, the subject page before each
+course) aren't parsed.
+
+Usage: python benchmarks/bench_navigation.py [num_subjects] [num_courses]
+"""
+
+import sys
+import time
+from collections import deque
+
+import corpus
+
+import requests
+
+import navigation
+from navigation import SolusSession
+from navmap import NavigationMap
+from parser import SolusParser
+
+RETURN_ACTIONS = ("DERIVED_SAA_CRS_RETURN_PB", "DERIVED_SSS_SEL_RETURN_PB")
+
+
+class FakeCatalog(object):
+    """Stands in for the `requests` session, answers the catalog's actions like SOLUS does"""
+
+    def __init__(self, subjects):
+        self.subjects = subjects
+        self.course_page = corpus.course_page(10)
+        self.open_subject = None
+        self.in_course = False
+        self.state = 0
+
+    def post(self, url, data=None, **kwargs):
+        action = data["ICAction"]
+        if action.startswith("DERIVED_SSS_BCC_GROUP_BOX_1$"):
+            index = int(action.rsplit("$", 1)[1])
+            self.open_subject = None if index == self.open_subject else index
+        elif action.startswith("CRSE_NBR$"):
+            self.in_course = True
+        elif action in RETURN_ACTIONS:
+            self.in_course = False
+
+        # Every page has a new state number, so none are the same as one already parsed
+        self.state += 1
+        if self.in_course:
+            body = self.course_page.replace('name="ICStateNum" value="0"', 'name="ICStateNum" value="{0}"'.format(self.state))
+        else:
+            body = corpus.catalog_page(self.subjects, self.open_subject, self.state)
+
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response._content = body.encode("utf-8")
+        return response
+
+
+class CountingParser(SolusParser):
+    """Counts the pages that are parsed"""
+
+    parses = 0
+
+    def update_html(self, markup, encoding=None):
+        self.parses += 1
+        return SolusParser.update_html(self, markup, encoding)
+
+
+def make_session(subjects, nav_map):
+    """Returns a session on the catalog page of a letter, without logging in"""
+    session = SolusSession.__new__(SolusSession)
+    session.name = session.heartbeat = None
+    session.session = FakeCatalog(subjects)
+    session._parser = CountingParser()
+    session._update_parser = False
+    session.nav_map = nav_map
+    session.latest_response = session.latest_content = None
+    session.history = deque(maxlen=0)
+    session.request_count = session.recovery_count = 0
+    session.recovery_state = -1
+    session.recovery_stack = [None, None, None, None, None]
+    session.select_alphanum("C")
+    return session
+
+
+def walk(session):
+    """Opens every subject and course of the letter, the way `SolusScraper` does"""
+    for subject in session.parser.all_subjects():
+        session.dropdown_subject(subject["_unique"])
+        for course_unique in session.parser.all_courses():
+            session.open_course(course_unique)
+            session.parser.course_attrs()
+            session.return_from_course()
+        session.rollup_subject(subject["_unique"])
+
+
+def run(subjects, nav_map):
+    session = make_session(subjects, nav_map)
+    start = time.time()
+    walk(session)
+    return time.time() - start, session
+
+
+def main(args):
+    num_subjects = int(args[0]) if args else 20
+    num_courses = int(args[1]) if len(args) > 1 else 15
+    subjects = corpus.catalog_subjects(num_subjects, num_courses)
+    navigation.STREAM_PARSE = False
+    print("Catalog: {0} subjects with {1} courses each".format(num_subjects, num_courses))
+
+    # The first walk fills the map, the second one uses it
+    nav_map = NavigationMap(None)
+    results = [("without map", run(subjects, None)),
+               ("filling map", run(subjects, nav_map)),
+               ("with map", run(subjects, nav_map))]
+
+    # A subject added to the start of the letter moves all the links, none of the saved actions work
+    moved = [(u"C - New Subject", subjects[0][1])] + subjects
+    results += [("moved, none", run(moved, None)),
+                ("moved, map", run(moved, nav_map))]
+
+    base = results[0][1][0]
+    for name, (elapsed, session) in results:
+        print("{0:12s} {1:5d} requests {2:5d} parses {3:8.1f} ms ({4:.2f}x)".format(
+            name, session.request_count, session._parser.parses, elapsed * 1e3, base / elapsed))
+    print("Map: {0}".format(nav_map.stats))
+
+    # The map must never cost requests, even when it's out of date
+    assert results[2][1][1].request_count == results[0][1][1].request_count
+    assert results[4][1][1].request_count == results[3][1][1].request_count
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,93 @@
+"""
+Benchmarks the CPU time spent handling each SOLUS response before the scraper
+can use it: getting the body, checking for a Data Integrity Error, and parsing.
+
+Compares decoding the body to text (the old way) with keeping it as bytes in
+`SolusSession`, for responses with and without a charset in their headers.
+
+Usage: python benchmarks/bench_responses.py [saved_course_page.html ...]
+"""
+
+import sys
+import timeit
+
+import corpus
+
+import bs4
+import requests
+from requests.structures import CaseInsensitiveDict
+
+import navigation
+from navigation import SolusSession
+from parser import SolusParser
+from parsecache import ParseCache
+
+
+def make_response(body, content_type):
+    """Returns a response like the ones `requests` makes, without the network"""
+    response = requests.Response()
+    response.status_code = 200
+    response._content = body
+    response.headers = CaseInsensitiveDict()
+    if content_type:
+        response.headers["Content-Type"] = content_type
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+    return response
+
+
+def text_first(response):
+    """What `SolusSession` did before: decode, check for errors, then parse the text"""
+    text = response.text
+    is_die = "Data Integrity Error" in text
+    soup = bs4.BeautifulSoup(text, "lxml")
+    return is_die, soup
+
+
+def bytes_first(session, response):
+    """The real code path of `SolusSession`"""
+    session.latest_response = response
+    session._update_attrs()
+    is_die = session._is_data_integrity_error()
+    return is_die, session.parser.soup
+
+
+def main(args):
+    pages = [page.encode("utf-8") for page in corpus.load_pages(args)]
+    print("Corpus: {0} pages, {1:.0f} KB".format(len(pages), sum(len(x) for x in pages) / 1024.0))
+
+    # A session that hasn't logged in, only the response handling is used
+    session = SolusSession.__new__(SolusSession)
+    session._parser = SolusParser()
+    # The same pages are parsed over and over, don't let them come from the cache
+    session._parser.cache = ParseCache(size=0)
+    session._update_parser = False
+    navigation.STREAM_PARSE = False
+
+    for content_type in ("text/html; charset=UTF-8", None):
+        print(u"\nContent-Type: {0}".format(content_type or "(none, so requests detects the charset)"))
+
+        def run(func):
+            for page in pages:
+                func(make_response(page, content_type))
+
+        number = 3
+        old = min(timeit.repeat(lambda: run(text_first), number=number, repeat=3)) / number / len(pages)
+        new = min(timeit.repeat(lambda: run(lambda r: bytes_first(session, r)), number=number, repeat=3)) / number / len(pages)
+
+        print("text first:  {0:8.2f} ms/response".format(old * 1e3))
+        print("bytes first: {0:8.2f} ms/response ({1:.1f}x, {2:.2f} ms saved)".format(new * 1e3, old / new, (old - new) * 1e3))
+
+    # The parts that don't involve parsing
+    page = pages[-1]
+    response = make_response(page, None)
+    print("\nLargest page, without parsing:")
+    print("  .text (detecting the charset): {0:8.3f} ms".format(min(timeit.repeat(lambda: response.text, number=3, repeat=3)) / 3 * 1e3))
+    print("  .content.decode():             {0:8.3f} ms".format(min(timeit.repeat(lambda: page.decode("utf-8"), number=3, repeat=3)) / 3 * 1e3))
+    text = page.decode("utf-8")
+    print("  error check on text:           {0:8.3f} ms".format(min(timeit.repeat(lambda: "Data Integrity Error" in text, number=100, repeat=3)) / 100 * 1e3))
+    session.latest_content = page
+    print("  bounded error check on bytes:  {0:8.3f} ms".format(min(timeit.repeat(session._is_data_integrity_error, number=100, repeat=3)) / 100 * 1e3))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,64 @@
+"""
+Benchmarks `SolusParser.all_section_data` on course pages with many sections,
+against looking up the tables of each section separately (what it did before).
+
+Usage: python benchmarks/bench_sections.py [saved_course_page.html ...]
+"""
+
+import sys
+import timeit
+
+import corpus
+
+from parser import SolusParser
+
+
+def per_section_lookup(p):
+    """The lookups `all_section_data` did before, searching the page again for each section"""
+    soup = p.soup
+    tables = soup.find_all("table", id=p.ALL_SECTION_TABLES)
+    ret = []
+    for i in range(len(tables)):
+        basic = {}
+        link_tag = tables[i].find("a", id="CLASS_SECTION${0}".format(i))
+        if not link_tag:
+            continue
+        m = p.SECTION_INFO.search(link_tag.get_text())
+        if not m:
+            continue
+        basic["solus_id"], basic["type"], basic["class_num"] = m.groups()
+
+        for status in ("Open", "Closed"):
+            if tables[i].find("img", alt=status):
+                basic["status"] = status
+                break
+        else:
+            basic["status"] = None
+
+        classes = p._section_attrs_in(soup, i)
+        if classes is None:
+            continue
+        ret.append({"_unique": link_tag.get_text(), "basic": basic, "classes": classes})
+    return ret
+
+
+def main(args):
+    pages = corpus.load_pages(args, num_sections=(50, 200, 500, 1000))
+
+    p = SolusParser()
+    for page in pages:
+        p.update_html(page)
+
+        new = list(p.all_section_data())
+        if per_section_lookup(p) != new:
+            print("Outputs differ!")
+            return 1
+
+        old_time = min(timeit.repeat(lambda: per_section_lookup(p), number=1, repeat=3))
+        new_time = min(timeit.repeat(lambda: list(p.all_section_data()), number=1, repeat=3))
+        print("{0:5} sections: per section {1:8.1f} ms, single pass {2:8.1f} ms ({3:.1f}x)".format(
+            len(new), old_time * 1e3, new_time * 1e3, old_time / new_time))
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
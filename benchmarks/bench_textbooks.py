@@ -0,0 +1,89 @@
+"""
+Benchmarks extracting the books from bookstore course pages.
+
+Compares looking up every field by id (the old way) with the single pass
+extraction in `TextbookScraper.book_fields`, with and without lxml.
+
+Usage: python benchmarks/bench_textbooks.py [saved_bookstore_page.html ...]
+"""
+
+import sys
+import timeit
+
+import corpus
+
+import textbooks
+from bs4 import BeautifulSoup
+
+
+def lookup_books(scraper, link, text):
+    """The id-per-field extraction `TextbookScraper.scrape` did before `book_fields`"""
+    b = BeautifulSoup(text, "lxml")
+    ret = []
+    for i in range(0, 99, 2):
+        book_id = textbooks.BOOK_ID_FORMAT.format(i, "ModeFull")
+        book = b.find("div", {"id": book_id})
+        if not book:
+            break
+        temp = book.find("table").find("table").find_all("td")[1]
+
+        def field(name, tag="span"):
+            return temp.find(tag, {"id": textbooks.BOOK_ID_FORMAT.format(i, name)}).string
+
+        attrs = {"listing_url": link + "#" + book_id, "title": field("BookTitle")}
+        authors = field("BookAuthor")
+        if authors and authors[:4] == " by ":
+            attrs["authors"] = authors[4:]
+        required = field("StatusLabel")
+        if required and "REQUIRED" in required.upper():
+            attrs["required"] = True
+        for key, name in (("isbn_13", "ISBN13Label"), ("isbn_10", "ISBN10Label")):
+            value = field(name)
+            attrs[key] = None if value and "[N/A]" in value else value
+        for prefix in ("new", "used"):
+            price = scraper.price(field(prefix.capitalize() + "PriceLabel"))
+            available = scraper.num_available(field(prefix.capitalize() + "AvailabilityLabel"))
+            if price:
+                attrs[prefix + "_price"] = price
+            if available:
+                attrs[prefix + "_available"] = available
+        classified_info = field("ClassifiedsLabel", "a")
+        if classified_info:
+            attrs["classified_info"] = classified_info
+        if attrs["isbn_10"] or attrs["isbn_13"]:
+            ret.append(attrs)
+    return ret
+
+
+def main(args):
+    pages = corpus.load_bookstore_pages(args)
+    scraper = textbooks.TextbookScraper(dict(letters=""))
+    link = "http://www.campusbookstore.com/Textbooks/Course/CISC121"
+
+    lxml_html = textbooks.lxml_html
+
+    def single_pass(use_lxml):
+        textbooks.lxml_html = lxml_html if use_lxml else None
+        return [list(scraper.parse_books(link, page)) for page in pages]
+
+    expected = [lookup_books(scraper, link, page) for page in pages]
+    assert single_pass(True) == expected, "lxml extraction doesn't match"
+    assert single_pass(False) == expected, "BeautifulSoup extraction doesn't match"
+
+    print("Corpus: {0} pages, {1} books".format(len(pages), sum(len(x) for x in expected)))
+
+    number = 5
+    results = [
+        ("lookup per field", min(timeit.repeat(lambda: [lookup_books(scraper, link, p) for p in pages], number=number, repeat=3))),
+        ("single pass (bs4)", min(timeit.repeat(lambda: single_pass(False), number=number, repeat=3))),
+        ("single pass (lxml)", min(timeit.repeat(lambda: single_pass(True), number=number, repeat=3))),
+    ]
+    textbooks.lxml_html = lxml_html
+
+    base = results[0][1]
+    for name, t in results:
+        print("{0:20} {1:8.2f} ms/corpus ({2:.1f}x)".format(name, t / number * 1e3, base / t))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
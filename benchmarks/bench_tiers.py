@@ -0,0 +1,139 @@
+"""
+Counts the requests each tier of a time-boxed run makes (see `PRIORITIES` in
+main.py) on a fake letter of the catalog, against the same work done in one job.
+
+Every tier walks the whole catalog again (the letter, every subject, every
+course, and the terms it wants) to get to its sections, so the tiers take
+more requests in total than one job. This shows how many more.
+
+Usage: python benchmarks/bench_tiers.py [num_subjects] [num_courses] [num_sections]
+"""
+
+import sys
+import random
+import logging
+
+import corpus
+
+# Most modules need a config.py, use the sample one if there isn't one
+try:
+    import config
+except ImportError:
+    import sample_config
+    sys.modules["config"] = sample_config
+
+import writer
+from main import PRIORITIES, ScrapeJob
+from parser import SolusParser
+from scraper import SolusScraper, current_term
+
+# Requests made by each step of the way through the catalog (at most)
+REQUESTS = dict(select_alphanum=1, dropdown_subject=1, rollup_subject=1, open_course=1, show_sections=1,
+                return_from_course=2, switch_to_term=1, view_all_sections=1, visit_section_page=1,
+                return_from_section=1)
+
+
+def make_catalog(num_subjects, num_courses, num_sections, seed=0):
+    """
+    Returns the subjects of a fake letter (see `corpus.catalog_subjects`) and
+    the page of each course, by (subject index, course unique).
+
+    About half the courses in the catalog aren't scheduled, and the rest have
+    past terms and maybe a current one.
+    """
+    r = random.Random(seed)
+    year = current_term()[0]
+    subjects = corpus.catalog_subjects(num_subjects, num_courses)
+    pages = {}
+    for i, (_, courses) in enumerate(subjects):
+        for course in courses:
+            terms = ()
+            if r.random() > 0.5:
+                terms = ("{0} Fall".format(year - 2), "{0} Winter".format(year - 1))
+                if r.random() > 0.4:
+                    terms += ("{0} Winter".format(year + 1),)
+            pages[(i, course)] = corpus.course_page(r.randint(1, num_sections), r.randint(0, 1000), terms)
+    return subjects, pages
+
+
+class FakeSession(object):
+    """Stands in for a `SolusSession` on the fake letter, counts the requests it would make"""
+
+    nav_map = None
+    recovery_count = 0
+    latest_content = b""
+
+    def __init__(self, subjects, pages):
+        self.subjects = subjects
+        self.pages = pages
+        self.parser = SolusParser()
+        self.parse_cache = self.parser.cache
+        self.request_count = 0
+        self.open_subject = None
+        self.course_page = None
+
+    def location(self):
+        return ["C", None, None, None]
+
+    def dump_history(self):
+        pass
+
+    def __getattr__(self, name):
+        if name not in REQUESTS:
+            raise AttributeError(name)
+
+        def navigate(unique=None):
+            self.request_count += REQUESTS[name]
+            if name == "dropdown_subject":
+                self.open_subject = [x[0] for x in self.subjects].index(unique)
+            elif name == "rollup_subject":
+                self.open_subject = None
+
+            if name == "open_course":
+                self.course_page = self.pages[(self.open_subject, unique)]
+                self.parser.update_html(self.course_page)
+            elif name == "visit_section_page":
+                self.parser.update_html("<html></html>")
+            elif name == "return_from_section":
+                self.parser.update_html(self.course_page)
+            elif name in ("select_alphanum", "dropdown_subject", "rollup_subject", "return_from_course"):
+                self.parser.update_html(corpus.catalog_page(self.subjects, self.open_subject))
+        return navigate
+
+
+def run(subjects, pages, tier):
+    """Runs the job of a tier on the fake letter, returns the requests it made"""
+    job = ScrapeJob(letters="C")
+    job.update(tier)
+    scraper = SolusScraper(FakeSession(subjects, pages), job)
+    scraper.start()
+    return scraper.request_stats()
+
+
+def main(args):
+    num_subjects = int(args[0]) if args else 10
+    num_courses = int(args[1]) if len(args) > 1 else 20
+    num_sections = int(args[2]) if len(args) > 2 else 10
+    subjects, pages = make_catalog(num_subjects, num_courses, num_sections)
+    print("Catalog: {0} subjects with {1} courses each, up to {2} sections in each term".format(
+        num_subjects, num_courses, num_sections))
+
+    # Nothing is written out
+    logging.disable(logging.CRITICAL)
+    for name in ("write_subject", "write_course", "write_section"):
+        setattr(writer, name, lambda x: None)
+
+    one = run(subjects, pages, dict(tier="(one job)"))
+    tiers = [run(subjects, pages, tier) for tier in PRIORITIES]
+
+    for stats in [one] + tiers:
+        print("{tier:15s} {walk:6d} walking the catalog {sections:6d} for section pages".format(**stats))
+
+    walk = sum(x["walk"] for x in tiers)
+    total = walk + sum(x["sections"] for x in tiers)
+    print("Tiers: {0} requests, {1} more than one job ({2:.0%} of them walking the catalog again)".format(
+        total, total - one["walk"] - one["sections"], float(walk - one["walk"]) / total))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,138 @@
+"""
+Generates synthetic SOLUS pages for the benchmarks.
+
+The markup mimics the parts of the real pages that `SolusParser` looks at.
+Saved pages can be used instead by passing their filenames to the benchmarks,
+ex: the .html files in a zip from `SolusSession.dump_history` (in LOG_DIR), or
+pages read out of an archive with `archive.read_headers` and `archive.read_page`.
+"""
+
+import os
+import sys
+import random
+
+# Make the scraper modules importable when run as `python benchmarks/<name>.py`
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+DAYS = ["Mo", "Tu", "We", "Th", "Fr", "MoWe", "TuTh", "MoWeFr", "TBA"]
+TIMES = ["8:30AM", "10:00AM", "11:30AM", "1:00PM", "2:30PM", "4:00PM", "7:00PM", "TBA"]
+LOCATIONS = ["Stirling Hall 401", "Jeffery Hall 127", "Dunning Hall 27", "Biosciences Complex 1101", "TBA"]
+INSTRUCTORS = ["Smith,John", "Doe,  Jane", "TBA", "Staff", "Lee,Ann,Wong,Bob", "Tremblay,Marie Claire"]
+DATES = ["2013/09/09 - 2013/11/29", "2014/01/06 - 2014/04/04", "2014/05/05 - 2014/07/25"]
+TYPES = ["LEC", "LAB", "TUT", "SEM"]
+
+SPAN = '<td><span class="{0}">{1}</span></td>'
+
+
+def section_tables(num_sections, seed=0):
+    """Returns the markup of `num_sections` section tables like the ones on a course page"""
+    r = random.Random(seed)
+    out = []
+    for i in range(num_sections):
+        out.append('<tr><td><table id="CLASS$scroll${0}" class="PSLEVEL1GRIDNBO"><tr><td>'
+                   '<a id="CLASS_SECTION${0}" href="javascript:submitAction(\'CLASS_SECTION${0}\')">{1:03d}-{2} ({3})</a>'
+                   '</td><td><img src="PS_CS_STATUS.gif" alt="{4}"/></td></tr>'.format(
+                       i, i + 1, r.choice(TYPES), 1000 + i, r.choice(["Open", "Closed"])))
+        out.append('<tr><td><table id="CLASS_MTGPAT$scroll${0}" class="PSLEVEL1GRIDWBO">'.format(i))
+        for _ in range(r.randint(1, 3)):
+            time = r.choice(TIMES)
+            out.append("<tr>" + "".join([
+                SPAN.format("PSEDITBOX_DISPONLY", r.choice(DAYS)),
+                SPAN.format("PSEDITBOX_DISPONLY", time),
+                SPAN.format("PSEDITBOX_DISPONLY", time if time == "TBA" else "11:50AM"),
+                SPAN.format("PSEDITBOX_DISPONLY", r.choice(LOCATIONS)),
+                SPAN.format("PSLONGEDITBOX", r.choice(INSTRUCTORS)),
+                SPAN.format("PSEDITBOX_DISPONLY", r.choice(DATES)),
+            ]) + "</tr>")
+        out.append('</table></td></tr></table></td></tr>')
+    return "\n".join(out)
+
+
+def course_page(num_sections, seed=0, terms=("2013 Fall", "2014 Winter")):
+    """Returns a course page with `num_sections` sections on it, and `terms` in its dropdown (none if it isn't scheduled)"""
+    dropdown = ""
+    if terms:
+        dropdown = '<select id="DERIVED_SAA_CRS_TERM_ALT">{0}</select>'.format("".join(
+            '<option value="{0}">{1}</option>'.format(2000 + i, term) for i, term in enumerate(terms)))
+    return ('<html><head><title>Course Detail</title></head><body><form name="win0" method="post">'
+            '<input type="hidden" name="ICSID" value="{0}"/>'
+            '<input type="hidden" name="ICStateNum" value="{1}"/>'
+            '<span class="PALEVEL0SECONDARY">CISC 121 - Introduction to Computing Science I</span>'
+            '{2}<table>{3}</table></form></body></html>').format(
+                "x" * 40, seed, dropdown, section_tables(num_sections, seed) if terms else "")
+
+
+def load_pages(args, num_sections=(10, 50, 200, 500)):
+    """Returns the saved pages named in `args`, or synthetic course pages if there aren't any"""
+    if args:
+        pages = []
+        for name in args:
+            with open(name, "rb") as f:
+                pages.append(f.read().decode("utf-8", "replace"))
+        return pages
+    return [course_page(n, seed=n) for n in num_sections]
+
+
+LINK = ('<a name="{0}" id="{0}" ptlinktgt="pt_peoplecode" tabindex="{1}" class="PSHYPERLINK" '
+        'href="javascript:submitAction_win0(document.win0,\'{0}\');">{2}</a>')
+
+
+def catalog_subjects(num_subjects, num_courses):
+    """Returns the subjects of a letter of the catalog, as (subject unique, course uniques)"""
+    return [(u"C{0:03d} - Subject {0}".format(i), [u"{0}".format(100 + j) for j in range(num_courses)])
+            for i in range(num_subjects)]
+
+
+def catalog_page(subjects, open_subject=None, state=0):
+    """Returns the catalog page of a letter, with the subject at index `open_subject` dropped down"""
+    out = ['<html><head><title>Browse Course Catalog</title></head><body><form name="win0" method="post">',
+           '<input type="hidden" name="ICStateNum" value="{0}"/>'.format(state),
+           '<div id="menu">' + '<a class="PSHYPERLINK" href="#">Menu item</a>' * 100 + '</div><table>']
+    for i, (unique, courses) in enumerate(subjects):
+        out.append('<tr><td>' + LINK.format("DERIVED_SSS_BCC_GROUP_BOX_1$147$${0}".format(i), 100 + i, unique) + '</td></tr>')
+        if i == open_subject:
+            out.append('<tr><td><table class="PSLEVEL2GRID">')
+            out.extend('<tr><td>' + LINK.format("CRSE_NBR${0}".format(j), 1000 + j, course) + '</td>'
+                       '<td><span class="PSEDITBOX_DISPONLY">Course {0}</span></td></tr>'.format(j)
+                       for j, course in enumerate(courses))
+            out.append('</table></td></tr>')
+    out.append('</table></form></body></html>')
+    return "\n".join(out)
+
+
+BOOK_FIELD = '<span id="ctl00_ContentBody_ctl00_CourseBooksRepeater_ctl{0:02d}_test_{1}">{2}</span>'
+
+
+def bookstore_page(num_books, seed=0):
+    """Returns a campusbookstore.com course page with `num_books` books on it"""
+    r = random.Random(seed)
+    out = ['<html><head><title>Textbooks</title></head><body>',
+           '<div id="header">' + '<ul>' + '<li><a href="#">Menu item</a></li>' * 100 + '</ul></div>']
+    for k in range(num_books):
+        i = k * 2
+        fields = [
+            ("BookTitle", "Introduction to Book {0}".format(k)),
+            ("BookAuthor", " by Author {0}".format(k)),
+            ("StatusLabel", r.choice(["REQUIRED", "RECOMMENDED"])),
+            ("ISBN13Label", "978{0:010d}".format(seed * 100 + k) if k % 5 else "[N/A]"),
+            ("ISBN10Label", "{0:010d}".format(seed * 100 + k)),
+            ("NewPriceLabel", "${0}.99".format(r.randint(10, 200))),
+            ("NewAvailabilityLabel", "({0} available)".format(r.randint(0, 50))),
+            ("UsedPriceLabel", "${0}.00".format(r.randint(5, 100)) if k % 2 else ""),
+            ("UsedAvailabilityLabel", "({0} available)".format(r.randint(0, 5))),
+        ]
+        out.append('<div id="ctl00_ContentBody_ctl00_CourseBooksRepeater_ctl{0:02d}_test_ModeFull">'
+                   '<table><tr><td><table><tr><td><img src="cover.jpg"/></td><td>'.format(i))
+        out.extend(BOOK_FIELD.format(i, name, value) for name, value in fields)
+        out.append('<a id="ctl00_ContentBody_ctl00_CourseBooksRepeater_ctl{0:02d}_test_ClassifiedsLabel">{1}</a>'.format(
+            i, "2 in classifieds" if k % 3 == 0 else ""))
+        out.append('</td></tr></table></td></tr></table></div>')
+    out.append('<div id="footer">' + '<p>Footer text</p>' * 50 + '</div></body></html>')
+    return "\n".join(out)
+
+
+def load_bookstore_pages(args, num_books=(1, 5, 20, 49)):
+    """Returns the saved pages named in `args`, or synthetic bookstore pages if there aren't any"""
+    if args:
+        return load_pages(args)
+    return [bookstore_page(n, seed=n) for n in num_books]
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+"""
+A census of the course catalog: which subjects and courses exist.
+
+Census jobs (`python main.py --census`) only open the subject dropdowns on the
+letter pages, which takes a small fraction of the requests of a scrape. Every
+subject is written to `OUTPUT_DIR/census`, then `build` combines them into a
+snapshot in `CENSUS_DIR` (with the number of subjects and courses of every
+letter, ex: for planning jobs) and compares it with the previous snapshot.
+
+Usage:
+    python census.py build [OUTPUT_DIR]
+    python census.py diff OLD_SNAPSHOT NEW_SNAPSHOT
+"""
+
+import os
+import sys
+import json
+import glob
+import time
+import shutil
+import logging
+
+try:
+    from config import OUTPUT_DIR
+except ImportError:
+    OUTPUT_DIR = "./data-dump"
+
+try:
+    from config import CENSUS_DIR
+except ImportError:
+    CENSUS_DIR = "./census"
+
+
+def clear(output_dir=OUTPUT_DIR):
+    """Removes the subjects written by a previous census"""
+    shutil.rmtree(os.path.join(output_dir, "census"), ignore_errors=True)
+
+
+def snapshot(output_dir=OUTPUT_DIR):
+    """Combines the subjects written by the census jobs"""
+
+    subjects = {}
+    for name in glob.glob(os.path.join(output_dir, "census", "*.json")):
+        with open(name) as f:
+            subject = json.load(f)
+        subjects[subject["abbreviation"]] = subject
+
+    letters = {}
+    for subject in subjects.values():
+        totals = letters.setdefault(subject["letter"], dict(subjects=0, courses=0))
+        totals["subjects"] += 1
+        totals["courses"] += subject["num_courses"]
+
+    return dict(
+        taken=time.strftime("%Y-%m-%dT%H:%M:%S"),
+        num_subjects=len(subjects),
+        num_courses=sum(x["num_courses"] for x in subjects.values()),
+        letters=letters,
+        subjects=subjects,
+    )
+
+
+def diff(old, new):
+    """Returns what changed between two snapshots"""
+
+    old_subjects, new_subjects = old["subjects"], new["subjects"]
+    ret = dict(
+        added_subjects=sorted(set(new_subjects) - set(old_subjects)),
+        removed_subjects=sorted(set(old_subjects) - set(new_subjects)),
+        added_courses={},
+        removed_courses={},
+        renamed_subjects={},
+    )
+
+    for abbr in set(old_subjects) & set(new_subjects):
+        old_courses, new_courses = set(old_subjects[abbr]["courses"]), set(new_subjects[abbr]["courses"])
+        if new_courses - old_courses:
+            ret["added_courses"][abbr] = sorted(new_courses - old_courses)
+        if old_courses - new_courses:
+            ret["removed_courses"][abbr] = sorted(old_courses - new_courses)
+        if old_subjects[abbr]["title"] != new_subjects[abbr]["title"]:
+            ret["renamed_subjects"][abbr] = [old_subjects[abbr]["title"], new_subjects[abbr]["title"]]
+
+    # Whole subjects count as added/removed courses too
+    for abbr in ret["added_subjects"]:
+        ret["added_courses"][abbr] = sorted(new_subjects[abbr]["courses"])
+    for abbr in ret["removed_subjects"]:
+        ret["removed_courses"][abbr] = sorted(old_subjects[abbr]["courses"])
+
+    ret["num_added_courses"] = sum(len(x) for x in ret["added_courses"].values())
+    ret["num_removed_courses"] = sum(len(x) for x in ret["removed_courses"].values())
+    return ret
+
+
+def latest(census_dir=CENSUS_DIR):
+    """Returns the filename of the newest snapshot, or None"""
+    names = sorted(glob.glob(os.path.join(census_dir, "census-*[0-9].json")))
+    return names[-1] if names else None
+
+
+def build(output_dir=OUTPUT_DIR, census_dir=CENSUS_DIR):
+    """
+    Saves a snapshot of the census in `output_dir` to `census_dir`, along with what
+    changed since the last one. Returns (snapshot, diff), diff is None for the first census.
+    """
+
+    new = snapshot(output_dir)
+
+    # Read before the new one is saved (it could get the same name)
+    previous = latest(census_dir)
+    if previous:
+        with open(previous) as f:
+            old = json.load(f)
+
+    try:
+        os.makedirs(census_dir)
+    except OSError:
+        pass
+    base = os.path.join(census_dir, "census-" + time.strftime("%Y%m%d-%H%M%S"))
+    with open(base + ".json", "w") as f:
+        json.dump(new, f, indent=4, sort_keys=True)
+
+    logging.info(u"Census: %(num_subjects)s subjects, %(num_courses)s courses", new, extra={"event": "census"})
+
+    changes = None
+    if previous:
+        changes = diff(old, new)
+        changes["since"] = os.path.basename(previous)
+        with open(base + ".diff.json", "w") as f:
+            json.dump(changes, f, indent=4, sort_keys=True)
+
+        logging.info(u"Since the last census: %s subjects added, %s removed, %s courses added, %s removed",
+                     len(changes["added_subjects"]), len(changes["removed_subjects"]),
+                     changes["num_added_courses"], changes["num_removed_courses"])
+
+    return new, changes
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if len(sys.argv) >= 2 and sys.argv[1] == "build":
+        build(sys.argv[2] if len(sys.argv) > 2 else OUTPUT_DIR)
+    elif len(sys.argv) == 4 and sys.argv[1] == "diff":
+        with open(sys.argv[2]) as f:
+            old = json.load(f)
+        with open(sys.argv[3]) as f:
+            new = json.load(f)
+        print(json.dumps(diff(old, new), indent=4, sort_keys=True))
+    else:
+        print(__doc__)
+        sys.exit(1)
@@ -0,0 +1,132 @@
+"""
+Decoding of the values in SOLUS meeting tables.
+
+The same handful of times, term date ranges, day patterns and instructor
+strings repeat across thousands of sections, so every decoder is memoized
+with a bounded LRU cache. All return values are immutable so they can be
+safely shared between callers.
+"""
+
+import re
+from datetime import datetime
+
+try:
+    from functools import lru_cache
+except ImportError:
+    # Python 2.x
+    lru_cache = None
+
+try:
+    from config import DECODER_CACHE_SIZE
+except ImportError:
+    DECODER_CACHE_SIZE = 1024
+
+
+def _memoize(maxsize):
+    """Bounded memoization of single argument functions"""
+
+    if lru_cache is not None:
+        return lru_cache(maxsize=maxsize)
+
+    def decorator(func):
+        cache = {}
+
+        def wrapper(arg):
+            try:
+                return cache[arg]
+            except KeyError:
+                pass
+            if len(cache) >= maxsize:
+                # Cheaper than tracking recency and good enough for the small working sets here
+                cache.clear()
+            ret = cache[arg] = func(arg)
+            return ret
+
+        wrapper.cache_clear = cache.clear
+        wrapper.__doc__ = func.__doc__
+        return wrapper
+
+    return decorator
+
+
+TIME_INFO = re.compile("(\d+:\d+[AP]M)") #1:30PM
+DATE_INFO = re.compile("^([\S]+)\s*-\s*([\S]+)$") #yyyy/mm/dd - yyyy/mm/dd
+WHITESPACE = re.compile(r'\s+')
+
+# Map the strings to numeric days
+DAY_MAP = {
+    "mo": 1,
+    "tu": 2,
+    "we": 3,
+    "th": 4,
+    "fr": 5,
+    "sa": 6,
+    "su": 7
+}
+
+NON_INSTRUCTORS = ("TBA", "Staff")
+
+
+@_memoize(DECODER_CACHE_SIZE)
+def decode_time(text):
+    """Returns the datetime.time in the cell text (ex: "1:30PM"), None if there isn't one"""
+    m = TIME_INFO.search(text)
+    return datetime.strptime(m.group(1), "%I:%M%p").time() if m else None
+
+
+@_memoize(DECODER_CACHE_SIZE)
+def decode_date_range(text):
+    """Returns a (start, end) tuple of datetime.date objects, (None, None) if the cell doesn't have a range"""
+    m = DATE_INFO.search(text)
+    if not m:
+        return (None, None)
+    return (datetime.strptime(m.group(1), "%Y/%m/%d").date(),
+            datetime.strptime(m.group(2), "%Y/%m/%d").date())
+
+
+@_memoize(DECODER_CACHE_SIZE)
+def decode_days(text):
+    """
+    Returns a tuple of the numeric days (1-7, starting with monday) in the cell text (ex: "MoWe").
+
+    Days are in the order that the meetings have always been listed in (last to first).
+    If a non-day is encountered (most likely 'TBA') this is `(None,)`.
+    """
+    all_days = text.lower()
+    ret = []
+    while len(all_days) > 0:
+        day_abbr = all_days[-2:]
+        all_days = all_days[:-2]
+
+        if day_abbr not in DAY_MAP:
+            # Make sure only a single meeting is added
+            return (None,)
+        ret.append(DAY_MAP[day_abbr])
+
+    return tuple(ret)
+
+
+@_memoize(DECODER_CACHE_SIZE)
+def decode_instructors(text):
+    """
+    Returns a tuple of the instructor names ("Last, First") in the cell text.
+    A name without a comma after it (ex: "First Last") is kept as it is.
+    """
+    if not text or text in NON_INSTRUCTORS:
+        return ()
+
+    ret = []
+    lis = WHITESPACE.sub(' ', text).split(",")
+    for i in range(0, len(lis), 2):
+        last_name = lis[i].strip()
+        if i + 1 < len(lis):
+            ret.append(u"{0}, {1}".format(last_name, lis[i+1].strip()))
+        elif last_name:
+            ret.append(last_name)
+    return tuple(ret)
+
+
+def cache_clear():
+    """Empties all the decoder caches"""
+    for x in (decode_time, decode_date_range, decode_days, decode_instructors):
+        x.cache_clear()
@@ -0,0 +1,148 @@
+"""
+Structured logging shared by all the scraper processes.
+
+Every process sends its log records through a queue to a single listener
+process. The listener writes them out as compact JSON lines, and optionally
+as human-readable lines to stdout.
+
+Records are only formatted by the listener, and only for the outputs that
+want them. Messages logged with a dict argument
+(ex: `logging.info("--Subject: %(title)s", subject)`) have the dict written
+out as fields of the JSON line, so only log dicts of plain values that way. Pass `extra={"event": name}` to name the event.
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+from multiprocessing import Process, Queue
+
+try:
+    _string_types = (str, unicode)
+except NameError:
+    # Python 3.x
+    _string_types = (str,)
+
+
+class EventQueueHandler(logging.Handler):
+    """
+    Sends log records to the listener without formatting them.
+
+    Only picklable parts of the record are sent, tracebacks are rendered
+    here since they can't be sent.
+    """
+
+    def __init__(self, queue, level=logging.NOTSET):
+        logging.Handler.__init__(self, level)
+        self.queue = queue
+
+    def emit(self, record):
+        try:
+            exc_text = None
+            if record.exc_info:
+                exc_text = logging.Formatter().formatException(record.exc_info)
+
+            if isinstance(record.args, dict) and isinstance(record.msg, _string_types):
+                msg, args = record.msg, record.args
+            else:
+                # Other arguments (or messages that aren't strings) might not be picklable, render them now
+                msg, args = record.getMessage(), None
+
+            self.queue.put_nowait((record.created, record.levelno, record.processName, record.name,
+                                   getattr(record, "event", None), msg, args, exc_text))
+        except Exception:
+            self.handleError(record)
+
+
+def _json_default(obj):
+    if hasattr(obj, 'isoformat'):
+        return obj.isoformat()
+    return str(obj)
+
+
+def _listen(queue, path, level, console_level):
+    """Writes records from the queue until it gets a `None`"""
+
+    out = open(path, "a") if path else None
+    console_format = "[{0}][{1}][{2}]: {3}\n"
+
+    while True:
+        item = queue.get()
+        if item is None:
+            break
+
+        created, levelno, process, name, event, msg, args, exc_text = item
+
+        if out and levelno >= level:
+            # The record's fields, then the standard ones (which win if the names clash)
+            line = dict(args) if args else {}
+            line.update(t=round(created, 3), lvl=logging.getLevelName(levelno), proc=process)
+            if name != "root":
+                line["logger"] = name
+            if event:
+                line["event"] = event
+            else:
+                line["msg"] = msg
+            if exc_text:
+                line["exc"] = exc_text
+            out.write(json.dumps(line, default=_json_default, separators=(",", ":")) + "\n")
+
+        if console_level is not None and levelno >= console_level:
+            text = msg % args if args else msg
+            if exc_text:
+                text += "\n" + exc_text
+            stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(created))
+            sys.stdout.write(console_format.format(stamp, logging.getLevelName(levelno), process, text))
+
+        # Only flush once caught up
+        if queue.empty():
+            if out:
+                out.flush()
+            sys.stdout.flush()
+
+    if out:
+        out.close()
+    sys.stdout.flush()
+
+
+class EventLog(object):
+    """
+    Starts the listener process and routes the logging of this process (and
+    any processes forked from it) to it.
+
+    `path` is the JSON lines file (None to disable), `console_level` is the
+    level of the human-readable stdout output (None to disable).
+    """
+
+    def __init__(self, path=None, level=logging.INFO, console_level=logging.INFO):
+        if path:
+            # Fail here if the log can't be written, the listener dying would silently drop everything
+            directory = os.path.dirname(path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            open(path, "a").close()
+
+        self.queue = Queue()
+        self.listener = Process(target=_listen, args=(self.queue, path, level, console_level), name="EventLog")
+        self.listener.daemon = True
+        self.listener.start()
+
+        # Filter before records are even created, let alone formatted
+        levels = []
+        if path:
+            levels.append(level)
+        if console_level is not None:
+            levels.append(console_level)
+        min_level = min(levels) if levels else logging.CRITICAL + 1
+
+        root_logger = logging.getLogger()
+        for handler in list(root_logger.handlers):
+            root_logger.removeHandler(handler)
+        root_logger.addHandler(EventQueueHandler(self.queue))
+        root_logger.setLevel(min_level)
+
+    def close(self):
+        """Waits for the listener to write out everything"""
+        self.queue.put(None)
+        self.listener.join()
@@ -0,0 +1,195 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+from threading import Lock
+from email.utils import parsedate_tz, mktime_tz
+
+
+def _nothing():
+    pass
+
+
+class HTTPCache(object):
+    """
+    An on-disk cache of GET responses that makes conditional requests.
+
+    Respects ETag, Last-Modified, and Cache-Control (max-age, no-cache, no-store).
+    Entries are evicted least recently used first when the bodies take up more than `max_size` bytes.
+    Safe to use from multiple threads.
+    """
+
+    MAX_AGE = re.compile(r"max-age\s*=\s*(\d+)")
+
+    def __init__(self, directory, max_size=100 * 1024 * 1024):
+        self.directory = directory
+        self.max_size = max_size
+        self._lock = Lock()
+
+        # Statistics
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+        try:
+            os.makedirs(directory)
+        except OSError:
+            pass
+
+        # Sizes of the cached bodies, for eviction
+        self._sizes = {}
+        for name in os.listdir(directory):
+            if name.endswith(".body"):
+                self._sizes[name[:-5]] = os.path.getsize(os.path.join(directory, name))
+        self._total = sum(self._sizes.values())
+
+    def get(self, fetch, url):
+        """
+        GETs `url` through the cache. `fetch(url, headers)` is used to make the
+        actual request and must return a `requests` response.
+
+        Returns a (text, changed, commit) tuple where `changed` is False if the body is the
+        same as the cached one (a fresh entry, a 304, or an identical 200).
+        A changed body is only cached once `commit()` is called, so call it after
+        the text has been dealt with (ex: parsed and written out). Otherwise the
+        page counts as changed again next time.
+        Raises `requests.HTTPError` for error responses.
+        """
+
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        entry = self._load(key)
+
+        # Still fresh, don't even ask the server
+        if entry and not entry["no_cache"] and entry["expires"] > time.time():
+            self._count("hits")
+            return entry["text"], False, _nothing
+
+        headers = {}
+        if entry:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        response = fetch(url, headers=headers)
+
+        if response.status_code == 304 and entry:
+            validators = self._validators(response, entry)
+            if validators is None:
+                # Can't be kept anymore, so it can't be relied on to have been dealt with either
+                self._count("misses")
+                self._remove(key)
+                return entry["text"], True, _nothing
+
+            self._count("revalidated")
+            entry.update(validators)
+            self._store(key, entry)
+            return entry["text"], False, _nothing
+
+        response.raise_for_status()
+
+        text = response.text
+        digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        changed = not entry or entry["digest"] != digest
+        self._count("misses" if changed else "revalidated")
+
+        validators = self._validators(response)
+        if validators is None:
+            commit = lambda: self._remove(key)
+        else:
+            validators.update(text=text, digest=digest)
+            commit = lambda: self._store(key, validators)
+
+        if not changed:
+            commit()
+            return text, False, _nothing
+        return text, True, commit
+
+    def _count(self, name):
+        # Called from several fetching threads
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _validators(self, response, old=None):
+        """Returns the caching information in the response headers, None if it can't be stored"""
+
+        cache_control = response.headers.get("Cache-Control", "").lower()
+        if "no-store" in cache_control:
+            return None
+
+        m = self.MAX_AGE.search(cache_control)
+        if m:
+            expires = time.time() + int(m.group(1))
+        elif response.headers.get("Expires"):
+            parsed = parsedate_tz(response.headers["Expires"])
+            expires = mktime_tz(parsed) if parsed else 0
+        else:
+            expires = 0
+
+        # A 304 doesn't have to repeat the validators
+        old = old or {}
+        return dict(
+            etag=response.headers.get("ETag", old.get("etag")),
+            last_modified=response.headers.get("Last-Modified", old.get("last_modified")),
+            expires=expires,
+            no_cache="no-cache" in cache_control,
+        )
+
+    def _path(self, key, ext):
+        return os.path.join(self.directory, key + ext)
+
+    def _load(self, key):
+        with self._lock:
+            if key not in self._sizes:
+                return None
+            try:
+                with open(self._path(key, ".json"), "r") as f:
+                    entry = json.load(f)
+                with open(self._path(key, ".body"), "rb") as f:
+                    entry["text"] = f.read().decode("utf-8")
+            except (IOError, OSError, ValueError) as e:
+                logging.warning(u"Dropping unreadable cache entry {0}: {1}".format(key, e))
+                self._remove_locked(key)
+                return None
+
+            # Mark as recently used
+            os.utime(self._path(key, ".body"), None)
+            return entry
+
+    def _store(self, key, entry):
+        body = entry["text"].encode("utf-8")
+        meta = dict((k, v) for k, v in entry.items() if k != "text")
+
+        with self._lock:
+            with open(self._path(key, ".body"), "wb") as f:
+                f.write(body)
+            with open(self._path(key, ".json"), "w") as f:
+                json.dump(meta, f)
+
+            self._total += len(body) - self._sizes.get(key, 0)
+            self._sizes[key] = len(body)
+
+            if self._total > self.max_size:
+                self._evict()
+
+    def _evict(self):
+        """Removes the least recently used entries until the cache fits in `max_size`"""
+        by_age = sorted(self._sizes, key=lambda k: os.path.getmtime(self._path(k, ".body")))
+        for key in by_age:
+            if self._total <= self.max_size:
+                break
+            self._remove_locked(key)
+
+    def _remove(self, key):
+        with self._lock:
+            self._remove_locked(key)
+
+    def _remove_locked(self, key):
+        self._total -= self._sizes.pop(key, 0)
+        for ext in (".body", ".json"):
+            try:
+                os.remove(self._path(key, ext))
+            except OSError:
+                pass
@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+"""
+A job queue that can be shared by scraper processes on several machines.
+
+The queue is a SQLite database, so it just has to be on a disk that all the
+machines can access. Workers lease jobs and have to send heartbeats while
+working on them. If a worker stops sending heartbeats (ex: it crashed or
+lost its connection) the lease expires and the job is handed out again.
+
+Usage:
+    python jobqueue.py status DATABASE
+    python jobqueue.py merge DEST_DIR SOURCE_DIR [SOURCE_DIR ...]
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import sqlite3
+import logging
+import itertools
+from threading import Thread, Event
+from multiprocessing.managers import BaseManager
+try:
+    from queue import Empty, PriorityQueue
+except ImportError:
+    # Python 2.x
+    from Queue import Empty, PriorityQueue
+
+try:
+    from config import LEASE_SECONDS
+except ImportError:
+    LEASE_SECONDS = 300
+
+try:
+    from config import MAX_JOB_ATTEMPTS
+except ImportError:
+    MAX_JOB_ATTEMPTS = 3
+
+
+class LeasedJob(dict):
+    """A job handed out by `SharedJobQueue`, remembers its `job_id`"""
+
+
+class SharedJobQueue(object):
+    """
+    A queue of jobs stored in a SQLite database.
+    Jobs are handed out lowest "priority" first, in the order they were added.
+
+    Has the same `put_nowait`/`get_nowait` interface as `multiprocessing.Queue`
+    so it can be used by `JobManager`. Jobs returned by `get_nowait` are leased
+    to the calling process and have to be finished with `task_done` or
+    `task_failed`. `heartbeat` extends the lease.
+    """
+
+    def __init__(self, path, job_type=LeasedJob, lease_seconds=LEASE_SECONDS, max_attempts=MAX_JOB_ATTEMPTS):
+        self.path = path
+        self.job_type = job_type
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+        with self._connect() as db:
+            db.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY,
+                job TEXT NOT NULL,
+                state TEXT NOT NULL DEFAULT 'pending',
+                worker TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                finished REAL,
+                priority INTEGER NOT NULL DEFAULT 0
+            )""")
+
+            # Databases made before jobs had priorities
+            columns = [row[1] for row in db.execute("PRAGMA table_info(jobs)")]
+            if "priority" not in columns:
+                db.execute("ALTER TABLE jobs ADD COLUMN priority INTEGER NOT NULL DEFAULT 0")
+
+    @property
+    def worker(self):
+        """Identifies this process across all machines"""
+        # Not cached, the queue is passed to child processes
+        return u"{0}:{1}".format(socket.gethostname(), os.getpid())
+
+    def _connect(self):
+        # Connections can't be shared between threads (heartbeats), so make one per operation
+        db = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        return _Transaction(db)
+
+    def clear(self):
+        """Removes all the jobs"""
+        with self._connect() as db:
+            db.execute("DELETE FROM jobs")
+
+    def put_nowait(self, job):
+        with self._connect() as db:
+            db.execute("INSERT INTO jobs (job, priority) VALUES (?, ?)",
+                       (json.dumps(job, sort_keys=True), job.get("priority", 0)))
+
+    def get_nowait(self):
+        """
+        Leases the next pending (or abandoned) job to this process.
+        Raises `Empty` if there aren't any left to hand out.
+        """
+        now = time.time()
+
+        # Jobs whose workers keep dying (ex: running out of memory) never get to `task_failed`
+        # (A transaction of its own, the one below is rolled back if there's nothing to hand out)
+        with self._connect() as db:
+            cur = db.execute("""UPDATE jobs SET state = 'failed', worker = NULL, lease_expires = NULL
+                WHERE state = 'leased' AND lease_expires < ? AND attempts >= ?""", (now, self.max_attempts))
+            if cur.rowcount:
+                logging.error(u"Gave up on {0} jobs that were abandoned {1} times".format(cur.rowcount, self.max_attempts))
+
+        with self._connect() as db:
+            row = db.execute("""SELECT id, job, attempts FROM jobs
+                WHERE state = 'pending' OR (state = 'leased' AND lease_expires < ?)
+                ORDER BY priority, id LIMIT 1""", (now,)).fetchone()
+            if row is None:
+                raise Empty()
+
+            job_id, job, attempts = row
+            if attempts > 0:
+                logging.warning(u"Re-queueing abandoned job {0} (attempt {1})".format(job_id, attempts + 1))
+
+            db.execute("UPDATE jobs SET state = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1 WHERE id = ?",
+                       (self.worker, now + self.lease_seconds, job_id))
+
+        job = self.job_type(json.loads(job))
+        job.job_id = job_id
+        return job
+
+    def heartbeat(self, job):
+        """Extends the lease on a job. Returns False if the lease was lost to another worker"""
+        with self._connect() as db:
+            cur = db.execute("UPDATE jobs SET lease_expires = ? WHERE id = ? AND worker = ? AND state = 'leased'",
+                             (time.time() + self.lease_seconds, job.job_id, self.worker))
+            return cur.rowcount > 0
+
+    def task_done(self, job):
+        with self._connect() as db:
+            db.execute("UPDATE jobs SET state = 'done', finished = ? WHERE id = ?", (time.time(), job.job_id))
+
+    def task_failed(self, job):
+        """Puts the job back in the queue, or gives up on it after `max_attempts`"""
+        with self._connect() as db:
+            db.execute("""UPDATE jobs SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                          worker = NULL, lease_expires = NULL WHERE id = ?""", (self.max_attempts, job.job_id))
+
+    def status(self):
+        """Returns a dict of the number of jobs in each state"""
+        with self._connect() as db:
+            return dict(db.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+
+    def pending(self):
+        """Returns the jobs waiting to be handed out, in the order they would be"""
+        with self._connect() as db:
+            rows = db.execute("""SELECT job FROM jobs
+                WHERE state = 'pending' OR (state = 'leased' AND lease_expires < ? AND attempts < ?)
+                ORDER BY priority, id""", (time.time(), self.max_attempts)).fetchall()
+        return [self.job_type(json.loads(job)) for job, in rows]
+
+    def keep_alive(self, job, interval=None):
+        """
+        Starts a thread that sends heartbeats for the job until the returned Event is set
+        """
+        stop = Event()
+        interval = interval or self.lease_seconds / 3.0
+
+        def beat():
+            while not stop.wait(interval):
+                try:
+                    if not self.heartbeat(job) and not stop.is_set():
+                        logging.warning(u"Lost the lease on job {0}".format(job.job_id))
+                except sqlite3.Error as e:
+                    logging.warning(u"Couldn't send heartbeat: {0}".format(e))
+
+        t = Thread(target=beat, name="Heartbeat")
+        t.daemon = True
+        t.start()
+        return stop
+
+
+class _QueueManager(BaseManager):
+    """Serves a queue to other processes"""
+
+_QueueManager.register("PriorityQueue", PriorityQueue)
+
+
+class PriorityJobQueue(object):
+    """
+    A queue of jobs for the processes on this machine.
+    Like `SharedJobQueue`, jobs are handed out lowest "priority" first, in the order they were added.
+    """
+
+    def __init__(self):
+        self._manager = _QueueManager()
+        self._manager.start()
+        self._queue = self._manager.PriorityQueue()
+        self._counter = itertools.count()
+
+    def __getstate__(self):
+        # Only the proxy is needed by (and can be sent to) other processes
+        return dict(_queue=self._queue)
+
+    def __setstate__(self, state):
+        self._queue = state["_queue"]
+        self._counter = itertools.count()
+
+    def put_nowait(self, job):
+        # Jobs themselves can't be compared, order equal priorities by when they were added
+        self._queue.put_nowait((job.get("priority", 0), time.time(), os.getpid(), next(self._counter), job))
+
+    def get_nowait(self):
+        """Raises `Empty` if there aren't any jobs left"""
+        return self._queue.get_nowait()[-1]
+
+    def pending(self):
+        """Removes and returns all the jobs that haven't been handed out"""
+        jobs = []
+        while True:
+            try:
+                jobs.append(self.get_nowait())
+            except Empty:
+                return jobs
+
+
+class _Transaction(object):
+    """Runs the body of a `with` block in an immediate transaction and closes the connection"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute("BEGIN IMMEDIATE")
+        return self.db
+
+    def __exit__(self, exc_type, exc_value, tb):
+        try:
+            self.db.execute("COMMIT" if exc_type is None else "ROLLBACK")
+        finally:
+            self.db.close()
+
+
+def merge_outputs(dest, sources):
+    """
+    Merges the output directories of several machines into `dest`.
+    When the same file was written more than once (ex: a re-queued job), the newest one is kept.
+    """
+    for source in sources:
+        for dirpath, dirnames, filenames in os.walk(source):
+            out = os.path.join(dest, os.path.relpath(dirpath, source))
+            try:
+                os.makedirs(out)
+            except OSError:
+                pass
+
+            for name in filenames:
+                src = os.path.join(dirpath, name)
+                dst = os.path.join(out, name)
+                if not os.path.exists(dst) or os.path.getmtime(src) > os.path.getmtime(dst):
+                    shutil.copy2(src, dst)
+
+
+if __name__ == "__main__":
+
+    if len(sys.argv) >= 3 and sys.argv[1] == "status":
+        print(SharedJobQueue(sys.argv[2]).status())
+    elif len(sys.argv) >= 4 and sys.argv[1] == "merge":
+        merge_outputs(sys.argv[2], sys.argv[3:])
+    else:
+        print(__doc__.strip())
+        sys.exit(1)
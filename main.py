@@ -1,7 +1,10 @@
 #!/usr/bin/env python
 import os
 import sys
+import time
 import logging
+import signal
+import argparse
 from multiprocessing import Process, Queue
 try:
     from queue import Empty
@@ -9,8 +12,78 @@ except ImportError:
     # Python 2.x
     from Queue import Empty
 
-from navigation import SolusSession
+from navigation import SolusSession, HelperSessions
 from scraper import SolusScraper
+from textbooks import TextbookScraper
+from jobqueue import SharedJobQueue, PriorityJobQueue
+from eventlog import EventLog
+from progress import Progress, StatusReporter, current_rss
+import profiling
+import census
+from archive import Archive, ARCHIVE_DIR
+
+try:
+    from config import PROFILE
+except ImportError:
+    PROFILE = None
+
+try:
+    from config import STATUS_FILE
+except ImportError:
+    STATUS_FILE = "./logs/status.json"
+
+try:
+    from config import STATUS_INTERVAL
+except ImportError:
+    STATUS_INTERVAL = 10
+
+try:
+    from config import STATUS_PORT
+except ImportError:
+    STATUS_PORT = None
+
+# Workers are replaced by fresh processes once they use this much memory (in MB) or run this many jobs
+try:
+    from config import WORKER_MAX_RSS_MB
+except ImportError:
+    WORKER_MAX_RSS_MB = None
+
+try:
+    from config import WORKER_MAX_JOBS
+except ImportError:
+    WORKER_MAX_JOBS = None
+
+# Extra sessions each worker splits the section pages of big courses with on deep scrapes
+try:
+    from config import COURSE_HELPERS
+except ImportError:
+    COURSE_HELPERS = 0
+
+# Workers that don't report any progress for this many seconds are killed and their job is given to a new one (None to never)
+# (Has to be longer than a request can take with all its retries, see REQUEST_TIMEOUT and MAX_RETRIES)
+try:
+    from config import WORKER_STALL_SECONDS
+except ImportError:
+    WORKER_STALL_SECONDS = 900
+
+# Seconds a stalled worker gets to exit cleanly before it's killed outright
+STOP_SECONDS = 30
+
+# Seconds between checks for abandoned jobs once a shared queue has nothing else to hand out
+LEASE_POLL_SECONDS = 5
+
+# Exit code of a worker that handed off its work to be replaced
+RECYCLE_EXIT_CODE = 75
+
+# Tiers of work, most valuable first, used when prioritizing (ex: for a run with a deadline)
+# Each one is applied on top of the job's settings, the ones that go deep are skipped for shallow jobs
+# Every tier walks the catalog again to get to its sections (see "Time-boxed runs" in the README for what that costs)
+PRIORITIES = [
+    dict(tier="current", terms="current", deep=False),  # Every section of the current and upcoming terms
+    dict(tier="current-open", terms="current", deep=True, deep_status="Open"),  # Details of the open ones
+    dict(tier="current-closed", terms="current", deep=True, deep_status="Closed"),  # ...and the closed ones
+    dict(tier="past", terms="past"),  # Historic terms
+]
 
 
 class ScrapeJob(dict):
@@ -29,6 +102,27 @@ class ScrapeJob(dict):
         self["subject_end"] = self.get("subject_end", None)
         self["course_start"] = self.get("course_start", 0)
         self["course_end"] = self.get("course_end", None)
+        self["terms"] = self.get("terms", None)  # None for all, "current" (and upcoming), or "past"
+        self["deep_status"] = self.get("deep_status", None)  # Only scrape the sections with this status
+        self["priority"] = self.get("priority", 0)  # Lower priorities are done first
+        self["tier"] = self.get("tier", None)
+        self["engine"] = self.get("engine", "catalog")  # Or "search" to get sections with the class search
+        self["census"] = self.get("census", False)  # Only list the subjects and courses (see `census`)
+
+
+class TextbookJob(dict):
+    """
+    Holds data on a textbook scraper job. Includes default arguments.
+    """
+
+    def __init__(self, *args, **kwargs):
+        dict.__init__(self, *args, **kwargs)
+
+        # Supply custom defaults
+        self["letters"] = self.get("letters", None)  # None for the same letters as the SOLUS jobs
+        self["concurrency"] = self.get("concurrency", 8)
+        self["delay"] = self.get("delay", 0.1)
+        self["timeout"] = self.get("timeout", (10, 60))
 
 
 class JobManager(object):
@@ -40,14 +134,36 @@ class JobManager(object):
         self.user = user
         self.passwd = passwd
         self.config = config
-        self.jobs = Queue()
+
+        # A shared queue lets workers on several machines split up the jobs
+        if self.config.get("queue"):
+            self.jobs = SharedJobQueue(self.config["queue"], job_type=ScrapeJob)
+        else:
+            self.jobs = PriorityJobQueue()
+
+        # Stop starting new work after this many seconds
+        self.deadline = None
 
         # Enforce a range of 1 - 10 threads with a default of 5
         self.config["threads"] = max(min(self.config.get("threads", 5), 10), 1)
         self.config["job"] = self.config.get("job", ScrapeJob())
 
+        # Textbooks are scraped by their own process, using the same letters as the SOLUS jobs by default
+        if self.config.get("textbooks") is not None:
+            textbooks = TextbookJob(self.config["textbooks"])
+            if textbooks["letters"] is None:
+                textbooks["letters"] = self.config["job"]["letters"]
+            self.config["textbooks"] = textbooks
+
         # Divide up the work for the number of threads
-        self.make_jobs()
+        # (unless another machine is coordinating a shared queue)
+        self.num_jobs = 0
+        if not self.config.get("worker_only"):
+            if isinstance(self.jobs, SharedJobQueue):
+                self.jobs.clear()
+            if self.config["job"]["census"]:
+                census.clear()
+            self.make_jobs()
 
     def start(self):
         """Start running the scraping threads"""
@@ -61,22 +177,66 @@ class JobManager(object):
         letters = job["letters"]
         threads_per_letter = max(self.config.get("threads_per_letter", int((self.config["threads"] - 1)/len(letters) + 1)), 1)
 
-        for l in letters:
-            job_letter = ScrapeJob(job)
-            job_letter["letters"] = l
-            for s in range(0, threads_per_letter):
-                temp = ScrapeJob(job_letter)
-                temp["subject_start"] = job["subject_start"] + s
-                temp["subject_step"] = threads_per_letter
-                logging.info(u"Made job: {0}".format(temp))
-                self.jobs.put_nowait(temp)
+        # Split the work into tiers so the most valuable data is refreshed first
+        tiers = self.config.get("priorities")
+        if tiers is None:
+            tiers = PRIORITIES if self.config.get("deadline") and not job["census"] else [{}]
+
+        for priority, tier in enumerate(tiers):
+            if tier.get("deep") and not job["deep"]:
+                continue
+
+            for l in letters:
+                job_letter = ScrapeJob(job)
+                job_letter.update(tier)
+                job_letter["priority"] = priority
+                job_letter["letters"] = l
+                for s in range(0, threads_per_letter):
+                    temp = ScrapeJob(job_letter)
+                    temp["subject_start"] = job["subject_start"] + s
+                    temp["subject_step"] = threads_per_letter
+                    logging.info(u"Made job: {0}".format(temp))
+                    self.jobs.put_nowait(temp)
+                    self.num_jobs += 1
+
+    def past_deadline(self):
+        return self.deadline is not None and time.time() > self.deadline
+
+    def run_jobs(self, queue, index=0, progress=None, handoffs=None, cookies=None, running=None):
+        """
+        Initialize a SOLUS session and run the jobs, reporting to `progress` if given.
+
+        If `running` is given, (index, job) is sent through it when the worker
+        starts a job and (index, None) when it's done with it (before handing
+        off any of it), so `start_jobs` can give the job to another worker if
+        this one stalls. The worker then exits cleanly when it's terminated.
+
+        If `handoffs` is given, the worker is recycled when it goes over its memory
+        or job budget: the rest of its job goes back in the queue, its index and
+        session cookies are sent through `handoffs`, and it exits so `start_jobs`
+        can replace it with a fresh process.
+
+        Past the deadline, the rest of the job goes back in the queue and the worker stops.
+        Otherwise the worker stops once there are no jobs left, including jobs
+        leased from a shared queue (in case they're abandoned).
+        """
+
+        if progress is not None:
+            progress.set("pid", os.getpid())
+
+        if running is not None:
+            # Unwinds like any other exit, so the queues shared with the other processes are left usable
+            signal.signal(signal.SIGTERM, _exit_stalled)
+
+        if self.past_deadline():
+            return
 
-    def run_jobs(self, queue):
-        """Initialize a SOLUS session and run the jobs"""
+        # Every request shows the worker isn't stuck, even when it takes a while to finish anything
+        heartbeat = progress.beat if progress is not None else None
 
         # Initialize the session
         try:
-            session = SolusSession(self.user, self.passwd)
+            session = SolusSession(self.user, self.passwd, cookies=cookies, name=u"worker{0}".format(index), heartbeat=heartbeat)
         except EnvironmentError as e:
             logging.critical(e)
             # Can't log in, therefore can't do any jobs
@@ -84,48 +244,251 @@ class JobManager(object):
             # the scraper will still work
             return
 
+        # Logged in the first time a course is big enough to need them
+        helpers = HelperSessions(self.user, self.passwd, COURSE_HELPERS, session.name, heartbeat) if COURSE_HELPERS else None
+
+        # The raw pages, to extract the data from again later (see `archive`)
+        archive = Archive(ARCHIVE_DIR) if ARCHIVE_DIR else None
+
+        def over_budget():
+            if self.past_deadline():
+                return True
+            rss = current_rss()
+            if progress is not None:
+                progress.set("rss", rss)
+            return handoffs is not None and bool(WORKER_MAX_RSS_MB) and rss > WORKER_MAX_RSS_MB * 1024 * 1024
+
         # Run all the jobs in the job queue
+        jobs_run = 0
         while True:
+            if self.past_deadline():
+                logging.warning("Reached the deadline, not starting any more jobs")
+                return
+
             try:
                 job = queue.get_nowait()
             except Empty as e:
+                # Jobs leased to workers that died are handed out again when their leases run out
+                if isinstance(queue, SharedJobQueue) and queue.status().get("leased"):
+                    if progress is not None:
+                        progress.beat()
+                    time.sleep(LEASE_POLL_SECONDS)
+                    continue
                 return
 
+            if progress is not None:
+                progress.add("jobs_started")
+            if running is not None:
+                running.put((index, job))
+
+            # Jobs from a shared queue are leased and need heartbeats while they run
+            leased = isinstance(queue, SharedJobQueue)
+            if leased:
+                stop_heartbeat = queue.keep_alive(job)
+
             # Run the job
-            if PROFILE:
-                import cProfile
-                cProfile.runctx("SolusScraper(session, job).start()", globals(), locals())
+            try:
+                scraper = SolusScraper(session, job, progress, over_budget, helpers, archive)
+                if PROFILE:
+                    name = u"job-{0}-{1}".format(job["letters"][:3], job["subject_start"])
+                    remaining = profiling.profile(scraper.start, name, PROFILE)
+                else:
+                    remaining = scraper.start()
+            except Exception:
+                if leased:
+                    # Let another worker have a go at it
+                    stop_heartbeat.set()
+                    queue.task_failed(job)
+                raise
+
+            # Whatever happens to this worker now, the job mustn't be given to another one as well
+            if running is not None:
+                running.put((index, None))
+
+            # Queue up the rest of a job that was stopped early before finishing it so it can't be lost
+            for part in remaining or ():
+                queue.put_nowait(ScrapeJob(part))
+
+            if leased:
+                stop_heartbeat.set()
+                queue.task_done(job)
+
+            if progress is not None:
+                progress.add("jobs_done")
+            jobs_run += 1
+
+            # Hand off to a fresh process (unless it's time to stop anyway)
+            if handoffs is not None and not self.past_deadline() and (remaining or over_budget() or (WORKER_MAX_JOBS and jobs_run >= WORKER_MAX_JOBS)):
+                logging.info(u"Recycling worker after %s jobs (RSS: %.0f MB)", jobs_run, current_rss() / (1024.0 * 1024))
+                if progress is not None:
+                    progress.add("recycled")
+                handoffs.put((index, session.session.cookies))
+                sys.exit(RECYCLE_EXIT_CODE)
+
+    def run_textbook_job(self, job):
+        """Scrape the textbooks (fetches using its own pool of threads)"""
+
+        logging.info(u"Starting textbook job: {0}".format(job))
+        try:
+            TextbookScraper(dict(job)).scrape()
+        except Exception:
+            # Don't take the SOLUS scrape down with it
+            logging.exception("Textbook scrape failed")
+
+    def _start_worker(self, index, progress, handoffs, running, cookies=None):
+        """Starts a process that runs jobs from the queue"""
+        worker = Process(target=self.run_jobs, args=(self.jobs, index, progress.worker(index), handoffs, cookies, running))
+        worker.start()
+        return worker
+
+    def _stalled(self, index, progress):
+        """Checks if a worker has gone too long without making any progress (ex: a hung connection)"""
+        idle = progress.idle_seconds(index)
+        return bool(WORKER_STALL_SECONDS) and idle is not None and idle > WORKER_STALL_SECONDS
+
+    def _reclaim(self, index, worker, job, progress):
+        """Kills a stalled worker and puts the job it was on back in the queue"""
+        logging.error(u"Worker %s made no progress in %.0fs, restarting it", index, progress.idle_seconds(index))
+        worker.terminate()
+        worker.join(STOP_SECONDS)
+        if worker.is_alive():
+            # Could leave a queue it was writing to locked, but it's not going anywhere otherwise
+            logging.error(u"Worker %s didn't stop, killing it", index)
+            os.kill(worker.pid, getattr(signal, "SIGKILL", signal.SIGTERM))
+            worker.join()
+
+        if job is not None:
+            logging.warning(u"Re-queueing its job: %s", job)
+            if isinstance(self.jobs, SharedJobQueue):
+                # Its heartbeats stopped with it, but there's no need to wait for the lease to run out
+                self.jobs.task_failed(job)
             else:
-                SolusScraper(session, job).start()
+                self.jobs.put_nowait(job)
+
+        # (Also resets how long it's been idle)
+        progress.worker(index).add("stalled")
 
     def start_jobs(self):
         """Start the threads that perform the jobs"""
 
+        if PROFILE:
+            profiling.clear()
+
         threads = []
-        for x in range(self.config["threads"]):
-            threads.append(Process(target=self.run_jobs, args=(self.jobs,)))
+
+        # Run the textbook scrape at the same time as the SOLUS jobs
+        if self.config.get("textbooks") is not None:
+            threads.append(Process(target=self.run_textbook_job, args=(self.config["textbooks"],), name="Textbooks"))
             threads[-1].start()
 
+        # Counters shared with the workers, reported while they run
+        progress = Progress(self.config["threads"], self.num_jobs)
+
+        if self.config.get("deadline"):
+            self.deadline = progress.start_time + self.config["deadline"]
+        reporter = StatusReporter(progress, STATUS_FILE, STATUS_INTERVAL, STATUS_PORT)
+        reporter.start()
+
+        # Workers send their index and cookies here when they're recycled
+        handoffs = Queue()
+        cookies = {}
+
+        # The job each worker is on, to give to another one if it stalls
+        running = Queue()
+        current = {}
+
+        workers = {}
+        for x in range(self.config["threads"]):
+            workers[x] = self._start_worker(x, progress, handoffs, running)
+
+        # Replace recycled (and stalled) workers until they're all done
+        while workers:
+            time.sleep(1)
+
+            # Keep the queue drained so exiting workers never block on it
+            while True:
+                try:
+                    index, jar = handoffs.get_nowait()
+                except Empty:
+                    break
+                cookies[index] = jar
+
+            while True:
+                try:
+                    index, job = running.get_nowait()
+                except Empty:
+                    break
+                current[index] = job
+
+            for index, worker in list(workers.items()):
+                if worker.is_alive():
+                    if self._stalled(index, progress):
+                        # Logs in again, the session may be what's stuck
+                        self._reclaim(index, worker, current.pop(index, None), progress)
+                        workers[index] = self._start_worker(index, progress, handoffs, running)
+                    continue
+                del workers[index]
+                current.pop(index, None)
+
+                if worker.exitcode == RECYCLE_EXIT_CODE:
+                    # Sent before it exited
+                    while index not in cookies:
+                        i, jar = handoffs.get()
+                        cookies[i] = jar
+                    workers[index] = self._start_worker(index, progress, handoffs, running, cookies.pop(index))
+
+        # Whatever is left over was skipped (ran out of time, or the workers crashed)
+        progress.skipped = self.jobs.pending()
+        if progress.skipped:
+            logging.warning(u"Skipped %s jobs:", len(progress.skipped))
+            for job in progress.skipped:
+                logging.warning(u"  Tier %(tier)s (priority %(priority)s): letters %(letters)s, every %(subject_step)s subjects from %(subject_start)s", job)
+
         for t in threads:
             t.join()
 
+        reporter.stop()
+
+        # Compare with the last census (the coordinator of a shared queue only has its own part, see README)
+        if self.config["job"]["census"] and not self.config.get("worker_only"):
+            census.build()
+
+        # Combine the profiles from all the processes
+        if PROFILE:
+            profiling.merge_reports()
+
+
+def _exit_stalled(signum, frame):
+    """Stops a worker that's being replaced (see `JobManager._reclaim`)"""
+    raise SystemExit("Stopped by the stall watchdog")
+
 
 def _init_logging():
+    """
+    Sends the logging of all processes to a single listener process.
+    Returns the EventLog, which has to be closed when done.
+    """
 
-    root_logger = logging.getLogger()
+    try:
+        from config import EVENT_LOG
+    except ImportError:
+        EVENT_LOG = None
+    try:
+        from config import CONSOLE_LOG_LEVEL
+    except ImportError:
+        CONSOLE_LOG_LEVEL = "INFO"
 
-    handler = logging.StreamHandler(sys.stdout)
-    handler.setFormatter(logging.Formatter("[%(asctime)s][%(levelname)s][%(processName)s]: %(message)s"))
-    root_logger.addHandler(handler)
-    root_logger.setLevel(logging.INFO)
+    event_log = EventLog(EVENT_LOG, console_level=logging.getLevelName(CONSOLE_LOG_LEVEL) if CONSOLE_LOG_LEVEL else None)
 
     logging.getLogger("requests").setLevel(logging.WARNING)
 
+    return event_log
+
 
 if __name__ == "__main__":
 
     # Setup the logger before any logging happens
-    _init_logging()
+    event_log = _init_logging()
 
     # Get credientials
     try:
@@ -133,13 +496,36 @@ if __name__ == "__main__":
     except ImportError:
         logging.critical("No credientials found. Create a config.py file with USER, PASS, and PROFILE constants")
 
+    # Optional arguments for distributed scrapes
+    parser = argparse.ArgumentParser(description="Scrapes SOLUS")
+    parser.add_argument("--queue", help="SQLite database (on a shared disk) to use as a job queue shared between machines")
+    parser.add_argument("--worker", action="store_true", help="only work on jobs from the --queue, another machine is coordinating")
+    parser.add_argument("--deadline", type=float, metavar="MINUTES", help="stop starting new work after this long, doing the most valuable work first")
+    parser.add_argument("--census", action="store_true", help="only list the subjects and courses, and compare them with the last census")
+    args = parser.parse_args()
+
     config = dict(
         name = "Shallow scrape with threading",
         description = "Scrapes the entire catalog using multiple threads",
         threads = 1,
         job = ScrapeJob(letters="ABCDEFGHIJKLMNOPQRSTUVWXYZ", deep=False),
         threads_per_letter = 1,
+        textbooks = TextbookJob(),
+        queue = args.queue,
+        worker_only = args.worker,
+        deadline = args.deadline * 60 if args.deadline else None,
     )
 
+    if args.worker:
+        # The coordinator handles the textbooks
+        config["textbooks"] = None
+
+    if args.census:
+        config.update(name="Census", description="Lists the subjects and courses in the catalog", textbooks=None)
+        config["job"] = ScrapeJob(config["job"], census=True)
+
     # Start scraping
-    JobManager(USER, PASS, config).start()
+    try:
+        JobManager(USER, PASS, config).start()
+    finally:
+        event_log.close()
@@ -0,0 +1,224 @@
+try:
+    from sys import intern
+except ImportError:
+    # Python 2.x
+    pass
+
+
+def _intern(s):
+    """
+    Interns a string so repeated values (instructors, rooms, etc) share memory.
+    Subclasses become plain strings (bs4's NavigableString keeps its whole page alive).
+    """
+    if isinstance(s, str):
+        return intern(str(s))
+    return s
+
+
+class Record(object):
+    """
+    Base class for the compact scraped data records.
+
+    Records only store their attributes in `__slots__` and convert to and from
+    the dicts produced by `SolusParser` with `from_dict` and `to_dict`.
+    """
+
+    __slots__ = ()
+
+    def __eq__(self, other):
+        if type(self) is not type(other):
+            return NotImplemented
+        return all(getattr(self, x) == getattr(other, x) for x in self.__slots__)
+
+    def __ne__(self, other):
+        ret = self.__eq__(other)
+        return ret if ret is NotImplemented else not ret
+
+    __hash__ = None
+
+    def __repr__(self):
+        return u"{0}({1})".format(type(self).__name__, ", ".join(u"{0}={1!r}".format(x, getattr(self, x)) for x in self.__slots__))
+
+
+class Subject(Record):
+    """
+    A subject
+
+    Attributes: title, abbreviation, unique
+    """
+
+    __slots__ = ("title", "abbreviation", "unique")
+
+    def __init__(self, title, abbreviation, unique):
+        self.title = title
+        self.abbreviation = _intern(abbreviation)
+        self.unique = unique
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d["title"], d["abbreviation"], d["_unique"])
+
+    def to_dict(self):
+        return dict(title=self.title, abbreviation=self.abbreviation, _unique=self.unique)
+
+
+class Course(Record):
+    """
+    A course
+
+    Attributes: title, number, description, subject, extra
+    `extra` is the dict of additional attributes from `SolusParser.course_attrs`
+    `subject` is None until the scraper fills it in
+    """
+
+    __slots__ = ("title", "number", "description", "subject", "extra")
+
+    def __init__(self, title, number, description, subject=None, extra=None):
+        self.title = title
+        self.number = _intern(number)
+        self.description = description
+        self.subject = _intern(subject)
+        self.extra = extra if extra is not None else {}
+
+    @classmethod
+    def from_dict(cls, d):
+        basic = d["basic"]
+        return cls(basic["title"], basic["number"], basic["description"], basic.get("subject"), d.get("extra"))
+
+    def to_dict(self):
+        basic = dict(title=self.title, number=self.number, description=self.description)
+        if self.subject is not None:
+            basic["subject"] = self.subject
+        return dict(basic=basic, extra=self.extra)
+
+
+class Meeting(Record):
+    """
+    A meeting pattern of a section (a row in the meeting table)
+
+    Attributes: days, start_time, end_time, location, instructors, term_start, term_end
+    `days` is a tuple of the numeric days (1-7) in the order SOLUS lists them,
+    or `(None,)` for 'TBA' meetings. `instructors` is a tuple.
+
+    The parser's class dicts repeat all the other attributes for every day,
+    here they're only stored once.
+    """
+
+    __slots__ = ("days", "start_time", "end_time", "location", "instructors", "term_start", "term_end")
+
+    def __init__(self, days, start_time, end_time, location, instructors, term_start, term_end):
+        self.days = tuple(days)
+        self.start_time = start_time
+        self.end_time = end_time
+        self.location = _intern(location)
+        self.instructors = tuple(_intern(x) for x in instructors)
+        self.term_start = term_start
+        self.term_end = term_end
+
+    def _key(self):
+        return (self.start_time, self.end_time, self.location, self.instructors, self.term_start, self.term_end)
+
+    @classmethod
+    def from_classes(cls, classes):
+        """Groups a list of class dicts (as in a section's "classes") into meetings"""
+        ret = []
+        for c in classes:
+            m = cls((c["day_of_week"],), c["start_time"], c["end_time"], c["location"], c["instructors"], c["term_start"], c["term_end"])
+
+            # Consecutive days with identical attributes come from the same row
+            if ret and None not in ret[-1].days and c["day_of_week"] is not None and ret[-1]._key() == m._key():
+                ret[-1].days += m.days
+            else:
+                ret.append(m)
+        return ret
+
+    def to_classes(self):
+        """Expands the meeting back into one class dict per day"""
+        return [{
+            'day_of_week': day,
+            'start_time': self.start_time,
+            'end_time': self.end_time,
+            'location': self.location,
+            'instructors': list(self.instructors),
+            'term_start': self.term_start,
+            'term_end': self.term_end,
+        } for day in self.days]
+
+
+class Section(Record):
+    """
+    A section of a course in a term
+
+    Attributes: unique, solus_id, type, class_num, status, meetings,
+                course, subject, year, season, details, availability
+    `course`, `subject`, `year`, and `season` are None until the scraper fills them in.
+    `details` and `availability` are only set by deep scrapes.
+    """
+
+    __slots__ = ("unique", "solus_id", "type", "class_num", "status", "meetings",
+                 "course", "subject", "year", "season", "details", "availability")
+
+    _CONTEXT = ("course", "subject", "year", "season")
+
+    def __init__(self, unique, solus_id, type, class_num, status, meetings=(),
+                 course=None, subject=None, year=None, season=None, details=None, availability=None):
+        self.unique = unique
+        self.solus_id = solus_id
+        self.type = _intern(type)
+        self.class_num = class_num
+        self.status = _intern(status)
+        self.meetings = list(meetings)
+        self.course = _intern(course)
+        self.subject = _intern(subject)
+        self.year = _intern(year)
+        self.season = _intern(season)
+        self.details = details
+        self.availability = availability
+
+    @classmethod
+    def from_dict(cls, d):
+        basic = d["basic"]
+        ret = cls(d["_unique"], basic["solus_id"], basic["type"], basic["class_num"], basic["status"],
+                  Meeting.from_classes(d.get("classes", [])))
+        ret.place(*[basic.get(x) for x in cls._CONTEXT])
+        ret.add_deep_attrs(d)
+        return ret
+
+    def place(self, course, subject, year, season):
+        """Sets the course, subject, and term the section is in"""
+        self.course = _intern(course)
+        self.subject = _intern(subject)
+        self.year = _intern(year)
+        self.season = _intern(season)
+
+    def add_deep_attrs(self, d):
+        """Adds the details and availability (from `SolusParser.section_deep_attrs`) in `d`, if any"""
+        if d.get("details") is not None:
+            self.details = dict((k, _intern(v)) for k, v in d["details"].items())
+        if d.get("availability") is not None:
+            self.availability = d["availability"]
+
+    def basic(self):
+        """Returns the "basic" dict of the section"""
+        ret = dict(solus_id=self.solus_id, type=self.type, class_num=self.class_num, status=self.status)
+        for x in self._CONTEXT:
+            if getattr(self, x) is not None:
+                ret[x] = getattr(self, x)
+        return ret
+
+    def to_dict(self):
+        ret = {
+            "_unique": self.unique,
+            "basic": self.basic(),
+            "classes": [c for m in self.meetings for c in m.to_classes()],
+        }
+        if self.details is not None:
+            ret["details"] = self.details
+        if self.availability is not None:
+            ret["availability"] = self.availability
+        return ret
+
+
+def as_dict(obj):
+    """Returns the dict form of a record, passes dicts through untouched"""
+    return obj.to_dict() if isinstance(obj, Record) else obj
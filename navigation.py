@@ -1,12 +1,27 @@
+import re
 import logging
 import ssl
+import os
+import json
+import time
+import zipfile
+from collections import deque
 import requests
 from requests.adapters import HTTPAdapter
 from requests.packages.urllib3.poolmanager import PoolManager
-from requests.exceptions import ConnectionError
+from requests.exceptions import ConnectionError, HTTPError, Timeout
 from time import sleep
 
+try:
+    from html import unescape
+except ImportError:
+    from HTMLParser import HTMLParser
+    unescape = HTMLParser().unescape
+
 from parser import SolusParser
+from navmap import NavigationMap, NAV_MAP_PATH
+from sessionstore import SessionStore, SESSION_STORE_DIR
+from profiling import phase
 
 try:
     from config import MAX_RETRIES, RETRY_SLEEP_SECONDS
@@ -14,6 +29,46 @@ except ImportError:
     MAX_RETRIES = 5
     RETRY_SLEEP_SECONDS = 10
 
+# Seconds to wait for SOLUS to accept a connection, and for each read of the response (None to wait forever)
+try:
+    from config import REQUEST_TIMEOUT
+except ImportError:
+    REQUEST_TIMEOUT = (10, 60)
+
+try:
+    from config import STREAM_PARSE
+except ImportError:
+    STREAM_PARSE = False
+
+try:
+    from config import LOG_DIR
+except ImportError:
+    LOG_DIR = "./logs"
+
+try:
+    from config import DUMP_HISTORY_SIZE
+except ImportError:
+    DUMP_HISTORY_SIZE = 10
+
+try:
+    from config import RESPONSE_ENCODING
+except ImportError:
+    RESPONSE_ENCODING = "utf-8"
+
+# Size of the chunks fed to the parser when streaming
+STREAM_CHUNK_SIZE = 16 * 1024
+
+# Only the start of a response is searched for the error message (None for all of it)
+try:
+    from config import DIE_SEARCH_BYTES
+except ImportError:
+    DIE_SEARCH_BYTES = 64 * 1024
+
+DATA_INTEGRITY_ERROR = b"Data Integrity Error"
+
+# Markup inside the text of a link (see `_link_text`)
+_TAGS = re.compile(b"<[^>]*>")
+
 
 class SSLAdapter(HTTPAdapter):
     '''An HTTPS Transport Adapter that uses an arbitrary SSL version.
@@ -30,6 +85,17 @@ class SSLAdapter(HTTPAdapter):
                                        ssl_version=self.ssl_version)
 
 
+def _timed_chunks(chunks):
+    """Yields the chunks of a streamed response, timing the reads as network time"""
+    chunks = iter(chunks)
+    while True:
+        with phase("network"):
+            chunk = next(chunks, None)
+        if chunk is None:
+            return
+        yield chunk
+
+
 class SolusSession(object):
     """Represents a solus browsing session"""
 
@@ -37,7 +103,16 @@ class SolusSession(object):
     continue_url = "SAML2/Redirect/SSO"
     course_catalog_url = "https://saself.ps.queensu.ca/psc/saself/EMPLOYEE/HRMS/c/SA_LEARNER_SERVICES.SSS_BROWSE_CATLG_P.GBL"
 
-    def __init__(self, user=None, password=None):
+    def __init__(self, user=None, password=None, cookies=None, name=None, heartbeat=None):
+        """
+        Logs in and navigates to the course catalog.
+        `cookies` from another session (ex: of a recycled worker) skip the login if they're still valid.
+        With a `name` (ex: the index of the worker), the cookies are saved to
+        SESSION_STORE_DIR for the next session with that name (see `sessionstore`).
+        `heartbeat` is called after every request (ex: to show the worker isn't stuck).
+        """
+        self.name = name
+        self.heartbeat = heartbeat
         self.session = requests.session()
 
         # Use SSL version 1
@@ -47,20 +122,48 @@ class SolusSession(object):
         self._parser = SolusParser()
         self._update_parser = False
 
+        # Actions of the subjects and courses found in this and previous runs
+        self.nav_map = NavigationMap(NAV_MAP_PATH) if NAV_MAP_PATH else None
+
         # Response data
+        # Bodies are kept as bytes, they're only decoded by the parser (using RESPONSE_ENCODING)
+        # When streaming, the body is parsed as it downloads
         self.latest_response = None
-        self.latest_text = None
+        self.latest_content = None
+
+        # The most recent responses, dumped for debugging when something goes wrong
+        self.history = deque(maxlen=DUMP_HISTORY_SIZE)
+
+        # Statistics, for progress reporting
+        self.request_count = 0
+        self.recovery_count = 0
 
         # Recover from errors
         self.recovery_state = -1 #State of recovery ( < 0 is not recovering, otherwise the current recovery level)
         self.recovery_stack = [None, None, None, None, None] #letter, subj subject, course, term, section
 
+        # Cookies of the last session with this name (unless some are given)
+        store = SessionStore(user, password) if name is not None and SESSION_STORE_DIR else None
+        if cookies is None and store is not None:
+            cookies = store.load(name)
+
+        # Try to pick up where another session left off
+        if cookies is not None:
+            logging.info("Reusing session cookies...")
+            self.session.cookies.update(cookies)
+            self.go_to_course_catalog()
+            if self.latest_response.url != self.course_catalog_url:
+                logging.info("Session cookies were rejected")
+                self.session.cookies.clear()
+                cookies = None
+
         # Authenticate and navigate to course catalog
-        logging.info("Logging in...")
-        self.login(user, password)
+        if cookies is None:
+            logging.info("Logging in...")
+            self.login(user, password)
 
-        logging.info("Navigating to course catalog...")
-        self.go_to_course_catalog()
+            logging.info("Navigating to course catalog...")
+            self.go_to_course_catalog()
 
         # Should now be on the course catalog page. If not, something went wrong
         if self.latest_response.url != self.course_catalog_url:
@@ -69,14 +172,23 @@ class SolusSession(object):
             # Sticking with v2.0.1 until the issue is resolved
             raise EnvironmentError("Authenticated, but couldn't access the SOLUS course catalog.")
 
+        if store is not None:
+            store.save(name, self.session.cookies)
+
     @property
     def parser(self):
         """Updates the parser with new HTML (if needed) and returns it"""
         if self._update_parser:
-            self._parser.update_html(self.latest_text)
+            with phase("parse"):
+                self._parser.update_html(self.latest_content, RESPONSE_ENCODING)
             self._update_parser = False
         return self._parser
 
+    @property
+    def parse_cache(self):
+        """The cache of parsed pages (for its statistics)"""
+        return self._parser.cache
+
     def login(self, user, password):
         """Logs into the site"""
 
@@ -125,11 +237,36 @@ class SolusSession(object):
         self._catalog_post("")
         self.select_alphanum("A")
 
+    def location(self):
+        """Returns where the session is in the catalog (letter, subject, course, term), see `go_to_location`"""
+        return list(self.recovery_stack[:4])
+
+    def go_to_location(self, location):
+        """Navigates to the `location` of another session (ex: to share the work on a course with it)"""
+        letter, subject_unique, course_unique, term_unique = location
+
+        self.go_to_course_catalog()
+        if letter is None:
+            return
+        if letter != self.recovery_stack[0]:
+            self.select_alphanum(letter)
+        if subject_unique is None:
+            return
+        self.dropdown_subject(subject_unique)
+        if course_unique is None:
+            return
+        self.open_course(course_unique)
+        self.show_sections()
+        if term_unique is None:
+            return
+        self.switch_to_term(term_unique)
+        self.view_all_sections()
+
     # ----------------------------- Alphanums ------------------------------------ #
 
     def select_alphanum(self, alphanum):
         """Navigates to a letter/number"""
-        logging.debug(u"Selecting letter {0}".format(alphanum))
+        logging.debug(u"Selecting letter %s", alphanum)
         self._catalog_post(u'DERIVED_SSS_BCC_SSR_ALPHANUM_{0}'.format(alphanum.upper()))
 
         if self.recovery_state < 0:
@@ -139,11 +276,16 @@ class SolusSession(object):
 
     def dropdown_subject(self, subject_unique):
         """Opens the dropdown menu for a subject"""
-        logging.debug(u"Dropping down subject with unique '{0}'".format(subject_unique))
+        logging.debug(u"Dropping down subject with unique '%s'", subject_unique)
+        letter = self.recovery_stack[0]
 
-        action = self.parser.subject_action(subject_unique)
+        action = self._mapped_action(subject_unique)
         if not action:
-            raise Exception(u"Tried to drop down an invalid subject unique '{0}'".format(subject_unique))
+            action = self.parser.subject_action(subject_unique)
+            if not action:
+                raise Exception(u"Tried to drop down an invalid subject unique '{0}'".format(subject_unique))
+            if self.nav_map is not None:
+                self.nav_map.put(letter, subject_unique, "", action)
 
         self._catalog_post(action)
 
@@ -152,9 +294,11 @@ class SolusSession(object):
 
     def rollup_subject(self, subject_unique):
         """Closes the dropdown menu for a subject"""
-        logging.debug(u"Rolling up subject with a unique '{0}'".format(subject_unique))
+        logging.debug(u"Rolling up subject with a unique '%s'", subject_unique)
 
-        action = self.parser.subject_action(subject_unique)
+        action = self._mapped_action(subject_unique)
+        if not action:
+            action = self.parser.subject_action(subject_unique)
         if not action:
             raise Exception(u"Tried to roll up an invalid subject unique '{0}'".format(subject_unique))
 
@@ -167,12 +311,24 @@ class SolusSession(object):
 
     def open_course(self, course_unique):
         """Opens a course page"""
-        logging.debug(u"Opening course with unique '{0}'".format(course_unique))
+        logging.debug(u"Opening course with unique '%s'", course_unique)
+        letter, subject_unique = self.recovery_stack[0], self.recovery_stack[1]
 
-        action = self.parser.course_action(course_unique)
+        action = self._mapped_action(subject_unique, course_unique)
         if not action:
-            raise Exception(u"Tried to open a course with an invalid unique '{0}'".format(course_unique))
-        
+            action = self.parser.course_action(course_unique)
+            if not action:
+                raise Exception(u"Tried to open a course with an invalid unique '{0}'".format(course_unique))
+            if self.nav_map is not None:
+                self.nav_map.put(letter, subject_unique, course_unique, action)
+
+        self._post_course_action(action)
+
+        # unsure if this still works 
+        if self.recovery_state < 0:
+            self.recovery_stack[2] = course_unique
+
+    def _post_course_action(self, action):
         self._catalog_post(action)
         
         #attempt to go one level deeper to deal with courses which have multiple 'careers'
@@ -181,10 +337,49 @@ class SolusSession(object):
         if secondaryAction:
             logging.error(u"POSTING: {0}".format(secondaryAction))
             self._catalog_post(secondaryAction)
-        
-        # unsure if this still works 
-        if self.recovery_state < 0:
-            self.recovery_stack[2] = course_unique
+
+    def _mapped_action(self, subject_unique, course_unique=""):
+        """
+        Returns the action of a subject or course from the navigation map, None if it
+        isn't mapped or its link isn't on the current page (checked without parsing it).
+        """
+        if self.nav_map is None:
+            return None
+
+        letter = self.recovery_stack[0]
+        action = self.nav_map.get(letter, subject_unique, course_unique)
+
+        # Posting an action that isn't on the page is a Data Integrity Error
+        text = self._link_text(action) if action else None
+        if text is None:
+            return None
+
+        # The links are numbered by position, so a subject or course added before it moves it
+        if text != (course_unique or subject_unique):
+            logging.info(u"Navigation map is out of date for '%s'", course_unique or subject_unique)
+            self.nav_map.forget(letter, subject_unique, course_unique)
+            return None
+
+        self.nav_map.stats["jumps"] += 1
+        return action
+
+    def _link_text(self, action):
+        """Returns the text of the link with the id `action` on the current page (None if there isn't one)"""
+        content = self.latest_content or b""
+        action = action.encode("utf-8")
+        for quote in (b'"', b"'"):
+            start = content.find(b"id=" + quote + action + quote)
+            if start != -1:
+                break
+        else:
+            return None
+
+        # Same as the parser's `.get_text()` of the link
+        start = content.find(b">", start) + 1
+        end = content.find(b"</a>", start)
+        if not start or end == -1:
+            return None
+        return unescape(_TAGS.sub(b"", content[start:end]).decode(RESPONSE_ENCODING, "replace"))
 
     def return_from_course(self):
         """Navigates back from course to subject"""
@@ -208,7 +403,7 @@ class SolusSession(object):
 
     def switch_to_term(self, term_unique):
         """Shows the sections for the term"""
-        logging.debug(u"Switching to term with unique '{0}'".format(term_unique))
+        logging.debug(u"Switching to term with unique '%s'", term_unique)
         value = self.parser.term_value(term_unique)
 
         self._catalog_post(action='DERIVED_SAA_CRS_SSR_PB_GO$98$', extras={'DERIVED_SAA_CRS_TERM_ALT': value})
@@ -229,7 +424,7 @@ class SolusSession(object):
         Opens the dedicated page for the provided section unique.
         Used for deep scrapes
         """
-        logging.debug(u"Visiting section page for section with unique '{0}'".format(section_unique))
+        logging.debug(u"Visiting section page for section with unique '%s'", section_unique)
 
         action = self.parser.section_action(section_unique)
         if not action:
@@ -249,43 +444,200 @@ class SolusSession(object):
         self._catalog_post('CLASS_SRCH_WRK2_SSR_PB_CLOSE')
         self.recovery_stack[4] = None
 
+    # ----------------------------- Class Search ---------------------------------- #
+
+    # Lists all the sections of a subject in a term on one page, much faster than walking the catalog
+    class_search_url = "https://saself.ps.queensu.ca/psc/saself/EMPLOYEE/HRMS/c/SA_LEARNER_SERVICES.CLASS_SEARCH.GBL"
+
+    SEARCH_TERM = "CLASS_SRCH_WRK2_STRM$35$"
+    SEARCH_SUBJECT = "SSR_CLSRCH_WRK_SUBJECT_SRCH$0"
+    SEARCH_COURSE_NUMBER = "SSR_CLSRCH_WRK_CATALOG_NBR$1"
+    SEARCH_COURSE_NUMBER_MATCH = "SSR_CLSRCH_WRK_SSR_EXACT_MATCH1$1"
+    SEARCH_OPEN_ONLY = "SSR_CLSRCH_WRK_SSR_OPEN_ONLY$chk$3"
+
+    def go_to_class_search(self):
+        """Navigates to the class search page"""
+        logging.debug("Navigating to class search")
+        self._get(self.class_search_url)
+
+    def search_classes(self, term_value, subject, course_number=None):
+        """
+        Searches for all the classes (open or not) of a subject (or a course of it) in a term.
+        Returns False if there were too many results to show, search each course instead.
+        """
+        logging.debug(u"Searching for %s %s classes in term %s", subject, course_number or "", term_value)
+
+        # Start from a blank search
+        self.go_to_class_search()
+
+        extras = {
+            self.SEARCH_TERM: term_value,
+            self.SEARCH_SUBJECT: subject,
+            self.SEARCH_OPEN_ONLY: "N",
+        }
+        if course_number:
+            extras[self.SEARCH_COURSE_NUMBER] = course_number
+            extras[self.SEARCH_COURSE_NUMBER_MATCH] = "E"
+        self._search_post("CLASS_SRCH_WRK2_SSR_PB_CLASS_SRCH", extras)
+
+        # Large searches have to be confirmed
+        action = self.parser.search_confirm_action()
+        if action:
+            self._search_post(action)
+
+        return not self.parser.search_too_many_results()
+
+    def visit_search_section(self, class_num):
+        """Navigates to the page of a section in the search results. Used for deep scrapes"""
+        logging.debug(u"Visiting section page for class number '%s'", class_num)
+
+        action = self.parser.search_section_action(class_num)
+        if not action:
+            raise Exception(u"Tried to open a section with an invalid class number '{0}'".format(class_num))
+
+        self._search_post(action)
+
+    def return_to_search_results(self):
+        """Navigates back from a section to the search results"""
+        logging.debug("Returning to search results")
+        self._search_post("CLASS_SRCH_WRK2_SSR_PB_BACK")
+
+    def _search_post(self, action, extras=None):
+        """Submits a post request to the class search"""
+        if extras is None:
+            extras = {}
+        extras['ICAction'] = action
+        self._post(self.class_search_url, data=extras)
+
+        # Search pages are cheap to get back to, so the scraper just redoes the search
+        if self._is_data_integrity_error():
+            self.recovery_count += 1
+            raise EnvironmentError(u"SOLUS Data Integrity Error while searching (action '{0}')".format(action))
+
     # -----------------------------General Purpose------------------------------------- #
 
 
     def _get(self, url, **kwargs):
-        self.latest_response = self._request_with_retries(getattr(self.session, 'get'), url, **kwargs)
-        self._update_attrs()
+        kwargs.setdefault('stream', STREAM_PARSE)
+        start = time.time()
+        self._request_with_retries(getattr(self.session, 'get'), url, **kwargs)
+        self.request_count += 1
+        self._record_history('GET', start, kwargs)
 
 
     def _post(self, url, **kwargs):
-        self.latest_response = self._request_with_retries(getattr(self.session, 'post'), url, **kwargs)
-        self._update_attrs()
+        kwargs.setdefault('stream', STREAM_PARSE)
+        start = time.time()
+        self._request_with_retries(getattr(self.session, 'post'), url, **kwargs)
+        self.request_count += 1
+        self._record_history('POST', start, kwargs)
+
+
+    def _record_history(self, method, start, kwargs):
+        """Keeps a reference to the raw response body (no copying or parsing)"""
+        if self.history.maxlen == 0:
+            return
+
+        data = kwargs.get('data') or {}
+        self.history.append(dict(
+            method=method,
+            url=self.latest_response.url,
+            status=self.latest_response.status_code,
+            action=data.get('ICAction'),
+            start=start,
+            elapsed=time.time() - start,
+            content=self.latest_content,
+        ))
+
+
+    def dump_history(self):
+        """
+        Dumps the most recent responses and their ICActions and timings into a zip file in the log directory.
+        Returns the name of the file, None if there was nothing to dump.
+        """
+        if not self.history:
+            return None
+
+        logging.critical(u"Encountered exception, dumping the last {0} responses".format(len(self.history)))
+
+        try:
+            os.makedirs(LOG_DIR)
+        except OSError:
+            pass
+
+        # Timestamp, PID, and session name (helper sessions dump from the same process) make the name
+        # unique without probing the filesystem
+        filename = os.path.join(LOG_DIR, "dump_{0}_{1:03d}_{2}{3}.zip".format(
+            time.strftime("%Y%m%d-%H%M%S"), int(time.time() * 1000) % 1000, os.getpid(),
+            u"_{0}".format(self.name) if self.name is not None else ""))
+
+        index = []
+        with zipfile.ZipFile(filename, "w", zipfile.ZIP_DEFLATED) as z:
+            for i, entry in enumerate(self.history):
+                meta = dict((k, v) for k, v in entry.items() if k != 'content')
+                meta['file'] = "{0:02d}.html".format(i)
+                index.append(meta)
+                z.writestr(meta['file'], entry['content'] or b"")
+            z.writestr("index.json", json.dumps(index, indent=4, sort_keys=True))
+
+        logging.critical(u"Dumped responses to {0}".format(filename))
+        return filename
 
 
     def _request_with_retries(self, method, *args, **kwargs):
-        result = None
+        """
+        Sends a request and reads the response (see `_update_attrs`).
+        Connection errors, timeouts (also while streaming the body), and server
+        errors are retried.
+        """
+        kwargs.setdefault('timeout', REQUEST_TIMEOUT)
         attempts = 0
-        while attempts <= MAX_RETRIES:
+        while True:
             attempts += 1
+            response = None
             try:
-                result = method(*args, **kwargs)
-                break
-            except (ConnectionError):
+                with phase("network"):
+                    response = self.latest_response = method(*args, **kwargs)
+                if self.latest_response.status_code >= 500:
+                    self.latest_response.raise_for_status()
+                self._update_attrs()
+                if self.heartbeat is not None:
+                    self.heartbeat()
+                return
+            except (ConnectionError, Timeout, HTTPError) as e:
+                # A streamed response holds on to its connection until it's read or closed
+                if response is not None:
+                    response.close()
+                if self.heartbeat is not None:
+                    self.heartbeat()
                 if attempts <= MAX_RETRIES:
-                    logging.warning("ConnectionError, attempt {0} of {1}".format(attempts,MAX_RETRIES))
+                    logging.warning("{0}, attempt {1} of {2}".format(e.__class__.__name__, attempts, MAX_RETRIES))
                     sleep(RETRY_SLEEP_SECONDS)
                 else:
-                    logging.critical("ConnectionError, reached maxium number of retries.")
+                    logging.critical("{0}, reached maxium number of retries.".format(e.__class__.__name__))
                     raise
-        return result
 
 
     def _update_attrs(self):
-        self.latest_text = self.latest_response.text
+        if STREAM_PARSE:
+            # Parse the body while it downloads (waiting for it counts as network time)
+            chunks = _timed_chunks(self.latest_response.iter_content(STREAM_CHUNK_SIZE))
+            with phase("parse"):
+                self.latest_content = self._parser.update_stream(chunks, RESPONSE_ENCODING)
+            self._update_parser = False
+            return
+
+        # Not `.text`, which can run charset detection over the whole body
+        self.latest_content = self.latest_response.content
 
         # The parser requires an update
         self._update_parser = True
 
+    def _is_data_integrity_error(self):
+        """Checks if the latest response is a SOLUS Data Integrity Error page"""
+        # TODO: Improve this, could easily give false positives
+        return self.latest_content.find(DATA_INTEGRITY_ERROR, 0, DIE_SEARCH_BYTES) != -1
+
     def _catalog_post(self, action, extras=None):
         """Submits a post request to the site"""
         if extras is None:
@@ -294,8 +646,7 @@ class SolusSession(object):
         self._post(self.course_catalog_url, data=extras)
 
         #import random
-        # TODO: Improve this, could easily give false positives
-        if "Data Integrity Error" in self.latest_text:
+        if self._is_data_integrity_error():
             self._recover(action, extras)
 
         # TESTING - Fake a DIE using random number generator
@@ -317,6 +668,7 @@ class SolusSession(object):
 
         # Start recovery process
         logging.warning("Encounted SOLUS Data Integrety Error, attempting to recover")
+        self.recovery_count += 1
         self.recovery_state = 0
 
         while self.recovery_state < num_states:
@@ -343,3 +695,61 @@ class SolusSession(object):
         logging.warning("Recovered, retrying original request")
 
         self._catalog_post(action, extras)
+
+
+class HelperSessions(object):
+    """
+    Extra sessions a scraper can hand parts of a course to (see `SolusScraper`).
+    They're logged in the first time they're needed, then reused.
+    """
+
+    def __init__(self, user, password, size, name=None, heartbeat=None):
+        """
+        The sessions are named after `name` (if given) to save their cookies,
+        and call `heartbeat` after every request, see `SolusSession`
+        """
+        self.user = user
+        self.password = password
+        self.size = size
+        self.name = name
+        self.heartbeat = heartbeat
+        self.sessions = []
+
+        # Counts of the sessions that were discarded, so the totals never go down
+        self._discarded_requests = 0
+        self._discarded_recoveries = 0
+
+    def _session_name(self):
+        """The first name that isn't being used by one of the sessions (or None)"""
+        if self.name is None:
+            return None
+        used = set(x.name for x in self.sessions)
+        i = 0
+        while u"{0}-helper{1}".format(self.name, i) in used:
+            i += 1
+        return u"{0}-helper{1}".format(self.name, i)
+
+    def get(self, num):
+        """Returns up to `num` sessions"""
+        while len(self.sessions) < min(num, self.size):
+            try:
+                self.sessions.append(SolusSession(self.user, self.password, name=self._session_name(), heartbeat=self.heartbeat))
+            except EnvironmentError as e:
+                # Make do with the ones there are
+                logging.warning(u"Couldn't start a helper session: %s", e)
+                self.size = len(self.sessions)
+        return self.sessions[:num]
+
+    def discard(self, session):
+        """Stops using a session (ex: after it failed), a new one is made if needed"""
+        self.sessions.remove(session)
+        self._discarded_requests += session.request_count
+        self._discarded_recoveries += session.recovery_count
+
+    @property
+    def request_count(self):
+        return self._discarded_requests + sum(x.request_count for x in self.sessions)
+
+    @property
+    def recovery_count(self):
+        return self._discarded_recoveries + sum(x.recovery_count for x in self.sessions)
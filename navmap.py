@@ -0,0 +1,87 @@
+"""
+A map of the course catalog: the ICActions that open every subject and course.
+
+PeopleSoft identifies the links on a page by their position (ex: `CRSE_NBR$12`),
+so finding the action for a subject or course means parsing the page it's on.
+The actions found are saved to a SQLite database at `NAV_MAP_PATH` (if set) so
+later runs, recoveries, and helper sessions can post them without parsing the
+page first. Before a saved action is posted, the text of its link on the page
+has to match the subject or course, otherwise it's found again by parsing.
+"""
+
+import time
+import sqlite3
+import logging
+
+try:
+    from config import NAV_MAP_PATH
+except ImportError:
+    NAV_MAP_PATH = None
+
+
+class NavigationMap(object):
+    """
+    Actions by (letter, subject unique, course unique), the course unique is ""
+    for the action of the subject itself.
+
+    The whole map is read when it's opened, and changes are written through.
+    """
+
+    def __init__(self, path=NAV_MAP_PATH):
+        self.path = path
+        self._actions = {}
+        self.stats = dict(jumps=0, stale=0, discovered=0)
+
+        self._db = None
+        if path:
+            try:
+                self._db = self._open(path)
+                for letter, subject, course, action in self._db.execute(
+                        "SELECT letter, subject, course, action FROM actions"):
+                    self._actions[(letter, subject, course)] = action
+            except sqlite3.Error as e:
+                # Everything is just found the normal way without it
+                logging.warning(u"Couldn't open the navigation map at %s: %s", path, e)
+                self._db = None
+
+    @staticmethod
+    def _open(path):
+        # Sessions can be handed to other threads, but only use the map from one at a time
+        db = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        db.execute("""CREATE TABLE IF NOT EXISTS actions (
+            letter TEXT NOT NULL,
+            subject TEXT NOT NULL,
+            course TEXT NOT NULL,
+            action TEXT NOT NULL,
+            updated REAL NOT NULL,
+            PRIMARY KEY (letter, subject, course)
+        )""")
+        return db
+
+    def get(self, letter, subject, course=""):
+        """Returns the action of a subject or course, or None"""
+        return self._actions.get((letter, subject, course))
+
+    def put(self, letter, subject, course, action):
+        """Records the action of a subject (`course` is "") or course"""
+        key = (letter, subject, course)
+        if self._actions.get(key) == action:
+            return
+        self._actions[key] = action
+        self.stats["discovered"] += 1
+        self._execute("INSERT OR REPLACE INTO actions (letter, subject, course, action, updated) VALUES (?, ?, ?, ?, ?)",
+                      key + (action, time.time()))
+
+    def forget(self, letter, subject, course=""):
+        """Removes an action that turned out to be out of date"""
+        self.stats["stale"] += 1
+        self._actions.pop((letter, subject, course), None)
+        self._execute("DELETE FROM actions WHERE letter = ? AND subject = ? AND course = ?", (letter, subject, course))
+
+    def _execute(self, sql, args):
+        if self._db is None:
+            return
+        try:
+            self._db.execute(sql, args)
+        except sqlite3.Error as e:
+            logging.warning(u"Couldn't update the navigation map: %s", e)
@@ -0,0 +1,173 @@
+"""
+Caching of parsed SOLUS pages.
+
+A lot of the pages SOLUS sends are the same as ones it sent before: returning
+from a course re-renders the same subject page, and course pages rarely
+change from one run to the next. Pages are identified by a digest of their
+body with the PeopleSoft state tokens (which change on every request) taken
+out, so a page that was seen before doesn't have to be parsed or extracted
+from again.
+
+The trees of the most recent pages are kept in memory. Extraction results
+are kept in memory too, and in a SQLite database at `PARSE_CACHE_PATH` (if
+set) so they can be reused by later runs.
+"""
+
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+from collections import OrderedDict
+
+try:
+    from config import PARSE_CACHE_SIZE
+except ImportError:
+    PARSE_CACHE_SIZE = 4
+
+try:
+    from config import PARSE_CACHE_PATH
+except ImportError:
+    PARSE_CACHE_PATH = None
+
+# How many pages to keep extraction results in memory for
+RESULT_CACHE_SIZE = 1024
+
+# Stored results that haven't been used for this long are removed
+STORE_MAX_AGE_DAYS = 30
+
+# Bump when the parser extracts things differently, so stored results aren't reused
+RESULT_VERSION = 1
+
+# Hidden inputs with values that change on every request, even if the page doesn't
+STATE_TOKENS = re.compile(br"""(name=['"]?(?:ICSID|ICStateNum|ICElementNum)['"]?[^>]*?value=)(['"])[^'"]*\2""")
+
+
+def digest(markup):
+    """Returns a digest of `markup` (bytes or text) that ignores the state tokens"""
+    if not isinstance(markup, bytes):
+        markup = markup.encode("utf-8")
+    return hashlib.sha1(STATE_TOKENS.sub(br"\1\2\2", markup)).hexdigest()
+
+
+class ParseCache(object):
+    """
+    LRU caches of trees and extraction results, by page digest.
+
+    Extraction results are stored as JSON and decoded on every hit, so callers
+    get their own copy they're free to change.
+    """
+
+    def __init__(self, size=PARSE_CACHE_SIZE, path=PARSE_CACHE_PATH):
+        self.size = size
+        self.path = path
+        self._trees = OrderedDict()
+        self._results = OrderedDict()
+        self.stats = dict(tree_hits=0, tree_misses=0, result_hits=0, stored_hits=0, result_misses=0)
+
+        self._db = None
+        if path:
+            try:
+                self._db = self._open(path)
+            except sqlite3.Error as e:
+                # Only slower without it
+                logging.warning(u"Couldn't open the parse cache at %s: %s", path, e)
+
+    @staticmethod
+    def _open(path):
+        # Sessions can be handed to other threads, but only use the cache from one at a time
+        db = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        db.execute("""CREATE TABLE IF NOT EXISTS results (
+            digest TEXT NOT NULL,
+            name TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            value TEXT NOT NULL,
+            used REAL NOT NULL,
+            PRIMARY KEY (digest, name, version)
+        )""")
+        db.execute("DELETE FROM results WHERE used < ? OR version != ?",
+                   (time.time() - STORE_MAX_AGE_DAYS * 24 * 3600, RESULT_VERSION))
+        return db
+
+    def holds(self, soup):
+        """Checks if a tree is in the cache (and so mustn't be decomposed)"""
+        return any(x is soup for x in self._trees.values())
+
+    def get_tree(self, key):
+        """Returns the tree of the page with the digest `key`, or None"""
+        soup = self._trees.pop(key, None)
+        if soup is None:
+            self.stats["tree_misses"] += 1
+            return None
+        self.stats["tree_hits"] += 1
+        self._trees[key] = soup
+        return soup
+
+    def put_tree(self, key, soup):
+        """Adds a tree to the cache. Returns the trees that no longer fit (or were replaced)"""
+        removed = []
+        old = self._trees.pop(key, None)
+        if old is not None and old is not soup:
+            removed.append(old)
+        self._trees[key] = soup
+        while len(self._trees) > self.size:
+            removed.append(self._trees.popitem(last=False)[1])
+        return removed
+
+    def get_result(self, key, name):
+        """Returns what `name` extracted from the page with the digest `key`, or raises KeyError"""
+        results = self._results.pop(key, None)
+        if results is not None:
+            self._results[key] = results
+            if name in results:
+                self.stats["result_hits"] += 1
+                return json.loads(results[name])
+
+        if self._db is not None:
+            try:
+                row = self._db.execute("SELECT value FROM results WHERE digest = ? AND name = ? AND version = ?",
+                                       (key, name, RESULT_VERSION)).fetchone()
+                if row is not None:
+                    self._db.execute("UPDATE results SET used = ? WHERE digest = ? AND name = ? AND version = ?",
+                                     (time.time(), key, name, RESULT_VERSION))
+            except sqlite3.Error as e:
+                logging.warning(u"Couldn't read from the parse cache: %s", e)
+                row = None
+            if row is not None:
+                self.stats["stored_hits"] += 1
+                self._remember(key, name, row[0])
+                return json.loads(row[0])
+
+        self.stats["result_misses"] += 1
+        raise KeyError(name)
+
+    def put_result(self, key, name, value):
+        """Caches what `name` extracted from the page with the digest `key`. Returns a copy of it"""
+        encoded = json.dumps(value)
+        self._remember(key, name, encoded)
+
+        if self._db is not None:
+            try:
+                self._db.execute("INSERT OR REPLACE INTO results (digest, name, version, value, used) VALUES (?, ?, ?, ?, ?)",
+                                 (key, name, RESULT_VERSION, encoded, time.time()))
+            except sqlite3.Error as e:
+                logging.warning(u"Couldn't write to the parse cache: %s", e)
+
+        return json.loads(encoded)
+
+    def _remember(self, key, name, encoded):
+        results = self._results.pop(key, None) or {}
+        results[name] = encoded
+        self._results[key] = results
+        while len(self._results) > RESULT_CACHE_SIZE:
+            self._results.popitem(last=False)
+
+    def hit_rates(self):
+        """Returns the stats with the fraction of trees and results that came from the cache"""
+        ret = dict(self.stats)
+        trees = self.stats["tree_hits"] + self.stats["tree_misses"]
+        results = self.stats["result_hits"] + self.stats["stored_hits"] + self.stats["result_misses"]
+        ret["tree_hit_rate"] = round(float(self.stats["tree_hits"]) / trees, 3) if trees else None
+        ret["result_hit_rate"] = round(float(self.stats["result_hits"] + self.stats["stored_hits"]) / results, 3) if results else None
+        return ret
@@ -1,9 +1,8 @@
 import re
-import os
 import bs4
-from datetime import datetime
 import logging
-from config import LOG_DIR
+import decoder
+import parsecache
 
 class SolusParser(object):
     """Parses SOLUS's crappy HTML"""
@@ -16,19 +15,29 @@ class SolusParser(object):
 
     ALL_SECTIONS = re.compile("CLASS_SECTION\$[0-9]+")
     ALL_SECTION_TABLES = re.compile("CLASS\$scroll\$[0-9]+")
+    ALL_MEETING_TABLES = re.compile("CLASS_MTGPAT\$scroll\$[0-9]+")
+
+    # Classes of the cells in the meeting tables
+    MEETING_CELL_CLASS = "PSEDITBOX_DISPONLY"
+    INSTRUCTOR_CELL_CLASS = "PSLONGEDITBOX"
 
     # For getting information out of the page
     SUBJECT_INFO = re.compile("^\s*([^-\s]*)\s+-\s+(.*)$") # Abbreviation - Subject
     COURSE_INFO = re.compile("^([\S]+)\s+([\S]+)\s+-\s+(.*)$") # Abbreviation Code - Name
     TERM_INFO = re.compile("^([^\s]+)\s+(.+)$") # 2013 Fall
     SECTION_INFO = re.compile("(\S+)-(\S+)\s+\((\S+)\)") #001-LEC (1234)
-    TIME_INFO = re.compile("(\d+:\d+[AP]M)") #1:30PM
-    DATE_INFO = re.compile("^([\S]+)\s*-\s*([\S]+)$") #yyyy/mm/dd - yyyy/mm/dd
 
     def __init__(self):
         self.soup = None
         self._souplib = 'lxml'
 
+        # Number of generators still iterating over each old tree (by id), see `_set_soup`
+        self._pinned = {}
+
+        # Trees and extraction results of pages seen before, by digest (see `parsecache`)
+        self.cache = parsecache.ParseCache()
+        self.digest = None
+
         # Prefer lxml, fall back to built in parser
         try:
             bs4.BeautifulSoup("", self._souplib)
@@ -36,25 +45,108 @@ class SolusParser(object):
             logging.warning(u"Not using {0} for parsing, using builtin parser instead".format(self._souplib))
             self._souplib = "html.parser"
 
-    def update_html(self, text):
-        """Feed new data to the parser"""
-        self.soup = bs4.BeautifulSoup(text, self._souplib)
+    def update_html(self, markup, encoding=None):
+        """
+        Feed new data to the parser.
+        `markup` can be bytes in a known `encoding`, which saves decoding it before parsing it.
+        """
+        key = parsecache.digest(markup)
+        soup = self.cache.get_tree(key)
+        if soup is None:
+            if encoding is not None and isinstance(markup, bytes):
+                soup = bs4.BeautifulSoup(markup, self._souplib, from_encoding=encoding)
+            else:
+                soup = bs4.BeautifulSoup(markup, self._souplib)
+        self._set_soup(soup, key)
 
-    def dump_html(self):
-        """Dumps the contents of the parser to a file"""
-        logging.critical("Encountered exception, attempting to dump the HTML")
+    def update_stream(self, chunks, encoding=None):
+        """
+        Feed new data to the parser as it arrives.
 
-        fname_template = "temp%d.html"
-        i = 0
-        filename = os.path.join(LOG_DIR, fname_template % i)
-        while os.path.exists(os.path.join(LOG_DIR, fname_template % i)):
-            i += 1
-            filename = os.path.join(LOG_DIR, fname_template % i)
+        `chunks` is an iterable of bytes (ex: `response.iter_content()`).
+        When using lxml, each chunk is parsed as soon as it's received so the
+        tree is ready right after the last one.
 
-        with open(filename, "wb") as f:
-            f.write(self.soup.prettify().encode("utf-8"))
+        Returns the raw bytes that were read.
+        """
 
-        logging.critical("Dumped html to %s" % filename)
+        if self._souplib != "lxml":
+            # The builtin parser can't be fed incrementally
+            content = b"".join(chunks)
+            self.update_html(content, encoding)
+            return content
+
+        # Drive bs4's lxml tree builder directly instead of giving it the whole document
+        soup = bs4.BeautifulSoup("", self._souplib)
+        soup.builder.soup = soup
+        soup.reset()
+        soup.original_encoding = encoding
+        parser = soup.builder.parser = soup.builder.parser_for(encoding)
+
+        content = []
+        for chunk in chunks:
+            if chunk:
+                content.append(chunk)
+                parser.feed(chunk)
+        if not content:
+            # lxml won't close a parser that hasn't been fed
+            parser.feed(b"<html></html>")
+        parser.close()
+
+        # Close out any unfinished strings and tags (same as bs4 does after a normal parse)
+        soup.endData()
+        while soup.currentTag is not None and soup.currentTag.name != soup.ROOT_TAG_NAME:
+            soup.popTag()
+
+        # Break the reference cycle like bs4 does
+        soup.builder.soup = None
+
+        # Already parsed, but the tree can still be cached for the next time the page comes up
+        content = b"".join(content)
+        self._set_soup(soup, parsecache.digest(content))
+        return content
+
+    def _set_soup(self, soup, key):
+        """
+        Replaces the current tree with that of the page with the digest `key`.
+
+        Old trees are decomposed right away to break their reference cycles,
+        otherwise they pile up until the garbage collector gets around to them
+        (which makes long scrapes use a lot of memory). Trees that are still
+        being iterated over are decomposed when the iteration ends instead,
+        and the ones in the cache when they're evicted from it.
+        """
+        removed = self.cache.put_tree(key, soup)
+        old, self.soup = self.soup, soup
+        self.digest = key
+        for tree in [old] + removed:
+            self._release(tree)
+
+    def _release(self, soup):
+        """Decomposes a tree if nothing needs it anymore"""
+        if soup is not None and soup is not self.soup and id(soup) not in self._pinned and not self.cache.holds(soup):
+            soup.decompose()
+
+    def _pin(self):
+        """Keeps the current tree from being decomposed until `_unpin` is called, returns it"""
+        soup = self.soup
+        self._pinned[id(soup)] = self._pinned.get(id(soup), 0) + 1
+        return soup
+
+    def _unpin(self, soup):
+        self._pinned[id(soup)] -= 1
+        if not self._pinned[id(soup)]:
+            del self._pinned[id(soup)]
+            self._release(soup)
+
+    def _extract(self, name, func):
+        """Returns what `func` extracts from the current page, reusing the result if the page was seen before"""
+        if self.digest is None:
+            return func()
+        try:
+            return self.cache.get_result(self.digest, name)
+        except KeyError:
+            return self.cache.put_result(self.digest, name, func())
 
     def _clean_html(self, text):
         return text.replace('&nbsp;', ' ').strip()
@@ -168,52 +260,46 @@ class SolusParser(object):
     #--------------------------Get all uniques (and basic data)---------------------
 
     def all_subjects(self, start=0, end=None, step=1):
-        """Returns a list of dicts containing the name, abbreviation, and unique of the subjects"""
-
-        # Find all subjects on the page
-        tags = self.soup.find_all("a", id=self.ALL_SUBJECTS)
+        """Yields dicts containing the name, abbreviation, and unique of the subjects"""
+        subjects = self._extract("all_subjects", self._all_subjects)[start:end:step]
+        return (x for x in subjects if x is not None)
 
-        # Figure out the ending point
-        if end is None:
-            end = len(tags)
-        else:
-            end = min(end, len(tags))
+    def _all_subjects(self):
+        """Returns the subjects on the page (None for the ones that couldn't be read, to keep the indexes)"""
 
         ret = []
-        # Loop over the links and extract the information
-        for i in range(start, end, step):
+
+        # Find all subjects on the page
+        for tag in self.soup.find_all("a", id=self.ALL_SUBJECTS):
 
             # Extract the subject title and abbreviation
-            m = self.SUBJECT_INFO.search(self._clean_html(tags[i].get_text()))
+            m = self.SUBJECT_INFO.search(self._clean_html(tag.get_text()))
             if not m:
                 logging.warning("Couldn't extract title and abbreviation from dropdown")
+                ret.append(None)
                 continue
 
             abbr = m.group(1)
             title = m.group(2)
 
-            # Add the discovered information to the return list
-            ret.append(dict(title=title, abbreviation=abbr, _unique=tags[i].get_text()))
+            ret.append(dict(title=title, abbreviation=abbr, _unique=tag.get_text()))
 
         return ret
 
     def all_courses(self, start=0, end=None, step=1):
-        """Returns a list of all the uniques of the courses"""
+        """Yields the uniques of all the courses"""
+        return iter(self._extract("all_courses", self._all_courses)[start:end:step])
 
-        # Find all course tags
-        tags = self.soup.find_all("a", id=self.ALL_COURSES)
+    def _all_courses(self):
+        return [tag.get_text() for tag in self.soup.find_all("a", id=self.ALL_COURSES)]
 
-        # Figure out the ending point
-        if end is None:
-            end = len(tags)
-        else:
-            end = min(end, len(tags))
+    def num_subjects(self, start=0, end=None, step=1):
+        """Returns how many subjects `all_subjects` will go through (for progress reporting)"""
+        return len(range(*slice(start, end, step).indices(len(self._extract("all_subjects", self._all_subjects)))))
 
-        ret = []
-        for i in range(start, end, step):
-            ret.append(tags[i].get_text())
-
-        return ret
+    def num_courses(self, start=0, end=None, step=1):
+        """Returns how many courses `all_courses` will go through (for progress reporting)"""
+        return len(range(*slice(start, end, step).indices(len(self._extract("all_courses", self._all_courses)))))
 
     def all_terms(self):
         """
@@ -240,83 +326,137 @@ class SolusParser(object):
 
     def all_section_data(self):
         """
-        Returns a list of all the sections data
+        Yields the data of all the sections on the page
+
+        The sections are read from the page that was loaded when iteration
+        started, so it is safe to navigate away (ex: to a section page for a
+        deep scrape) between items.
 
         Format:
-        [
-            {
-                "_unique": The text on the link
-                "basic": {
-                    "class_num": Class number
-                    "solus_id": Numeric id
-                    "type": LEC, LAB, etc
-                    "status": (open/closed)
-                },
-                "classes": [
-                    {
-                        'day_of_week': 1-7, starting with monday
-                        'start_time': datetime.time object
-                        'end_time': datetime.time object
-                        'location': room
-                        'instructors': [instructor names]
-                        'term_start': datetime.date object
-                        'term_end': datetime.date object
-                    }, ...
-                ]
-            }, ...
-        ]
+        {
+            "_unique": The text on the link
+            "basic": {
+                "class_num": Class number
+                "solus_id": Numeric id
+                "type": LEC, LAB, etc
+                "status": (open/closed)
+            },
+            "classes": [
+                {
+                    'day_of_week': 1-7, starting with monday
+                    'start_time': datetime.time object
+                    'end_time': datetime.time object
+                    'location': room
+                    'instructors': [instructor names]
+                    'term_start': datetime.date object
+                    'term_end': datetime.date object
+                }, ...
+            ]
+        }
         """
 
         LINK_FORMAT = "CLASS_SECTION${0}"
+        MEETING_TABLE_FORMAT = "CLASS_MTGPAT$scroll${0}"
 
-        tables = self.soup.find_all("table", id=self.ALL_SECTION_TABLES)
+        # Hold on to the current page in case the session navigates while iterating
+        soup = self._pin()
+        try:
+            tables, meeting_tables, contents = self._section_parts(soup)
+
+            # Iterate over all the tables
+            for i, table in enumerate(tables):
+
+                section_data = {}
+                basic = {}
+                parts = contents[id(table)]
+
+                # Get the basic section information (class number, solus id, type)
+                link_id = LINK_FORMAT.format(i)
+                link_tag = next((x for x in parts if x.name == "a" and x.get("id") == link_id), None)
+                if link_tag:
+                    m = self.SECTION_INFO.search(link_tag.get_text())
+                    if m:
+                        basic["solus_id"] = m.group(1)
+                        basic["type"] = m.group(2)
+                        basic["class_num"] = m.group(3)
+                        section_data["_unique"] = link_tag.get_text()
+                    else:
+                        logging.warning("Found section link but couldn't extract information from it")
+                        continue
+                else:
+                    logging.warning("Couldn't find the section link at the specified index")
+                    continue
 
-        ret = []
-        # Iterate over all the tables
-        for i in range(len(tables)):
-
-            section_data = {}
-            basic = {}
-
-            # Get the basic section information (class number, solus id, type)
-            link_tag = tables[i].find("a", id=LINK_FORMAT.format(i))
-            if link_tag:
-                m = self.SECTION_INFO.search(link_tag.get_text())
-                if m:
-                    basic["solus_id"] = m.group(1)
-                    basic["type"] = m.group(2)
-                    basic["class_num"] = m.group(3)
-                    section_data["_unique"] = link_tag.get_text()
+                # Get the open/closed status
+                alts = set(x.get("alt") for x in parts if x.name == "img")
+                stats = ("Open", "Closed")
+                for status in stats:
+                    if status in alts:
+                        basic["status"] = status
+                        break
                 else:
-                    logging.warning("Found section link but couldn't extract information from it")
+                    logging.warning("Couldn't find open/closed status on shallow scrape")
+                    basic["status"] = None
+
+                # Get class data for the section
+                data_table = meeting_tables.get(MEETING_TABLE_FORMAT.format(i))
+                if data_table is None:
+                    logging.warning("Couldn't find section at specified index")
                     continue
-            else:
-                logging.warning("Couldn't find the section link at the specified index")
-                continue
+                cells = [x for x in contents[id(data_table)] if self._has_class(x, self.MEETING_CELL_CLASS)]
+                inst_cells = [x for x in contents[id(data_table)] if self._has_class(x, self.INSTRUCTOR_CELL_CLASS)]
 
-            # Get the open/closed status
-            stats = ("Open", "Closed")
-            for status in stats:
-                if tables[i].find("img", alt=status):
-                    basic["status"] = status
-                    break
-            else:
-                logging.warning("Couldn't find open/closed status on shallow scrape")
-                basic["status"] = None
+                section_data["classes"] = self._meeting_table_classes(cells, inst_cells)
+                section_data["basic"] = basic
 
-            # Get class data for the section
-            section_attrs = self.section_attrs_at_index(i)
-            if section_attrs is None:
-                logging.warning("Couldn't find section at specified index")
-                continue
+                # Hand the section off as soon as it's parsed
+                yield section_data
+        finally:
+            self._unpin(soup)
+
+    def _section_parts(self, soup):
+        """
+        Finds everything `all_section_data` needs in a single pass over the page.
 
-            section_data["classes"] = section_attrs
-            section_data["basic"] = basic
+        Returns the section tables (in page order), the meeting tables (by
+        id, the first of each), and the section links, status images, and
+        meeting cells inside each of those tables (by the id() of the table).
+        """
 
-            # Add the section information to the returned list
-            ret.append(section_data)
+        def wanted(tag):
+            name = tag.name
+            if name == "span":
+                return self._has_class(tag, self.MEETING_CELL_CLASS) or self._has_class(tag, self.INSTRUCTOR_CELL_CLASS)
+            elif name == "img":
+                return tag.get("alt") in ("Open", "Closed")
+            elif name == "a":
+                return self.ALL_SECTIONS.search(tag.get("id", "")) is not None
+            elif name == "table":
+                tag_id = tag.get("id", "")
+                return bool(self.ALL_SECTION_TABLES.search(tag_id) or self.ALL_MEETING_TABLES.search(tag_id))
+            return False
+
+        tables = []
+        meeting_tables = {}
+        contents = {}
+        for tag in soup.find_all(wanted):
+            if tag.name == "table":
+                if self.ALL_SECTION_TABLES.search(tag["id"]):
+                    tables.append(tag)
+                else:
+                    meeting_tables.setdefault(tag["id"], tag)
+                contents[id(tag)] = []
+            else:
+                # Tables come before their contents, so the ones this is in are known already
+                for parent in tag.parents:
+                    if id(parent) in contents:
+                        contents[id(parent)].append(tag)
 
-        return ret
+        return tables, meeting_tables, contents
+
+    @staticmethod
+    def _has_class(tag, css_class):
+        return css_class in tag.get("class", ())
 
     #-----------------------Page parsing methods-----------------------------
 
@@ -345,6 +485,10 @@ class SolusParser(object):
             }
         }
         """
+        return self._extract("course_attrs", self._course_attrs)
+
+    def _course_attrs(self):
+        """Implements `course_attrs` (uncached)"""
 
         TITLE_CLASS = "PALEVEL0SECONDARY"
         INFO_BOX_CLASS = "PSGROUPBOXNBO"
@@ -500,30 +644,25 @@ class SolusParser(object):
         ]
         """
 
-        # Map the strings to numeric days
-        DAY_MAP = {
-            "mo": 1,
-            "tu": 2,
-            "we": 3,
-            "th": 4,
-            "fr": 5,
-            "sa": 6,
-            "su": 7
-        }
+        return self._section_attrs_in(self.soup, index)
 
-        TABLE_ID = "CLASS_MTGPAT$scroll${0}"
-        CELL_CLASS = "PSEDITBOX_DISPONLY"
-        INSTRUCTOR_CELL_CLASS = "PSLONGEDITBOX"
+    def _section_attrs_in(self, soup, index):
+        """Implements `section_attrs_at_index` against a specific page"""
 
-        NON_INSTRUCTORS = ("TBA", "Staff")
+        TABLE_ID = "CLASS_MTGPAT$scroll${0}"
 
-        data_table = self.soup.find("table", id=TABLE_ID.format(index))
+        data_table = soup.find("table", id=TABLE_ID.format(index))
         if not data_table:
             return None
 
         # Get the needed cells
-        cells = data_table.find_all("span", {"class": CELL_CLASS})
-        inst_cells = data_table.find_all("span", {"class": INSTRUCTOR_CELL_CLASS})
+        cells = data_table.find_all("span", {"class": self.MEETING_CELL_CLASS})
+        inst_cells = data_table.find_all("span", {"class": self.INSTRUCTOR_CELL_CLASS})
+
+        return self._meeting_table_classes(cells, inst_cells)
+
+    def _meeting_table_classes(self, cells, inst_cells):
+        """Returns the classes in the cells of a meeting table (see `all_section_data`)"""
 
         # Deal with bad formatting
         values = [self._clean_html(x.string) for x in cells]
@@ -533,65 +672,38 @@ class SolusParser(object):
         for x in range(0, len(values), 5):
 
             # Instructors
-            temp_inst = inst_cells[x//5].string
-            instructors = []
-            if temp_inst and temp_inst not in NON_INSTRUCTORS:
-                lis = re.sub(r'\s+', ' ', temp_inst).split(",")
-                for i in range(0, len(lis), 2):
-                    last_name = lis[i].strip()
-                    other_names = lis[i+1].strip()
-                    instructors.append(u"{0}, {1}".format(last_name, other_names))
+            # (As a plain string, a NavigableString cached by the decoder would keep the whole tree alive)
+            text = inst_cells[x//5].string
+            instructors = list(decoder.decode_instructors(u"{0}".format(text) if text is not None else None))
 
             # Location
             location = values[x+3]
 
             # Class start/end times
-            m = self.TIME_INFO.search(values[x+1])
-            start_time = datetime.strptime(m.group(1), "%I:%M%p").time() if m else None
-            m = self.TIME_INFO.search(values[x+2])
-            end_time = datetime.strptime(m.group(1), "%I:%M%p").time() if m else None
-
-            # Class start/end dates
-            m = self.DATE_INFO.search(values[x+4])
-            term_start = datetime.strptime(m.group(1), "%Y/%m/%d").date() if m else None
-            term_end = datetime.strptime(m.group(2), "%Y/%m/%d").date() if m else None
-
-            sections = []
-
-            # Loop through all days
-            all_days = values[x+0].lower()
-            while len(all_days) > 0:
-                day_abbr = all_days[-2:]
-                all_days = all_days[:-2]
-
-                # Get day of week
-                if day_abbr in DAY_MAP:
-                    day_of_week = DAY_MAP[day_abbr]
-                else:
-                    # A non-day was encountered (most likely 'TBA')
-                    day_of_week = None
-                    # Make sure only a single section is added
-                    sections = []
-
-                # Append the section to the list
-                sections.append({
-                    'day_of_week': day_of_week,
-                    'start_time': start_time,
-                    'end_time': end_time,
-                    'location': location,
-                    'instructors': instructors,
-                    'term_start': term_start,
-                    'term_end': term_end
-                })
-
-                # Stop adding if a non-day was encountered
-                if day_of_week is None:
-                    break
-
-            ret.extend(sections)
+            start_time = decoder.decode_time(values[x+1])
+            end_time = decoder.decode_time(values[x+2])
+
+            ret.extend(self._meeting_classes(values[x+0], start_time, end_time, location, instructors, values[x+4]))
 
         return ret
 
+    def _meeting_classes(self, days, start_time, end_time, location, instructors, dates):
+        """Returns the classes of a meeting pattern (see `all_section_data`)"""
+
+        # Class start/end dates
+        term_start, term_end = decoder.decode_date_range(dates)
+
+        # Add a class for every day (a single one with no day for 'TBA' and other)
+        return [{
+            'day_of_week': day_of_week,
+            'start_time': start_time,
+            'end_time': end_time,
+            'location': location,
+            'instructors': instructors,
+            'term_start': term_start,
+            'term_end': term_end
+        } for day_of_week in decoder.decode_days(days)]
+
     def section_deep_attrs(self):
         """
         Parses out the section data from the section page. Used for deep scrapes.
@@ -657,3 +769,135 @@ class SolusParser(object):
                 ret['availability']['wait_curr'] = int(data[3].string)
 
         return ret
+
+    #-----------------------Class Search-----------------------------
+
+    # Results are grouped by course, with a grid of sections under each one
+    SEARCH_COURSE = re.compile(r"^win0divSSR_CLSRSLT_WRK_GROUPBOX2GP\$([0-9]+)$")
+    SEARCH_SECTIONS_TABLE = "SSR_CLSRCH_MTG1$scroll${0}"
+    SEARCH_SECTION_FIELDS = re.compile(r"^(MTG_CLASS_NBR|MTG_CLASSNAME|MTG_DAYTIME|MTG_ROOM|MTG_INSTR|MTG_DATES|DERIVED_CLSRCH_SSR_STATUS_LONG)\$([0-9]+)$")
+    SEARCH_CLASS_NUMBER = re.compile(r"^MTG_CLASS_NBR\$[0-9]+$")
+    SEARCH_SECTION_NAME = re.compile(r"^(\S+)-(\S+)") # 001-LEC
+
+    SEARCH_TERM_DROPDOWN = "CLASS_SRCH_WRK2_STRM$35$"
+    SEARCH_CONFIRM = re.compile("would you like to continue", re.IGNORECASE) # Over 50 results
+    SEARCH_TOO_MANY = re.compile("maximum limit", re.IGNORECASE) # Over the most it will show
+
+    def search_terms(self):
+        """
+        Returns a list of dicts containing the terms that can be searched
+        (year, season, _unique like `all_terms`, and the value to search with)
+        """
+        dropdown = self.soup.find("select", id=self.SEARCH_TERM_DROPDOWN)
+        if not dropdown:
+            raise Exception("Couldn't find the class search term dropdown")
+
+        ret = []
+        for x in dropdown.find_all("option"):
+            m = self.TERM_INFO.search(x.get_text())
+            if not m or not x.get("value"):
+                # The blank option
+                continue
+            ret.append(dict(year=m.group(1), season=m.group(2), _unique=x.get_text(), value=x["value"]))
+        return ret
+
+    def search_confirm_action(self):
+        """Returns the action to confirm a search with a lot of results, `None` if not needed"""
+        if self.soup.find(text=self.SEARCH_CONFIRM):
+            return "#ICSave"
+        return None
+
+    def search_too_many_results(self):
+        """Checks if the search had too many results to show"""
+        return self.soup.find(text=self.SEARCH_TOO_MANY) is not None
+
+    def search_section_action(self, class_num):
+        """Return the action for the section with the class number in the search results"""
+        tag = self.soup.find("a", id=self.SEARCH_CLASS_NUMBER, text=class_num)
+        if not tag:
+            logging.warning(u"Couldn't find class number '{0}' in the search results".format(class_num))
+            return None
+        return tag["id"]
+
+    def all_search_sections(self):
+        """
+        Yields (course number, section data) tuples for all the sections in
+        the class search results. The section data is the same as `all_section_data`.
+
+        Meeting patterns are stacked in the cells of a section's row, one per line.
+        """
+
+        # Hold on to the current page in case the session navigates while iterating
+        soup = self._pin()
+        try:
+            for header in soup.find_all("div", id=self.SEARCH_COURSE):
+                m = self.COURSE_INFO.search(self._clean_html(header.get_text()))
+                if not m:
+                    logging.warning("Couldn't extract the course from a search result")
+                    continue
+                number = m.group(2)
+
+                table = soup.find("table", id=self.SEARCH_SECTIONS_TABLE.format(self.SEARCH_COURSE.match(header["id"]).group(1)))
+                if not table:
+                    logging.warning(u"Couldn't find the sections of course {0} in the search results".format(number))
+                    continue
+
+                # Group the fields of each section in one pass over the table
+                sections = {}
+                for tag in table.find_all(id=self.SEARCH_SECTION_FIELDS):
+                    field, index = self.SEARCH_SECTION_FIELDS.match(tag["id"]).groups()
+                    sections.setdefault(int(index), {})[field] = tag
+
+                for index in sorted(sections):
+                    section_data = self._search_section(sections[index])
+                    if section_data is not None:
+                        yield number, section_data
+        finally:
+            self._unpin(soup)
+
+    def _search_section(self, fields):
+        """Builds the section data from the fields of a row of search results"""
+
+        def lines(field):
+            tag = fields.get(field)
+            return [self._clean_html(x) for x in tag.stripped_strings] if tag else []
+
+        def line(values, i):
+            # Cells with a single line apply to all the meetings
+            if not values:
+                return u""
+            return values[i] if i < len(values) else values[-1]
+
+        class_num = u"".join(lines("MTG_CLASS_NBR"))
+        m = self.SEARCH_SECTION_NAME.search(line(lines("MTG_CLASSNAME"), 0))
+        if not class_num or not m:
+            logging.warning("Found section in the search results but couldn't extract information from it")
+            return None
+
+        section_data = {}
+        basic = {}
+        basic["solus_id"] = m.group(1)
+        basic["type"] = m.group(2)
+        basic["class_num"] = class_num
+        section_data["_unique"] = u"{0}-{1} ({2})".format(m.group(1), m.group(2), class_num)
+
+        # Get the open/closed status
+        status_img = fields["DERIVED_CLSRCH_SSR_STATUS_LONG"].find("img") if "DERIVED_CLSRCH_SSR_STATUS_LONG" in fields else None
+        basic["status"] = status_img.get("alt") if status_img else None
+        if basic["status"] not in ("Open", "Closed"):
+            logging.warning("Couldn't find open/closed status in the search results")
+            basic["status"] = None
+
+        # A meeting pattern per line (ex: "MoWe 8:30AM - 9:50AM", or "TBA")
+        classes = []
+        rooms, instructors, dates = lines("MTG_ROOM"), lines("MTG_INSTR"), lines("MTG_DATES")
+        for i, day_time in enumerate(lines("MTG_DAYTIME")):
+            days, _, times = day_time.partition(" ")
+            start, _, end = times.partition("-")
+            classes.extend(self._meeting_classes(
+                days, decoder.decode_time(start), decoder.decode_time(end), line(rooms, i),
+                list(decoder.decode_instructors(line(instructors, i))), line(dates, i)))
+
+        section_data["classes"] = classes
+        section_data["basic"] = basic
+        return section_data
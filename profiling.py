@@ -0,0 +1,264 @@
+"""
+Profiling of scrape jobs across all the worker processes.
+
+Each job writes its results to `PROFILE_DIR`:
+ - `<job>.pstats`: cProfile stats (PROFILE = "cprofile", or any other true value)
+ - `<job>.folded`: sampled stacks in the "collapsed" format used by flame graph tools
+   (PROFILE = "sample", low enough overhead for production runs)
+ - `<job>.phases.json`: time spent in the network, parse, serialize, and disk phases
+   (by the job's thread, and separately by its helper sessions' threads)
+
+`merge_reports` combines the files from all the jobs into a single report.
+"""
+
+import os
+import sys
+import json
+import time
+import glob
+import pstats
+import logging
+import threading
+import itertools
+from collections import defaultdict
+
+try:
+    from config import PROFILE_DIR
+except ImportError:
+    PROFILE_DIR = "./logs/profile"
+
+try:
+    from config import PROFILE_SAMPLE_INTERVAL
+except ImportError:
+    PROFILE_SAMPLE_INTERVAL = 0.005
+
+PHASES = ("network", "parse", "serialize", "disk")
+
+# Phase timing is only done while profiling
+_enabled = False
+_totals = defaultdict(float)
+
+# Helper sessions time their requests from their own threads, at the same time as the job's thread.
+# Their time is kept apart so the job's phases add up to at most its wall-clock time.
+_job_thread = None
+_helper_totals = defaultdict(float)
+_totals_lock = threading.Lock()
+
+# The phases each thread is in, innermost last
+_active = threading.local()
+
+# Makes the names of the files from each job unique
+_job_counter = itertools.count()
+
+
+class phase(object):
+    """
+    Context manager that attributes the time spent in its body to a phase.
+    Time spent in a phase nested inside it only counts for the nested one.
+    Does nothing unless a job is being profiled.
+    """
+
+    __slots__ = ("name", "start", "nested")
+
+    def __init__(self, name):
+        self.name = name
+        self.start = None
+        self.nested = 0.0
+
+    def __enter__(self):
+        if _enabled:
+            self.start = time.time()
+            self.nested = 0.0
+            if not hasattr(_active, "stack"):
+                _active.stack = []
+            _active.stack.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if self.start is not None:
+            elapsed = time.time() - self.start
+            _active.stack.remove(self)
+            if _active.stack:
+                _active.stack[-1].nested += elapsed
+            totals = _totals if threading.current_thread().ident == _job_thread else _helper_totals
+            with _totals_lock:
+                totals[self.name] += elapsed - self.nested
+            self.start = None
+
+
+class StackSampler(object):
+    """Periodically records the stack of a thread from a background thread"""
+
+    def __init__(self, interval=PROFILE_SAMPLE_INTERVAL, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id if thread_id is not None else threading.current_thread().ident
+        self.counts = defaultdict(int)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(u"{0}:{1}".format(os.path.basename(code.co_filename), code.co_name))
+                frame = frame.f_back
+            if stack:
+                self.counts[u";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="StackSampler")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, filename):
+        with open(filename, "w") as f:
+            for stack, count in self.counts.items():
+                f.write(u"{0} {1}\n".format(stack, count))
+
+
+def profile(func, name, mode):
+    """
+    Runs `func` under the profiler selected by `mode` and writes the
+    results to files starting with `name` in `PROFILE_DIR`.
+    """
+    global _enabled, _job_thread
+
+    try:
+        os.makedirs(PROFILE_DIR)
+    except OSError:
+        pass
+    base = os.path.join(PROFILE_DIR, "{0}-{1}-{2}".format(name, os.getpid(), next(_job_counter)))
+
+    _totals.clear()
+    _helper_totals.clear()
+    _job_thread = threading.current_thread().ident
+    _enabled = True
+
+    if mode == "sample":
+        profiler = StackSampler()
+    else:
+        import cProfile
+        profiler = cProfile.Profile()
+
+    start = time.time()
+    if mode == "sample":
+        profiler.start()
+    else:
+        profiler.enable()
+
+    try:
+        return func()
+    finally:
+        if mode == "sample":
+            profiler.stop()
+            profiler.write(base + ".folded")
+        else:
+            profiler.disable()
+            profiler.dump_stats(base + ".pstats")
+
+        _enabled = False
+        phases = dict((x, _totals.get(x, 0.0)) for x in PHASES)
+        phases["total"] = time.time() - start
+        phases["helpers"] = dict((x, _helper_totals.get(x, 0.0)) for x in PHASES)
+        with open(base + ".phases.json", "w") as f:
+            json.dump(phases, f)
+
+
+def clear(directory=PROFILE_DIR):
+    """Removes the results of previous runs"""
+    for pattern in ("*.pstats", "*.folded", "*.phases.json", "report.txt"):
+        for name in glob.glob(os.path.join(directory, pattern)):
+            os.remove(name)
+
+
+def merge_reports(directory=PROFILE_DIR, top=40):
+    """
+    Merges the results of all the profiled jobs in `directory` into `report.txt`
+    (and `merged.pstats`/`merged.folded` for use with other tools).
+    Returns the name of the report.
+    """
+    report = []
+
+    # Phases
+    phases = defaultdict(float)
+    helpers = defaultdict(float)
+    jobs = glob.glob(os.path.join(directory, "*.phases.json"))
+    for name in jobs:
+        with open(name) as f:
+            job = json.load(f)
+        for k, v in job.pop("helpers", {}).items():
+            helpers[k] += v
+        for k, v in job.items():
+            phases[k] += v
+    if jobs:
+        total = phases.pop("total") or 1
+        report.append("Time by phase over {0} jobs ({1:.1f}s of job time):".format(len(jobs), total))
+        phases["other"] = max(total - sum(phases.values()), 0)
+        for k in PHASES + ("other",):
+            report.append("  {0:10} {1:10.1f}s {2:6.1%}".format(k, phases[k], phases[k] / total))
+        report.append("")
+    if any(helpers.values()):
+        report.append("Time by phase in helper session threads (at the same time as the jobs, not part of the job time):")
+        for k in PHASES:
+            report.append("  {0:10} {1:10.1f}s".format(k, helpers[k]))
+        report.append("")
+
+    # cProfile
+    stats_files = glob.glob(os.path.join(directory, "*-[0-9]*.pstats"))
+    if stats_files:
+        stats = pstats.Stats(stats_files[0])
+        for name in stats_files[1:]:
+            stats.add(name)
+        stats.dump_stats(os.path.join(directory, "merged.pstats"))
+
+        try:
+            from StringIO import StringIO
+        except ImportError:
+            # Python 3.x
+            from io import StringIO
+        out = StringIO()
+        stats.stream = out
+        stats.sort_stats("cumulative").print_stats(top)
+        report.append(u"cProfile, {0} jobs, by cumulative time:".format(len(stats_files)))
+        report.append(out.getvalue())
+
+    # Sampled stacks
+    counts = defaultdict(int)
+    folded = glob.glob(os.path.join(directory, "*-[0-9]*.folded"))
+    for name in folded:
+        with open(name) as f:
+            for line in f:
+                stack, _, count = line.rstrip("\n").rpartition(" ")
+                counts[stack] += int(count)
+    if counts:
+        with open(os.path.join(directory, "merged.folded"), "w") as f:
+            for stack, count in counts.items():
+                f.write(u"{0} {1}\n".format(stack, count))
+
+        samples = float(sum(counts.values()))
+        self_counts = defaultdict(int)
+        total_counts = defaultdict(int)
+        for stack, count in counts.items():
+            funcs = stack.split(";")
+            self_counts[funcs[-1]] += count
+            for func in set(funcs):
+                total_counts[func] += count
+
+        report.append(u"Sampled stacks, {0} jobs, {1} samples:".format(len(folded), int(samples)))
+        report.append(u"  {0:>7} {1:>7}  function".format("self", "total"))
+        for func, count in sorted(self_counts.items(), key=lambda x: -x[1])[:top]:
+            report.append(u"  {0:7.1%} {1:7.1%}  {2}".format(count / samples, total_counts[func] / samples, func))
+        report.append("")
+
+    filename = os.path.join(directory, "report.txt")
+    with open(filename, "w") as f:
+        f.write(u"\n".join(report))
+
+    logging.info(u"Wrote the profiling report to %s", filename)
+    return filename
@@ -0,0 +1,233 @@
+"""
+Live progress of a running scrape.
+
+Every worker process updates its own slot of a shared array of counters,
+so no locking or messaging is needed. The main process periodically
+aggregates them into a status (with an ETA) that's written to a JSON file
+and optionally served over HTTP.
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+from threading import Thread, Event
+from multiprocessing import Array
+try:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+except ImportError:
+    # Python 2.x
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+FIELDS = ("pid", "jobs_started", "jobs_done", "subjects_total", "subjects_done", "courses_total",
+          "courses_done", "sections_done", "requests", "recoveries", "parse_hits", "parse_misses", "recycled",
+          "stalled", "rss", "updated")
+_INDEX = dict((name, i) for i, name in enumerate(FIELDS))
+
+
+class Progress(object):
+    """Progress counters shared by all the worker processes. Has to be created before they're started"""
+
+    def __init__(self, num_workers, num_jobs=0):
+        self.num_workers = num_workers
+        self.num_jobs = num_jobs
+        self.start_time = time.time()
+
+        # Jobs left over at the end of the run
+        self.skipped = None
+
+        self._values = Array('d', num_workers * len(FIELDS), lock=False)
+
+    def worker(self, index):
+        """Returns the counters for the worker with the given index"""
+        return WorkerProgress(self._values, index)
+
+    def idle_seconds(self, index, now=None):
+        """Returns how long it's been since a worker last reported anything, or None if it hasn't yet"""
+        updated = self._values[index * len(FIELDS) + _INDEX["updated"]]
+        return (now or time.time()) - updated if updated else None
+
+    def status(self):
+        """Returns a dict describing the progress of the scrape"""
+        now = time.time()
+        elapsed = now - self.start_time
+
+        workers = []
+        totals = dict((name, 0) for name in FIELDS if name not in ("pid", "updated"))
+        for i in range(self.num_workers):
+            values = self._values[i * len(FIELDS):(i + 1) * len(FIELDS)]
+            worker = dict((name, int(values[_INDEX[name]])) for name in totals)
+            worker["pid"] = int(values[_INDEX["pid"]])
+            idle = self.idle_seconds(i, now)
+            worker["idle_seconds"] = round(idle, 1) if idle is not None else None
+            worker["subjects_remaining"] = worker["subjects_total"] - worker["subjects_done"]
+            worker["courses_remaining"] = worker["courses_total"] - worker["courses_done"]
+            workers.append(worker)
+            for name in totals:
+                totals[name] += worker[name]
+
+        estimated_courses = self._estimate_courses(totals)
+        totals["courses_estimated"] = int(estimated_courses)
+
+        eta = None
+        if totals["courses_done"] and estimated_courses:
+            rate = totals["courses_done"] / elapsed
+            eta = max(estimated_courses - totals["courses_done"], 0) / rate
+
+        parsed = totals["parse_hits"] + totals["parse_misses"]
+        status = {
+            "updated": now,
+            "elapsed_seconds": round(elapsed, 1),
+            "jobs_total": self.num_jobs,
+            "totals": totals,
+            "requests_per_second": round(totals["requests"] / elapsed, 2) if elapsed else 0,
+            "courses_per_minute": round(totals["courses_done"] / elapsed * 60, 2) if elapsed else 0,
+            "parse_hit_rate": round(float(totals["parse_hits"]) / parsed, 3) if parsed else None,
+            "eta_seconds": round(eta) if eta is not None else None,
+            "workers": workers,
+        }
+
+        if self.skipped is not None:
+            status["skipped"] = self.skipped
+            by_tier = {}
+            for job in self.skipped:
+                tier = str(job.get("tier"))
+                by_tier[tier] = by_tier.get(tier, 0) + 1
+            status["skipped_by_tier"] = by_tier
+
+        return status
+
+    def _estimate_courses(self, totals):
+        """
+        Estimates the number of courses in the whole scrape from the parts of
+        the catalog discovered so far (see `SolusScraper`)
+        """
+        if not totals["subjects_done"] and not totals["courses_total"]:
+            return 0
+
+        # Courses are only known for subjects that have been opened
+        subjects_opened = max(totals["subjects_done"], 1)
+        courses_per_subject = float(totals["courses_total"]) / subjects_opened
+        estimate = totals["courses_total"] + (totals["subjects_total"] - subjects_opened) * courses_per_subject
+
+        # Subjects are only known for jobs that have been started
+        if self.num_jobs and totals["jobs_started"]:
+            subjects_per_job = float(totals["subjects_total"]) / totals["jobs_started"]
+            # (Jobs handed off by recycled workers are started more than once)
+            estimate += max(self.num_jobs - totals["jobs_started"], 0) * subjects_per_job * courses_per_subject
+
+        return estimate
+
+
+def current_rss():
+    """Returns the resident set size of this process in bytes"""
+    try:
+        # Linux
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (IOError, OSError, ValueError, IndexError):
+        pass
+
+    # Peak instead of current, but still goes up as memory does
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+class WorkerProgress(object):
+    """The counters of a single worker"""
+
+    def __init__(self, values, index):
+        self._values = values
+        self._offset = index * len(FIELDS)
+
+    def add(self, field, n=1):
+        self._values[self._offset + _INDEX[field]] += n
+        self._values[self._offset + _INDEX["updated"]] = time.time()
+
+    def set(self, field, value):
+        self._values[self._offset + _INDEX[field]] = value
+        self._values[self._offset + _INDEX["updated"]] = time.time()
+
+    def beat(self):
+        """Shows the worker is still doing something, without changing any counters"""
+        self._values[self._offset + _INDEX["updated"]] = time.time()
+
+
+class StatusReporter(object):
+    """
+    Periodically writes the status of a `Progress` to a JSON file, and serves
+    it at http://localhost:<port>/ if a port is given.
+    """
+
+    def __init__(self, progress, path=None, interval=10, port=None):
+        self.progress = progress
+        self.path = path
+        self.interval = interval
+        self.port = port
+        self._stop = Event()
+        self._latest = "{}"
+        self._server = None
+
+    def start(self):
+        t = Thread(target=self._run, name="StatusReporter")
+        t.daemon = True
+        t.start()
+
+        if self.port:
+            reporter = self
+
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    body = reporter._latest.encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, *args):
+                    pass
+
+            try:
+                self._server = HTTPServer(("127.0.0.1", self.port), Handler)
+            except (IOError, OSError) as e:
+                # Not worth stopping the scrape over
+                logging.warning(u"Couldn't serve the scrape status on port %s: %s", self.port, e)
+                return
+            t = Thread(target=self._server.serve_forever, name="StatusServer")
+            t.daemon = True
+            t.start()
+            logging.info(u"Serving the scrape status at http://127.0.0.1:%s/", self.port)
+
+    def stop(self):
+        self._stop.set()
+        self.update()
+        if self._server:
+            self._server.shutdown()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.update()
+            except Exception:
+                logging.exception("Couldn't update the scrape status")
+
+    def update(self):
+        self._latest = json.dumps(self.progress.status(), indent=4, sort_keys=True)
+        if not self.path:
+            return
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            try:
+                os.makedirs(directory)
+            except OSError:
+                pass
+
+        # Replace the file in one go so it can't be read half written
+        temp = self.path + ".tmp"
+        with open(temp, "w") as f:
+            f.write(self._latest)
+        os.rename(temp, self.path)
@@ -1,7 +1,33 @@
 USER = "yournetid"
 PASS = "yourpassword"
 OUTPUT_DIR = "./data-dump"
-PROFILE = None
+PROFILE = None # "cprofile" or "sample" (low overhead) to profile the jobs
+PROFILE_DIR = "./logs/profile"
 MAX_RETRIES = 5
 RETRY_SLEEP_SECONDS = 10
+REQUEST_TIMEOUT = (10, 60) # Seconds to wait to connect to SOLUS, and for each read of a response
+SESSION_STORE_DIR = None # Set to a directory to save the (encrypted) session cookies and skip logging in on the next run
+SESSION_STORE_KEY = None # Key the cookies are encrypted with (the password if None)
 LOG_DIR = "./logs"
+DECODER_CACHE_SIZE = 1024
+STREAM_PARSE = False
+RESPONSE_ENCODING = "utf-8" # What SOLUS pages are decoded as, instead of guessing
+PARSE_CACHE_SIZE = 4 # Parsed pages kept in memory by each worker
+PARSE_CACHE_PATH = None # ex: "./logs/parse_cache.db" to reuse extracted course information across runs
+CENSUS_DIR = "./census" # Snapshots of the subjects and courses from `python main.py --census`
+NAV_MAP_PATH = None # ex: "./logs/nav_map.db" to remember the actions that open every subject and course
+DIE_SEARCH_BYTES = 64 * 1024 # How far into a page to look for a Data Integrity Error (None for the whole page)
+DUMP_HISTORY_SIZE = 10
+LEASE_SECONDS = 300
+MAX_JOB_ATTEMPTS = 3
+EVENT_LOG = "./logs/events.jsonl"
+CONSOLE_LOG_LEVEL = "INFO"
+STATUS_FILE = "./logs/status.json"
+STATUS_INTERVAL = 10
+STATUS_PORT = None # Set to a port number to serve the status at http://127.0.0.1:<port>/
+WORKER_MAX_RSS_MB = None # Replace workers with fresh processes when they use more memory than this
+WORKER_MAX_JOBS = None # ...or after running this many jobs
+WORKER_STALL_SECONDS = 900 # Restart workers that make no progress for this long, and give their job to another (None to never)
+COURSE_HELPERS = 0 # Extra sessions per worker to split the section pages of big courses with (deep scrapes)
+FANOUT_MIN_SECTIONS = 20 # Section pages each session gets at least when splitting them
+ARCHIVE_DIR = None # Set to a directory to keep the raw pages the data came from (see archive.py)
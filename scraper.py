@@ -1,39 +1,174 @@
 import logging
+import datetime
+from threading import Thread, Event
 import writer
+from models import Section
+
+# Sections to visit in a term before its section pages are split with helper sessions (each gets at least this many)
+try:
+    from config import FANOUT_MIN_SECTIONS
+except ImportError:
+    FANOUT_MIN_SECTIONS = 20
+
+# Order of the seasons within a year
+SEASONS = {"Winter": 0, "Spring": 1, "Summer": 1, "Fall": 2}
+
+
+def current_term(today=None):
+    """Returns the (year, season order) of the term in progress"""
+    today = today or datetime.date.today()
+    return (today.year, (today.month - 1) // 4)
+
+
+def is_current_term(term, today=None):
+    """
+    Checks if a term is the one in progress or an upcoming one.
+    Returns None if the term can't be placed.
+    """
+    season = SEASONS.get(term["season"])
+    if season is None or not term["year"].isdigit():
+        return None
+    return (int(term["year"]), season) >= current_term(today)
+
+
+def complete_section(section, course_number, subject, term):
+    """Adds the course, subject, and term a section (a `models.Section`) is in"""
+    section.place(course_number, subject, term['year'], term['season'])
+    return section
+
 
 class SolusScraper(object):
     """The class that coordinates the actual scraping"""
 
-    def __init__(self, session, job):
-        """Store the session to use and the scrape job to perform"""
+    def __init__(self, session, job, progress=None, over_budget=None, helpers=None, archive=None):
+        """
+        Store the session to use and the scrape job to perform.
+        `progress` is an optional `progress.WorkerProgress` to report to.
+        `over_budget` is an optional function that returns True when the
+        worker should stop and hand off the rest of the job (checked after
+        each subject).
+        `helpers` is an optional `navigation.HelperSessions` that the section
+        pages of big courses are split with on deep scrapes.
+        `archive` is an optional `archive.Archive` to save the pages data is
+        extracted from to.
+        """
 
         self.session = session
         self.job = job
+        self.progress = progress
+        self.over_budget = over_budget
+        self.helpers = helpers
+        self.archive = archive
+
+        # The parts of the job that are left if it was stopped early
+        self.remaining = None
+
+        # (subject abbreviation, course numbers) walked in the catalog that still need their sections
+        # searched for (when using the class search engine)
+        self._to_search = []
+
+        # The (wanted) terms the class search has, the sections in other terms come from the catalog
+        self._search_terms = []
+
+        # Session statistics already reported (the session outlives the job)
+        self._reported = self._session_stats()
+
+        # Requests made by this job, and how many of them were for section pages (the rest walk the catalog)
+        self._first_request = self.session.request_count
+        self._section_requests = 0
+
+    def _progress(self, field, n=1):
+        """Updates the progress counters (if reporting progress)"""
+        if self.progress is None:
+            return
+        self.progress.add(field, n)
+
+        stats = self._session_stats()
+        for name, value, reported in zip(("requests", "recoveries", "parse_hits", "parse_misses"), stats, self._reported):
+            self.progress.add(name, value - reported)
+        self._reported = stats
+
+    def request_stats(self):
+        """Returns how many requests this session made for the job, split into walking the catalog and section pages"""
+        walk = self.session.request_count - self._first_request - self._section_requests
+        return dict(tier=self.job["tier"], walk=walk, sections=self._section_requests)
+
+    def _session_stats(self):
+        cache = self.session.parse_cache.stats
+        requests, recoveries = self.session.request_count, self.session.recovery_count
+        if self.helpers is not None:
+            requests += self.helpers.request_count
+            recoveries += self.helpers.recovery_count
+        return (requests, recoveries, cache["tree_hits"], cache["tree_misses"])
+
+    def _archive(self, kind, body=None, **context):
+        """Archives the current page (or `body`) if archiving. Returns its record id."""
+        if self.archive is None:
+            return None
+        return self.archive.add(kind, self.session.latest_content if body is None else body, **context)
 
     def start(self):
-        """Starts running the scrape outlined in the job"""
+        """
+        Starts running the scrape outlined in the job.
+        Returns a list of jobs for the rest of the work if it went over budget, otherwise None.
+        """
 
-        logging.info(u"Starting job: {0}".format(self.job))
+        logging.info(u"Starting job: %s", self.job)
 
         try:
             self.scrape_letters()
         except Exception as e:
             logging.debug(e)
-            self.session.parser.dump_html()
+            self.session.dump_history()
             raise
 
+        logging.info(u"Parse cache: %(tree_hit_rate)s of pages and %(result_hit_rate)s of extractions reused",
+                     self.session.parse_cache.hit_rates(), extra={"event": "parse_cache"})
+        if self.session.nav_map is not None:
+            logging.info(u"Navigation map: %(jumps)s jumps, %(stale)s out of date, %(discovered)s actions found",
+                         self.session.nav_map.stats, extra={"event": "nav_map"})
+
+        # Each tier of a time-boxed run walks the catalog again (see `PRIORITIES` in main.py)
+        logging.info(u"Requests (tier %(tier)s): %(walk)s walking the catalog, %(sections)s for section pages",
+                     self.request_stats(), extra={"event": "requests"})
+
+        return self.remaining
+
     def scrape_letters(self):
         """Scrape all the letters"""
 
-        for letter in self.job["letters"]:
+        letters = self.job["letters"]
+
+        if self.job["engine"] == "search":
+            self._load_search_terms()
+
+        for i, letter in enumerate(letters):
 
             # Go to the letter
             self.session.select_alphanum(letter)
 
-            self.scrape_subjects()
+            resume_at = self.scrape_subjects()
+
+            if self.job["engine"] == "search":
+                self.scrape_search()
+
+            # Hand off the rest of the letters (and the rest of this one, if any)
+            if resume_at is not None or (i + 1 < len(letters) and self._over_budget()):
+                self.remaining = []
+                if resume_at is not None:
+                    self.remaining.append(dict(self.job, letters=letter, subject_start=resume_at))
+                if i + 1 < len(letters):
+                    self.remaining.append(dict(self.job, letters=letters[i + 1:]))
+                return
+
+    def _over_budget(self):
+        return self.over_budget is not None and self.over_budget()
 
     def scrape_subjects(self):
-        """Scrape all the subjects"""
+        """
+        Scrape all the subjects.
+        Returns the subject index to resume at if it stopped early, otherwise None.
+        """
 
         # Neatness
         start = self.job["subject_start"]
@@ -41,23 +176,48 @@ class SolusScraper(object):
         step = self.job["subject_step"]
 
         # Get a list of all subjects to iterate over
+        if self.archive is not None and not self.job["census"]:
+            self._archive("subjects", letter=self.session.location()[0])
         all_subjects = self.session.parser.all_subjects(start=start, end=end, step=step)
+        total = self.session.parser.num_subjects(start=start, end=end, step=step)
+        self._progress("subjects_total", total)
+        done = 0
 
         # Iterate over all subjects
         for subject in all_subjects:
 
-            logging.info(u"--Subject: {abbreviation} - {title}".format(**subject))
-
-            writer.write_subject(subject)
+            logging.info(u"--Subject: %(abbreviation)s - %(title)s", subject, extra={"event": "subject"})
 
             self.session.dropdown_subject(subject["_unique"])
 
-            self.scrape_courses(subject)
+            if self.job["census"]:
+                self.census_subject(subject)
+            else:
+                writer.write_subject(subject)
+                numbers = self.scrape_courses(subject)
+                if self.job["engine"] == "search":
+                    self._to_search.append((subject["abbreviation"], numbers))
 
             self.session.rollup_subject(subject["_unique"])
+            self._progress("subjects_done")
+            done += 1
+
+            if done < total and self._over_budget():
+                # Subjects the parser skipped aren't counted, so this can only redo work, never skip it
+                self._progress("subjects_total", done - total)
+                return start + done * step
+
+    def census_subject(self, subject):
+        """Records the courses of a subject without opening them (see `census`)"""
+
+        courses = list(self.session.parser.all_courses())
+        writer.write_census_subject(dict(subject, letter=self.session.location()[0], courses=courses, num_courses=len(courses)))
 
     def scrape_courses(self, subject):
-        """Scrape courses"""
+        """
+        Scrape courses.
+        Returns the course numbers.
+        """
 
         # Neatness
         start = self.job["course_start"]
@@ -65,17 +225,22 @@ class SolusScraper(object):
 
         # Get a list of all courses to iterate over
         all_courses = self.session.parser.all_courses(start=start, end=end)
+        self._progress("courses_total", self.session.parser.num_courses(start=start, end=end))
 
         # Iterate over all courses
+        numbers = []
         for course_unique in all_courses:
             self.session.open_course(course_unique)
-            
+            self._archive("course", subject=subject['abbreviation'])
+
             course_attrs = self.session.parser.course_attrs()
             course_attrs['basic']['subject'] = subject['abbreviation']
 
-            logging.info(u"----Course: {number} - {title}".format(**course_attrs['basic']))
+            logging.info(u"----Course: %(number)s - %(title)s", dict(number=course_attrs['basic']['number'], title=course_attrs['basic']['title']), extra={"event": "course"})
 
             writer.write_course(course_attrs)
+            numbers.append(course_attrs['basic']['number'])
+
             try:
                 self.session.show_sections()
             except Exception as e:
@@ -83,53 +248,238 @@ class SolusScraper(object):
                 logging.error(e)
                 raise
 
-            self.scrape_terms(course_attrs)
+            # The class search gets all the sections of the subject at once later (in the terms it has)
+            if self.job["engine"] == "search":
+                self.scrape_terms(course_attrs, skip=self._search_terms)
+            else:
+                self.scrape_terms(course_attrs)
             self.session.return_from_course()
-            
+            self._progress("courses_done")
+
+        return numbers
 
-    def scrape_terms(self, course):
-        """Scrape terms"""
+    def scrape_terms(self, course, skip=()):
+        """Scrape terms (except the ones in `skip`)"""
+
+        skip = set((x["year"], x["season"]) for x in skip)
 
         # Get all terms on the page and iterate over them
         all_terms = self.session.parser.all_terms()
         for term in all_terms:
-            logging.info(u"------Term: {year} - {season}".format(**term))
+
+            if not self._term_wanted(term) or (term["year"], term["season"]) in skip:
+                continue
+
+            logging.info(u"------Term: %(year)s - %(season)s", term, extra={"event": "term"})
             self.session.switch_to_term(term["_unique"])
 
             self.session.view_all_sections()
             self.scrape_sections(course, term)
 
+    def _term_wanted(self, term):
+        """Only the current or past terms if the job asks for them"""
+        if self.job["terms"] and is_current_term(term) is not None:
+            return is_current_term(term) == (self.job["terms"] == "current")
+        return True
+
     def scrape_sections(self, course, term):
         """Scrape sections"""
 
-        # Grab all the basic data
-        all_sections = self.session.parser.all_section_data()
+        page = self._archive("sections", subject=course['basic']['subject'], course=course['basic']['number'],
+                             term=dict(year=term['year'], season=term['season']), deep_status=self.job["deep_status"])
+
+        # Sections are parsed lazily and written out as soon as they're complete
+        # (Records take a fraction of the memory while they're waiting for helpers)
+        sections = (Section.from_dict(x) for x in self.session.parser.all_section_data())
+
+        # Jobs that only go deep on open (or closed) sections leave the rest alone
+        if self.job["deep_status"]:
+            sections = (x for x in sections if x.status == self.job["deep_status"])
+
+        # Sections whose pages are being visited by helper sessions
+        handed_off = {}
+        if self.job["deep"] and self.helpers is not None:
+            sections = list(sections)
+            handed_off = self._hand_off_sections(sections)
+
+        for section in sections:
+
+            logging.info(u"--------Section: %(class_num)s-%(type)s (%(solus_id)s) -- %(status)s", section.basic(), extra={"event": "section"})
+
+            # Deep scrape, go to the section page and add the data there
+            if self.job["deep"]:
+                new_data = None
+                if section.unique in handed_off:
+                    hand_off = handed_off[section.unique]
+                    new_data = hand_off.get(section.unique)
+                    if new_data is not None:
+                        self._archive("section", hand_off.body(section.unique), page=page, section=section.unique)
+
+                # (Also if the helper failed)
+                if new_data is None:
+                    before = self.session.request_count
+                    self.session.visit_section_page(section.unique)
+                    self._archive("section", page=page, section=section.unique)
+                    new_data = self.session.parser.section_deep_attrs()
+                    self.session.return_from_section()
+                    self._section_requests += self.session.request_count - before
+
+                # Add the new information to the section
+                section.add_deep_attrs(new_data)
+
+                logging.debug(u"SECTION DEEP DATA DUMP: %s", repr(section))
+            else:
+                logging.debug(u"SECTION CLASS DATA: %s", repr(section.meetings))
+
+            self._write_section(section, course['basic']['number'], course['basic']['subject'], term)
+
+    def _hand_off_sections(self, sections):
+        """
+        Splits the section pages of a big term between this session and the
+        helper sessions, which visit theirs at the same time in the background.
+        This session keeps the first share.
+
+        Returns a dict of the unique of every section handed off -> its `_HandOff`
+        """
+
+        shares = min(len(sections) // FANOUT_MIN_SECTIONS, self.helpers.size + 1)
+        helpers = self.helpers.get(shares - 1) if shares > 1 else []
+        if not helpers:
+            return {}
+
+        size = -(-len(sections) // (len(helpers) + 1))
+        location = self.session.location()
+        logging.debug(u"Splitting %s section pages between %s sessions", len(sections), len(helpers) + 1)
+
+        handed_off = {}
+        for i, helper in enumerate(helpers, 1):
+            uniques = [x.unique for x in sections[i * size:(i + 1) * size]]
+            hand_off = _HandOff(self.helpers, helper, location, uniques)
+            for unique in uniques:
+                handed_off[unique] = hand_off
+        return handed_off
+
+    def _write_section(self, section, course_number, subject, term):
+        writer.write_section(complete_section(section, course_number, subject, term))
+        self._progress("sections_done")
+
+    def scrape_search(self):
+        """
+        Scrape the sections of the subjects walked so far using the class search,
+        which lists all of a subject's sections in a term on one page.
+        """
+
+        subjects, self._to_search = self._to_search, []
+        if not subjects:
+            return
+
+        self.session.go_to_class_search()
+
+        for subject, numbers in subjects:
+            for term in self._search_terms:
+                logging.info(u"----Search: %(subject)s %(year)s - %(season)s", dict(subject=subject, year=term["year"], season=term["season"]), extra={"event": "search"})
+
+                if not self._search(subject, term):
+                    # Too many to show at once, search for each course instead
+                    for number in numbers:
+                        if not self._search(subject, term, number):
+                            logging.warning(u"Too many sections in search for %s %s", subject, number)
+
+        # Back to the catalog for the next letter
+        self.session.go_to_course_catalog()
+
+    def _load_search_terms(self):
+        """Looks up the terms the class search has before walking the catalog"""
+
+        self.session.go_to_class_search()
+        self._search_terms = [x for x in self.session.parser.search_terms() if self._term_wanted(x)]
+        self.session.go_to_course_catalog()
+
+        logging.info(u"Searching for the sections in %s, the sections in any other terms come from the catalog",
+                     u", ".join(x["_unique"] for x in self._search_terms) or u"no terms")
+
+    def _search(self, subject, term, number=None):
+        """Runs a search and scrapes the sections found. Returns False if there were too many to show."""
+
+        for attempt in range(2):
+            try:
+                if not self.session.search_classes(term["value"], subject, number):
+                    return False
+                self.scrape_search_sections(subject, term)
+                return True
+            except EnvironmentError as e:
+                # The search is easy to redo
+                if attempt:
+                    raise
+                logging.warning(u"%s, searching again", e)
+
+    def scrape_search_sections(self, subject, term):
+        """Scrape the sections in the search results"""
 
+        page = self._archive("search", subject=subject, term=dict(year=term['year'], season=term['season']),
+                             deep_status=self.job["deep_status"])
 
-        if logging.getLogger().isEnabledFor(logging.INFO):
-            for section in all_sections:
-                logging.info(u"--------Section: {class_num}-{type} ({solus_id}) -- {status}".format(**section["basic"]))
-                if not self.job["deep"]:
-                    logging.debug(u"SECTION CLASS DATA: {0}".format(section["classes"]))
+        for number, section in self.session.parser.all_search_sections():
+            section = Section.from_dict(section)
 
-        # Deep scrape, go to the section page and add the data there
-        if self.job["deep"]:
-            for i in range(len(all_sections)):
-                self.session.visit_section_page(all_sections[i]["_unique"])
+            # Jobs that only go deep on open (or closed) sections leave the rest alone
+            if self.job["deep_status"] and section.status != self.job["deep_status"]:
+                continue
 
-                # Add the new information to the all_sections dict
-                new_data = self.session.parser.section_deep_attrs()
-                all_sections[i].update(new_data)
+            logging.info(u"--------Section: %(class_num)s-%(type)s (%(solus_id)s) -- %(status)s", section.basic(), extra={"event": "section"})
 
-                self.session.return_from_section()
+            # Deep scrape, go to the section page and add the data there
+            if self.job["deep"]:
+                self.session.visit_search_section(section.class_num)
+                self._archive("search_section", page=page, class_num=section.class_num)
+                section.add_deep_attrs(self.session.parser.section_deep_attrs())
+                self.session.return_to_search_results()
 
-                logging.debug(u"SECTION DEEP DATA DUMP: {0}".format(all_sections[i]))
+                logging.debug(u"SECTION DEEP DATA DUMP: %s", repr(section))
+            else:
+                logging.debug(u"SECTION CLASS DATA: %s", repr(section.meetings))
 
-        for section in all_sections:
-            section['basic']['course'] = course['basic']['number']
-            section['basic']['subject'] = course['basic']['subject']
-            section['basic']['year'] = term['year']
-            section['basic']['season'] = term['season']
+            self._write_section(section, number, subject, term)
 
-            writer.write_section(section)
 
+class _HandOff(object):
+    """Section pages being visited by a helper session in the background"""
+
+    def __init__(self, helpers, helper, location, uniques):
+        self.helpers = helpers
+        self.helper = helper
+        self._data = None
+        self._done = Event()
+
+        t = Thread(target=self._run, args=(location, uniques), name="CourseHelper")
+        t.daemon = True
+        t.start()
+
+    def _run(self, location, uniques):
+        try:
+            self.helper.go_to_location(location)
+            data = {}
+            for unique in uniques:
+                self.helper.visit_section_page(unique)
+                data[unique] = (self.helper.parser.section_deep_attrs(), self.helper.latest_content)
+                self.helper.return_from_section()
+            self._data = data
+        except Exception:
+            # The sections are visited by the main session instead
+            logging.exception("Helper session failed")
+            self.helper.dump_history()
+        finally:
+            self._done.set()
+
+    def get(self, unique):
+        """Waits for the helper and returns the deep data of a section, or None if the helper failed"""
+        self._done.wait()
+        if self._data is None:
+            if self.helper in self.helpers.sessions:
+                self.helpers.discard(self.helper)
+            return None
+        return self._data[unique][0]
+
+    def body(self, unique):
+        """Returns the response the deep data of a section came from (once `get` returned it)"""
+        return self._data[unique][1]
@@ -0,0 +1,120 @@
+"""
+Authenticated SOLUS session cookies, saved between runs.
+
+Logging in goes through several slow round trips of the SSO system. With
+`SESSION_STORE_DIR` set, the cookies of every session that reaches the course
+catalog are saved there under the name of the session (ex: the index of its
+worker), and the next session with the same name tries them first. Cookies
+that SOLUS rejects are replaced by logging in again.
+
+Each session has its own cookies since PeopleSoft keeps the state of the
+pages (see `navigation`) per session.
+
+While they're valid, the cookies are as good as the password, so they're
+encrypted with a key derived from `SESSION_STORE_KEY` (or the password if it
+isn't set). This needs the `cryptography` package, nothing is saved without it.
+"""
+
+import os
+import json
+import time
+import base64
+import hashlib
+import logging
+from requests.cookies import RequestsCookieJar, create_cookie
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+except ImportError:
+    Fernet = None
+
+try:
+    from config import SESSION_STORE_DIR
+except ImportError:
+    SESSION_STORE_DIR = None
+
+try:
+    from config import SESSION_STORE_KEY
+except ImportError:
+    SESSION_STORE_KEY = None
+
+# Iterations of PBKDF2 to derive the encryption key with (a fraction of a second, once per login)
+KDF_ITERATIONS = 200000
+
+SALT_BYTES = 16
+
+
+class SessionStore(object):
+    """The saved cookies of the sessions of a SOLUS user"""
+
+    def __init__(self, user, password, directory=SESSION_STORE_DIR, key=SESSION_STORE_KEY):
+        self.user = user
+        self.directory = directory
+        self._secret = (key or password or "").encode("utf-8")
+
+        self.enabled = bool(directory)
+        if self.enabled and Fernet is None:
+            logging.warning(u"Install the cryptography package to save session cookies, logging in every time instead")
+            self.enabled = False
+
+    def _filename(self, name):
+        return os.path.join(self.directory, u"{0}.cookies".format(name))
+
+    def _fernet(self, salt):
+        key = hashlib.pbkdf2_hmac("sha256", self._secret, salt, KDF_ITERATIONS)
+        return Fernet(base64.urlsafe_b64encode(key))
+
+    def load(self, name):
+        """Returns the cookies saved for the session `name`, or None"""
+        if not self.enabled:
+            return None
+
+        try:
+            with open(self._filename(name), "rb") as f:
+                data = f.read()
+        except (IOError, OSError):
+            return None
+
+        salt, token = data[:SALT_BYTES], data[SALT_BYTES:]
+        try:
+            saved = json.loads(self._fernet(salt).decrypt(token).decode("utf-8"))
+        except (InvalidToken, ValueError):
+            # (Ex: the password or SESSION_STORE_KEY changed)
+            logging.warning(u"Couldn't decrypt the saved cookies of session %s", name)
+            return None
+
+        if saved["user"] != self.user:
+            return None
+
+        jar = RequestsCookieJar()
+        for cookie in saved["cookies"]:
+            jar.set_cookie(create_cookie(**cookie))
+        return jar
+
+    def save(self, name, cookies):
+        """Saves the cookies of the session `name` (a `requests` cookie jar)"""
+        if not self.enabled:
+            return
+
+        saved = dict(user=self.user, saved=time.time(), cookies=[
+            dict(name=c.name, value=c.value, domain=c.domain, path=c.path, secure=c.secure,
+                 expires=c.expires, rest=dict(c._rest))
+            for c in cookies
+        ])
+        salt = os.urandom(SALT_BYTES)
+        data = salt + self._fernet(salt).encrypt(json.dumps(saved).encode("utf-8"))
+
+        try:
+            os.makedirs(self.directory)
+        except OSError:
+            pass
+
+        # Only readable by the user, and replaced in one go so other processes never read it half written
+        filename = self._filename(name)
+        temp = u"{0}.{1}.tmp".format(filename, os.getpid())
+        try:
+            fd = os.open(temp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.rename(temp, filename)
+        except (IOError, OSError) as e:
+            logging.warning(u"Couldn't save the cookies of session %s: %s", name, e)
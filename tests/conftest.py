@@ -0,0 +1,11 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# Most modules need a config.py, use the sample one if there isn't one
+try:
+    import config
+except ImportError:
+    import sample_config
+    sys.modules["config"] = sample_config
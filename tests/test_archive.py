@@ -0,0 +1,100 @@
+"""
+Tests of archiving pages and extracting the data from them again.
+
+Usage: python -m pytest tests/test_archive.py
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import archive
+from archive import Archive
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+TERM = dict(year="2013", season="Fall")
+
+
+def _fixture(name):
+    with open(os.path.join(FIXTURES, name), "rb") as f:
+        return f.read()
+
+
+class ArchiveTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def archive_pages(self, name, pages):
+        """Archives the (kind, body, context) `pages` as if by one worker, to a file called `name`"""
+        directory = tempfile.mkdtemp(dir=self.dir)
+        arc = Archive(directory)
+        ids = []
+        for kind, body, context in pages:
+            if context.get("page") is not None:
+                context = dict(context, page=ids[context["page"]])
+            ids.append(arc.add(kind, body, **context))
+        arc.close()
+        os.rename(arc.filename, os.path.join(self.dir, name))
+        shutil.rmtree(directory)
+        return ids
+
+    def test_records_are_read_back(self):
+        body = _fixture("catalog_course.html")
+        ids = self.archive_pages("a.arc", [
+            ("sections", body, dict(subject="CISC", course="121", term=TERM)),
+            ("sections", body, dict(subject="CISC", course="121", term=TERM)),
+            ("section", b"<html></html>", dict(page=0, section="001-LEC (1234)")),
+        ])
+
+        # The same page with the same context is only kept once
+        self.assertEqual(ids, [0, 0, 1])
+
+        filename = os.path.join(self.dir, "a.arc")
+        records = list(archive.read_headers(filename))
+        self.assertEqual([x[1]["kind"] for x in records], ["sections", "section"])
+        with open(filename, "rb") as f:
+            self.assertEqual(archive.read_page(f, *records[0]), body)
+        self.assertEqual(archive.stats(self.dir)["section"]["records"], 1)
+
+        # A worker that died in the middle of a record
+        with open(filename, "ab") as f:
+            f.write(json.dumps(dict(id=2, kind="course", context={}, size=1000, t=0)).encode("utf-8") + b"\n" + b"x" * 10)
+        self.assertEqual(len(list(archive.read_headers(filename))), 2)
+
+    def test_later_pages_overwrite_earlier_ones(self):
+        # The deep tier's file sorts first, but it was archived after the shallow one
+        self.archive_pages("b-shallow.arc", [
+            ("sections", _fixture("catalog_course.html"), dict(subject="CISC", course="121", term=TERM, deep_status=None)),
+        ])
+        time.sleep(0.01)
+        self.archive_pages("a-deep.arc", [
+            ("sections", _fixture("catalog_course.html"), dict(subject="CISC", course="121", term=TERM, deep_status="Open")),
+            ("section", _fixture("section_page.html"), dict(page=0, section="001-LEC (1234)")),
+        ])
+
+        output = os.path.join(self.dir, "output")
+        totals = archive.extract(self.dir, output, processes=2)
+        self.assertEqual(totals, dict(sections=5))
+
+        def section(solus_id):
+            with open(os.path.join(output, "sections", "2013_Fall_CISC_121_({0}).json".format(solus_id))) as f:
+                return json.load(f)
+
+        self.assertEqual(section("001")["availability"]["class_curr"], 97)
+        self.assertEqual(section("001")["details"]["campus"], "Kingston")
+        self.assertNotIn("availability", section("002"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+"""
+Tests of the census snapshots and what changed between them.
+
+Usage: python -m pytest tests/test_census.py
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import census
+
+
+class CensusTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.output_dir = os.path.join(self.dir, "data-dump")
+        self.census_dir = os.path.join(self.dir, "census")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def census(self, subjects):
+        """Writes the subjects the way the census jobs do, then builds a snapshot"""
+        census.clear(self.output_dir)
+        os.makedirs(os.path.join(self.output_dir, "census"))
+        for letter, abbreviation, title, courses in subjects:
+            subject = dict(letter=letter, abbreviation=abbreviation, title=title, _unique=u"{0} - {1}".format(abbreviation, title),
+                           courses=courses, num_courses=len(courses))
+            with open(os.path.join(self.output_dir, "census", abbreviation + ".json"), "w") as f:
+                json.dump(subject, f)
+        return census.build(self.output_dir, self.census_dir)
+
+    def test_first_census(self):
+        snapshot, changes = self.census([
+            ("C", "CISC", "Computing", ["121", "124"]),
+            ("C", "CHEM", "Chemistry", ["112"]),
+            ("M", "MATH", "Mathematics", ["110", "120", "121"]),
+        ])
+        self.assertIsNone(changes)
+        self.assertEqual(snapshot["num_subjects"], 3)
+        self.assertEqual(snapshot["num_courses"], 6)
+        self.assertEqual(snapshot["letters"], dict(C=dict(subjects=2, courses=3), M=dict(subjects=1, courses=3)))
+
+        with open(census.latest(self.census_dir)) as f:
+            self.assertEqual(json.load(f)["subjects"]["CISC"]["courses"], ["121", "124"])
+
+    def test_changes_since_the_last_census(self):
+        self.census([
+            ("C", "CISC", "Computing", ["121", "124"]),
+            ("C", "CHEM", "Chemistry", ["112"]),
+        ])
+        _, changes = self.census([
+            ("C", "CISC", "Computing Science", ["121", "235"]),
+            ("M", "MATH", "Mathematics", ["110"]),
+        ])
+        self.assertEqual(changes["added_subjects"], ["MATH"])
+        self.assertEqual(changes["removed_subjects"], ["CHEM"])
+        self.assertEqual(changes["added_courses"], dict(CISC=["235"], MATH=["110"]))
+        self.assertEqual(changes["removed_courses"], dict(CISC=["124"], CHEM=["112"]))
+        self.assertEqual(changes["renamed_subjects"], dict(CISC=["Computing", "Computing Science"]))
+        self.assertEqual((changes["num_added_courses"], changes["num_removed_courses"]), (2, 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
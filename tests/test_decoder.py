@@ -0,0 +1,40 @@
+"""
+Tests of decoding the values in meeting tables.
+
+Usage: python -m pytest tests/test_decoder.py
+"""
+
+import os
+import sys
+import unittest
+from datetime import date, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import decoder
+
+
+class DecoderTest(unittest.TestCase):
+
+    def test_instructors(self):
+        self.assertEqual(decoder.decode_instructors(u"Smith,John"), (u"Smith, John",))
+        self.assertEqual(decoder.decode_instructors(u"Lee,Ann,Wong,Bob"), (u"Lee, Ann", u"Wong, Bob"))
+        self.assertEqual(decoder.decode_instructors(u"Doe,  Jane"), (u"Doe, Jane",))
+        self.assertEqual(decoder.decode_instructors(u"Staff"), ())
+        self.assertEqual(decoder.decode_instructors(None), ())
+
+    def test_unpaired_instructor_names(self):
+        self.assertEqual(decoder.decode_instructors(u"John Smith"), (u"John Smith",))
+        self.assertEqual(decoder.decode_instructors(u"A,B,C"), (u"A, B", u"C"))
+        self.assertEqual(decoder.decode_instructors(u"Smith,John,"), (u"Smith, John",))
+
+    def test_meeting_values(self):
+        self.assertEqual(decoder.decode_time(u"1:30PM"), time(13, 30))
+        self.assertEqual(decoder.decode_time(u"TBA"), None)
+        self.assertEqual(decoder.decode_days(u"MoWe"), (3, 1))
+        self.assertEqual(decoder.decode_days(u"TBA"), (None,))
+        self.assertEqual(decoder.decode_date_range(u"2013/09/09 - 2013/11/29"), (date(2013, 9, 9), date(2013, 11, 29)))
+
+
+if __name__ == "__main__":
+    unittest.main()
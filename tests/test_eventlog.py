@@ -0,0 +1,77 @@
+"""
+Tests of the structured log written by the listener process.
+
+Usage: python -m pytest tests/test_eventlog.py
+"""
+
+import os
+import sys
+import json
+import shutil
+import logging
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from eventlog import EventLog
+
+
+class EventLogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "logs", "events.jsonl")
+
+        root_logger = logging.getLogger()
+        self.handlers, self.level = list(root_logger.handlers), root_logger.level
+
+    def tearDown(self):
+        root_logger = logging.getLogger()
+        for handler in list(root_logger.handlers):
+            root_logger.removeHandler(handler)
+        for handler in self.handlers:
+            root_logger.addHandler(handler)
+        root_logger.setLevel(self.level)
+        shutil.rmtree(self.dir)
+
+    def lines(self):
+        with open(self.path) as f:
+            return [json.loads(x) for x in f]
+
+    def test_records_are_written_as_json_lines(self):
+        log = EventLog(self.path, level=logging.INFO, console_level=None)
+        logging.info(u"--Subject: %(abbreviation)s - %(title)s", dict(abbreviation="CISC", title="Computing"),
+                     extra={"event": "subject"})
+        logging.warning(u"Retrying %s of %s", 1, 5)
+        logging.debug(u"Not written")
+        try:
+            raise ValueError("bad page")
+        except ValueError:
+            logging.exception(u"Crashed")
+        log.close()
+
+        subject, retry, crash = self.lines()
+
+        # The dict is written out as fields, the message isn't
+        self.assertEqual((subject["event"], subject["abbreviation"], subject["title"], subject["lvl"]),
+                         ("subject", "CISC", "Computing", "INFO"))
+        self.assertNotIn("msg", subject)
+
+        self.assertEqual((retry["msg"], retry["lvl"]), ("Retrying 1 of 5", "WARNING"))
+        self.assertIn("ValueError: bad page", crash["exc"])
+        for line in (subject, retry, crash):
+            self.assertIn("t", line)
+            self.assertIn("proc", line)
+
+    def test_standard_fields_win(self):
+        log = EventLog(self.path, console_level=None)
+        logging.info(u"Requests: %(walk)s", dict(walk=3, lvl="mine"), extra={"event": "requests"})
+        log.close()
+
+        line, = self.lines()
+        self.assertEqual((line["walk"], line["lvl"]), (3, "INFO"))
+
+
+if __name__ == "__main__":
+    unittest.main()
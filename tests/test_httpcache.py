@@ -0,0 +1,93 @@
+"""
+Tests of the conditional-GET disk cache, with a stand-in for the server.
+
+Usage: python -m pytest tests/test_httpcache.py
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from httpcache import HTTPCache
+
+
+class _Response(object):
+
+    def __init__(self, status_code, text=u"", headers=None):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise IOError(self.status_code)
+
+
+class _Server(object):
+    """Returns the queued responses, remembers the request headers"""
+
+    def __init__(self):
+        self.responses = []
+        self.requests = []
+
+    def fetch(self, url, headers=None):
+        self.requests.append(headers)
+        return self.responses.pop(0)
+
+
+class HTTPCacheTest(unittest.TestCase):
+
+    URL = "http://www.campusbookstore.com/Textbooks/Course/CISC121"
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cache = HTTPCache(self.dir)
+        self.server = _Server()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def get(self, response):
+        self.server.responses.append(response)
+        return self.cache.get(self.server.fetch, self.URL)
+
+    def test_only_committed_pages_are_cached(self):
+        text, changed, commit = self.get(_Response(200, u"books", {"ETag": '"1"'}))
+        self.assertEqual((text, changed), (u"books", True))
+
+        # Not dealt with, so it's still changed
+        text, changed, commit = self.get(_Response(200, u"books", {"ETag": '"1"'}))
+        self.assertEqual(self.server.requests[-1], {})
+        self.assertTrue(changed)
+        commit()
+
+        text, changed, commit = self.get(_Response(304))
+        self.assertEqual(self.server.requests[-1], {"If-None-Match": '"1"'})
+        self.assertEqual((text, changed), (u"books", False))
+        self.assertEqual((self.cache.misses, self.cache.revalidated), (2, 1))
+
+    def test_fresh_pages_are_not_requested(self):
+        self.get(_Response(200, u"books", {"Cache-Control": "max-age=600"}))[2]()
+        text, changed, commit = self.cache.get(self.server.fetch, self.URL)
+        self.assertEqual((text, changed), (u"books", False))
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_not_modified_but_no_store(self):
+        self.get(_Response(200, u"books", {"ETag": '"1"'}))[2]()
+
+        text, changed, commit = self.get(_Response(304, headers={"Cache-Control": "no-store"}))
+        self.assertEqual((text, changed), (u"books", True))
+        commit()
+
+        # Dropped, so the next request isn't conditional
+        self.get(_Response(200, u"books", {"ETag": '"1"'}))
+        self.assertEqual(self.server.requests[-1], {})
+
+
+if __name__ == "__main__":
+    unittest.main()
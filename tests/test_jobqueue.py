@@ -0,0 +1,127 @@
+"""
+Runs several local worker processes (`JobManager.run_jobs`, with a stand-in
+for SOLUS) against one `SharedJobQueue` file and kills some of them in the
+middle of their leases.
+
+Usage: python -m pytest tests/test_jobqueue.py
+"""
+
+import os
+import sys
+import time
+import shutil
+import signal
+import tempfile
+import unittest
+from multiprocessing import Process
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import main
+from main import JobManager, ScrapeJob
+from jobqueue import SharedJobQueue
+
+LEASE_SECONDS = 1
+
+
+class _FakeSession(object):
+    """Stands in for a `SolusSession`, doesn't log in"""
+
+    def __init__(self, user, password, cookies=None, name=None, heartbeat=None):
+        self.name = name
+
+
+class _FakeScraper(object):
+    """Stands in for a `SolusScraper`, the job says how it behaves"""
+
+    def __init__(self, session, job, progress, over_budget, helpers, archive):
+        self.job = job
+
+    def start(self):
+        if self.job.get("hang"):
+            # Only the first time, the test kills the worker
+            flag = os.path.join(self.job["flag_dir"], "hung")
+            if not os.path.exists(flag):
+                open(flag, "w").close()
+                time.sleep(60)
+        if self.job.get("crash"):
+            os._exit(1)
+
+        time.sleep(0.1)
+
+
+def _worker(path):
+    """Works on the jobs in the queue the way `python main.py --queue path --worker` does"""
+    main.SolusSession = _FakeSession
+    main.SolusScraper = _FakeScraper
+    main.LEASE_POLL_SECONDS = 0.1
+
+    manager = JobManager("user", "pass", dict(threads=1, queue=path, worker_only=True))
+    manager.jobs = SharedJobQueue(path, job_type=ScrapeJob, lease_seconds=LEASE_SECONDS, max_attempts=2)
+    manager.run_jobs(manager.jobs)
+
+
+class SharedJobQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "queue.db")
+        self.queue = SharedJobQueue(self.path, lease_seconds=LEASE_SECONDS, max_attempts=2)
+        self.workers = []
+
+    def tearDown(self):
+        for worker in self.workers:
+            if worker.is_alive():
+                worker.terminate()
+            worker.join()
+        shutil.rmtree(self.dir)
+
+    def start_workers(self, num):
+        for x in range(num):
+            worker = Process(target=_worker, args=(self.path,))
+            worker.start()
+            self.workers.append(worker)
+
+    def wait_for_workers(self, timeout=30):
+        end = time.time() + timeout
+        for worker in self.workers:
+            worker.join(max(end - time.time(), 0))
+            self.assertFalse(worker.is_alive(), "workers didn't finish")
+
+    def attempts(self):
+        with self.queue._connect() as db:
+            return dict(db.execute("SELECT id, attempts FROM jobs").fetchall())
+
+    def test_killed_worker_job_is_leased_again(self):
+        for x in range(6):
+            self.queue.put_nowait(ScrapeJob(n=x, hang=(x == 2), flag_dir=self.dir))
+        self.start_workers(3)
+
+        # Kill whoever is working on the job that hangs
+        flag = os.path.join(self.dir, "hung")
+        end = time.time() + 10
+        while not os.path.exists(flag) and time.time() < end:
+            time.sleep(0.05)
+        self.assertTrue(os.path.exists(flag))
+        with self.queue._connect() as db:
+            job_id, worker = db.execute("SELECT id, worker FROM jobs WHERE job LIKE '%\"hang\": true%'").fetchone()
+        os.kill(int(worker.split(":")[-1]), signal.SIGKILL)
+
+        self.wait_for_workers()
+        self.assertEqual(self.queue.status(), {"done": 6})
+        self.assertEqual(self.attempts()[job_id], 2)
+
+    def test_job_that_keeps_crashing_fails(self):
+        self.queue.put_nowait(ScrapeJob(n=0))
+        self.queue.put_nowait(ScrapeJob(n=1, crash=True))
+        self.queue.put_nowait(ScrapeJob(n=2))
+        self.start_workers(3)
+
+        self.wait_for_workers()
+        self.assertEqual(self.queue.status(), {"done": 2, "failed": 1})
+        self.assertEqual(self.queue.pending(), [])
+        self.assertEqual(max(self.attempts().values()), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
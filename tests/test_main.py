@@ -0,0 +1,65 @@
+"""
+Tests of how `JobManager` sets up the jobs.
+
+Usage: python -m pytest tests/test_main.py
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import main
+from main import JobManager, ScrapeJob, TextbookJob
+
+
+class _RecordingScraper(object):
+    """Stands in for the `TextbookScraper`, remembers the config it was given"""
+
+    configs = []
+
+    def __init__(self, config):
+        self.configs.append(config)
+
+    def scrape(self):
+        pass
+
+
+class TextbookJobTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.scraper = main.TextbookScraper
+        main.TextbookScraper = _RecordingScraper
+        _RecordingScraper.configs = []
+
+    def tearDown(self):
+        main.TextbookScraper = self.scraper
+        shutil.rmtree(self.dir)
+
+    def run_textbooks(self, textbooks):
+        # A worker-only manager doesn't make any jobs
+        config = dict(threads=1, job=ScrapeJob(letters="CM"), textbooks=textbooks,
+                      queue=os.path.join(self.dir, "queue.db"), worker_only=True)
+        manager = JobManager("user", "pass", config)
+        manager.run_textbook_job(manager.config["textbooks"])
+        self.assertEqual(len(_RecordingScraper.configs), 1)
+        return _RecordingScraper.configs[0]
+
+    def test_scraper_gets_the_job_letters(self):
+        # What `python main.py` uses
+        config = self.run_textbooks(TextbookJob())
+        self.assertEqual(config["letters"], "CM")
+        self.assertEqual(config["concurrency"], TextbookJob()["concurrency"])
+
+    def test_own_letters_are_kept(self):
+        config = self.run_textbooks(TextbookJob(letters="Z", delay=0))
+        self.assertEqual(config["letters"], "Z")
+        self.assertEqual(config["delay"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+"""
+Tests of the compact records, against the JSON the writer puts out for the parser's dicts.
+
+Usage: python -m pytest tests/test_models.py
+"""
+
+import os
+import sys
+import copy
+import json
+import shutil
+import pickle
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import writer
+from models import Subject, Course, Section
+from parser import SolusParser
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+TERM = dict(year="2013", season="Fall")
+
+
+def _parser(name):
+    with open(os.path.join(FIXTURES, name), "rb") as f:
+        parser = SolusParser()
+        parser.update_html(f.read(), "utf-8")
+    return parser
+
+
+def _placed(section):
+    """A parser section dict with the context the scraper adds"""
+    section = copy.deepcopy(section)
+    section["basic"].update(course="121", subject="CISC", **TERM)
+    return section
+
+
+class RecordTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.output_dir = writer.OUTPUT_DIR
+
+    def tearDown(self):
+        writer.OUTPUT_DIR = self.output_dir
+        shutil.rmtree(self.dir)
+
+    def written(self, write, obj, name):
+        """Returns the JSON `write` puts out for `obj` (in a directory called `name`)"""
+        writer.OUTPUT_DIR = os.path.join(self.dir, name)
+        write(obj)
+        ret = {}
+        for root, dirs, files in os.walk(writer.OUTPUT_DIR):
+            for filename in files:
+                with open(os.path.join(root, filename)) as f:
+                    ret[filename] = f.read()
+        return ret
+
+    def assertSameJSON(self, write, d, record):
+        self.assertEqual(self.written(write, record, "record"), self.written(write, d, "dict"))
+        shutil.rmtree(os.path.join(self.dir, "record"))
+        shutil.rmtree(os.path.join(self.dir, "dict"))
+
+    def test_sections_round_trip(self):
+        deep = _parser("section_page.html").section_deep_attrs()
+
+        for section in _parser("catalog_course.html").all_section_data():
+            shallow = _placed(section)
+            self.assertEqual(Section.from_dict(shallow).to_dict(), shallow)
+            self.assertSameJSON(writer.write_section, shallow, Section.from_dict(shallow))
+
+            full = dict(shallow, **deep)
+            self.assertEqual(Section.from_dict(full).to_dict(), full)
+            self.assertSameJSON(writer.write_section, full, Section.from_dict(full))
+
+    def test_search_sections_round_trip(self):
+        for number, section in _parser("search_results.html").all_search_sections():
+            section = _placed(section)
+            self.assertEqual(Section.from_dict(section).to_dict(), section)
+
+    def test_subjects_and_courses_round_trip(self):
+        subject = dict(title=u"Computing Science", abbreviation=u"CISC", _unique=u"CISC - Computing Science")
+        self.assertSameJSON(writer.write_subject, subject, Subject.from_dict(subject))
+
+        course = _parser("catalog_course.html").course_attrs()
+        course["basic"]["subject"] = u"CISC"
+        self.assertEqual(Course.from_dict(course).to_dict(), course)
+        self.assertSameJSON(writer.write_course, course, Course.from_dict(course))
+
+    def test_meetings_are_stored_once(self):
+        section = Section.from_dict(_placed(next(_parser("catalog_course.html").all_section_data())))
+
+        # "MoWe" and "Fr" rows, the first is 2 classes in the dict
+        self.assertEqual([x.days for x in section.meetings], [(3, 1), (5,)])
+        self.assertIs(section.meetings[0].instructors[0], section.meetings[1].instructors[0])
+
+    def test_records_hold_plain_strings(self):
+        section = Section.from_dict(_placed(next(_parser("catalog_course.html").all_section_data())))
+        section.add_deep_attrs(_parser("section_page.html").section_deep_attrs())
+
+        # Not the parser's strings, which would keep (and pickle) the whole page
+        self.assertIs(type(section.details["campus"]), str)
+        self.assertLess(len(pickle.dumps(section)), 2000)
+        self.assertEqual(pickle.loads(pickle.dumps(section)), section)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+"""
+Tests of the navigation map, and of how `SolusSession` uses it to skip parsing pages.
+
+Usage: python -m pytest tests/test_navmap.py
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from collections import deque
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import requests
+
+from navigation import SolusSession
+from navmap import NavigationMap
+from parser import SolusParser
+
+SUBJECT_ACTION = "DERIVED_SSS_BCC_GROUP_BOX_1$147$${0}"
+LINK = '<a id="{0}" href="javascript:submitAction_win0(document.win0,\'{0}\');">{1}</a>'
+
+
+class _FakeCatalog(object):
+    """Stands in for the `requests` session, a letter of the catalog with `subjects` on it"""
+
+    def __init__(self, subjects):
+        self.subjects = subjects
+        self.open = None
+        self.actions = []
+
+    def post(self, url, data=None, **kwargs):
+        action = data["ICAction"]
+        self.actions.append(action)
+        if action.startswith("DERIVED_SSS_BCC_GROUP_BOX_1"):
+            index = int(action.rsplit("$", 1)[1])
+            self.open = None if index == self.open else index
+
+        links = [LINK.format(SUBJECT_ACTION.format(i), x) for i, x in enumerate(self.subjects)]
+        if self.open is not None:
+            links.insert(self.open + 1, LINK.format("CRSE_NBR$0", "121"))
+
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response._content = u"<html><body>{0}</body></html>".format(u"".join(links)).encode("utf-8")
+        return response
+
+
+class _CountingParser(SolusParser):
+
+    parses = 0
+
+    def update_html(self, markup, encoding=None):
+        self.parses += 1
+        return SolusParser.update_html(self, markup, encoding)
+
+
+def _session(subjects, nav_map):
+    """A session on the page of the letter "C", without logging in"""
+    session = SolusSession.__new__(SolusSession)
+    session.name = session.heartbeat = None
+    session.session = _FakeCatalog(subjects)
+    session._parser = _CountingParser()
+    session._update_parser = False
+    session.nav_map = nav_map
+    session.latest_response = session.latest_content = None
+    session.history = deque(maxlen=0)
+    session.request_count = session.recovery_count = 0
+    session.recovery_state = -1
+    session.recovery_stack = [None, None, None, None, None]
+    session.select_alphanum("C")
+    return session
+
+
+class NavigationMapTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "navmap.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_actions_are_kept_between_runs(self):
+        nav_map = NavigationMap(self.path)
+        nav_map.put("C", "CISC - Computing", "", "A$1")
+        nav_map.put("C", "CISC - Computing", "121", "CRSE_NBR$0")
+        nav_map.put("C", "CHEM - Chemistry", "", "A$2")
+        nav_map.forget("C", "CHEM - Chemistry")
+
+        nav_map = NavigationMap(self.path)
+        self.assertEqual(nav_map.get("C", "CISC - Computing"), "A$1")
+        self.assertEqual(nav_map.get("C", "CISC - Computing", "121"), "CRSE_NBR$0")
+        self.assertIsNone(nav_map.get("C", "CHEM - Chemistry"))
+
+    def test_unusable_path(self):
+        # Works like an empty map that isn't saved
+        nav_map = NavigationMap(self.dir)
+        nav_map.put("C", "CISC - Computing", "", "A$1")
+        self.assertEqual(nav_map.get("C", "CISC - Computing"), "A$1")
+
+
+class MappedNavigationTest(unittest.TestCase):
+
+    SUBJECTS = [u"CHEM - Chemistry", u"CISC - Computing &amp; Science"]
+
+    def walk(self, subjects, nav_map):
+        session = _session(subjects, nav_map)
+        parses = session._parser.parses
+        session.dropdown_subject(u"CISC - Computing & Science")
+        session.open_course(u"121")
+        return session, session._parser.parses - parses
+
+    def test_mapped_actions_skip_the_parse(self):
+        nav_map = NavigationMap(None)
+        session, parses = self.walk(self.SUBJECTS, nav_map)
+        self.assertEqual(parses, 3)
+
+        # Only the course page is parsed (its careers are checked, and it's scraped anyway)
+        session, parses = self.walk(self.SUBJECTS, nav_map)
+        self.assertEqual(parses, 1)
+        self.assertEqual(nav_map.stats["jumps"], 2)
+        self.assertEqual(session.session.actions[1:], [SUBJECT_ACTION.format(1), "CRSE_NBR$0"])
+
+    def test_moved_link_is_not_posted(self):
+        nav_map = NavigationMap(None)
+        self.walk(self.SUBJECTS, nav_map)
+
+        # A new subject moves the old action to another subject
+        session, _ = self.walk([u"CHEM - Chemistry", u"CIVL - Civil", self.SUBJECTS[1]], nav_map)
+        self.assertEqual(session.session.actions[1:], [SUBJECT_ACTION.format(2), "CRSE_NBR$0"])
+        self.assertEqual(nav_map.stats["stale"], 1)
+        self.assertEqual(nav_map.get("C", u"CISC - Computing & Science"), SUBJECT_ACTION.format(2))
+
+
+if __name__ == "__main__":
+    unittest.main()
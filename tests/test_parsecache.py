@@ -0,0 +1,99 @@
+"""
+Tests of the cache of parsed pages.
+
+Usage: python -m pytest tests/test_parsecache.py
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import parsecache
+from parsecache import ParseCache, digest
+from parser import SolusParser
+
+PAGE = (u'<html><body><form><input type="hidden" name="ICSID" value="{0}"/>'
+        u'<input type="hidden" name="ICStateNum" value="{1}"/>'
+        u'<a id="DERIVED_SSS_BCC_GROUP_BOX_1$147$$0">CISC - Computing</a>{2}</form></body></html>')
+
+
+class DigestTest(unittest.TestCase):
+
+    def test_state_tokens_are_ignored(self):
+        self.assertEqual(digest(PAGE.format("abc", 1, "")), digest(PAGE.format("xyz", 2, "")))
+        self.assertEqual(digest(PAGE.format("abc", 1, "")), digest(PAGE.format("abc", 1, "").encode("utf-8")))
+
+    def test_content_is_not(self):
+        self.assertNotEqual(digest(PAGE.format("abc", 1, "")), digest(PAGE.format("abc", 1, "<p>Changed</p>")))
+
+
+class ParseCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "parsecache.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_trees_are_evicted_oldest_first(self):
+        cache = ParseCache(size=2, path=None)
+        a, b, c = object(), object(), object()
+        self.assertEqual(cache.put_tree("a", a), [])
+        self.assertEqual(cache.put_tree("b", b), [])
+        self.assertIs(cache.get_tree("a"), a)
+        self.assertEqual(cache.put_tree("c", c), [b])
+        self.assertIsNone(cache.get_tree("b"))
+        self.assertTrue(cache.holds(a) and cache.holds(c))
+        self.assertEqual((cache.stats["tree_hits"], cache.stats["tree_misses"]), (1, 1))
+
+    def test_results_are_copies(self):
+        cache = ParseCache(size=2, path=None)
+        cache.put_result("a", "all_courses", ["121"]).append("124")
+        cache.get_result("a", "all_courses").append("124")
+        self.assertEqual(cache.get_result("a", "all_courses"), ["121"])
+        self.assertRaises(KeyError, cache.get_result, "a", "all_subjects")
+
+    def test_results_are_kept_between_runs(self):
+        ParseCache(path=self.path).put_result("a", "all_courses", ["121"])
+
+        cache = ParseCache(path=self.path)
+        self.assertEqual(cache.get_result("a", "all_courses"), ["121"])
+        self.assertEqual(cache.stats["stored_hits"], 1)
+
+    def test_results_of_an_older_parser_are_not_used(self):
+        ParseCache(path=self.path).put_result("a", "all_courses", ["121"])
+
+        version = parsecache.RESULT_VERSION
+        parsecache.RESULT_VERSION = version + 1
+        try:
+            self.assertRaises(KeyError, ParseCache(path=self.path).get_result, "a", "all_courses")
+        finally:
+            parsecache.RESULT_VERSION = version
+
+
+class ParserCacheTest(unittest.TestCase):
+
+    def test_same_page_is_parsed_once(self):
+        parser = SolusParser()
+        parser.cache = ParseCache(size=2, path=None)
+
+        parser.update_html(PAGE.format("abc", 1, ""))
+        first = parser.soup
+        self.assertEqual([x["abbreviation"] for x in parser.all_subjects()], ["CISC"])
+
+        # Returning to a page gives it new state tokens
+        parser.update_html(PAGE.format("abc", 2, "<p>Other</p>"))
+        parser.update_html(PAGE.format("abc", 3, ""))
+        self.assertIs(parser.soup, first)
+        self.assertEqual([x["abbreviation"] for x in parser.all_subjects()], ["CISC"])
+        self.assertEqual(parser.cache.stats["tree_hits"], 1)
+        self.assertEqual(parser.cache.stats["result_hits"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+"""
+Tests of the section data `SolusParser` extracts from saved pages (in `fixtures`).
+
+Usage: python -m pytest tests/test_parser.py
+"""
+
+import os
+import sys
+import unittest
+from datetime import date, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from parser import SolusParser
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def _parser(name):
+    with open(os.path.join(FIXTURES, name), "rb") as f:
+        parser = SolusParser()
+        parser.update_html(f.read(), "utf-8")
+    return parser
+
+
+class SectionDataTest(unittest.TestCase):
+
+    def test_catalog_sections(self):
+        sections = list(_parser("catalog_course.html").all_section_data())
+
+        self.assertEqual([x["_unique"] for x in sections], ["001-LEC (1234)", "002-LAB (1235)", "003-TUT (1236)"])
+        self.assertEqual(sections[0]["basic"], dict(solus_id="001", type="LEC", class_num="1234", status="Open"))
+        self.assertEqual([x["day_of_week"] for x in sections[0]["classes"]], [3, 1, 5])
+        self.assertEqual(sections[0]["classes"][0], dict(
+            day_of_week=3, start_time=time(8, 30), end_time=time(9, 50), location="Stirling Hall 401",
+            instructors=["Smith, John"], term_start=date(2013, 9, 9), term_end=date(2013, 11, 29)))
+        self.assertEqual(sections[1]["classes"][0]["day_of_week"], None)
+        self.assertEqual(sections[1]["classes"][0]["instructors"], [])
+        self.assertEqual(sections[2]["classes"][0]["instructors"], ["Lee, Ann", "Wong, Bob"])
+
+    def test_search_sections_match_the_catalog(self):
+        catalog = list(_parser("catalog_course.html").all_section_data())
+        search = list(_parser("search_results.html").all_search_sections())
+
+        self.assertEqual([number for number, section in search], ["121", "121", "121", "124"])
+        self.assertEqual([section for number, section in search if number == "121"], catalog)
+        self.assertEqual(search[3][1]["basic"]["class_num"], "1301")
+        self.assertEqual(search[3][1]["classes"][0]["instructors"], ["Tremblay, Marie Claire"])
+
+    def test_search_section_action(self):
+        parser = _parser("search_results.html")
+        self.assertEqual(parser.search_section_action("1236"), "MTG_CLASS_NBR$2")
+        self.assertEqual(parser.search_section_action("9999"), None)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+"""
+Tests of the phase timing of profiled jobs.
+
+Usage: python -m pytest tests/test_profiling.py
+"""
+
+import os
+import sys
+import json
+import glob
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import profiling
+from profiling import phase
+
+
+class PhaseTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.profile_dir = profiling.PROFILE_DIR
+        profiling.PROFILE_DIR = self.dir
+
+    def tearDown(self):
+        profiling.PROFILE_DIR = self.profile_dir
+        shutil.rmtree(self.dir)
+
+    def profile(self, func):
+        profiling.profile(func, "job", "sample")
+        with open(glob.glob(os.path.join(self.dir, "*.phases.json"))[0]) as f:
+            return json.load(f)
+
+    def test_nested_phases_are_exclusive(self):
+        def job():
+            with phase("network"):
+                time.sleep(0.05)
+                with phase("parse"):
+                    time.sleep(0.05)
+
+        phases = self.profile(job)
+        self.assertAlmostEqual(phases["network"], 0.05, delta=0.03)
+        self.assertAlmostEqual(phases["parse"], 0.05, delta=0.03)
+
+    def test_helper_threads_are_kept_apart(self):
+        def helper():
+            with phase("network"):
+                time.sleep(0.2)
+
+        def job():
+            # Like helper sessions, which request their pages while the job requests its own
+            threads = [threading.Thread(target=helper) for _ in range(3)]
+            for t in threads:
+                t.start()
+            with phase("network"):
+                time.sleep(0.2)
+            for t in threads:
+                t.join()
+
+        phases = self.profile(job)
+        self.assertLessEqual(sum(phases[x] for x in profiling.PHASES), phases["total"])
+        self.assertAlmostEqual(phases["network"], 0.2, delta=0.1)
+        self.assertAlmostEqual(phases["helpers"]["network"], 0.6, delta=0.15)
+
+        report = profiling.merge_reports(self.dir)
+        with open(report) as f:
+            self.assertIn("helper session threads", f.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
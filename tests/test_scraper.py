@@ -0,0 +1,162 @@
+"""
+Tests of what `SolusScraper` scrapes, with a stand-in session serving saved pages (in `fixtures`).
+
+Usage: python -m pytest tests/test_scraper.py
+"""
+
+import os
+import sys
+import shutil
+import zipfile
+import tempfile
+import unittest
+from collections import deque
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import writer
+import navigation
+from main import ScrapeJob
+from models import as_dict
+from navigation import SolusSession
+from parser import SolusParser
+from scraper import SolusScraper, _HandOff
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+SUBJECTS_PAGE = '<a id="DERIVED_SSS_BCC_GROUP_BOX_1$147$$0">CISC - Computing Science</a>'
+COURSES_PAGE = '<a id="CRSE_NBR$0">121</a>'
+SEARCH_PAGE = ('<select id="CLASS_SRCH_WRK2_STRM$35$"><option value=""></option>{0}</select>')
+
+
+def _fixture(name):
+    with open(os.path.join(FIXTURES, name), "rb") as f:
+        return f.read()
+
+
+class _FakeSession(object):
+    """Stands in for a `SolusSession`, loads the pages its navigation would lead to"""
+
+    request_count = recovery_count = 0
+    nav_map = None
+    latest_content = b""
+
+    def __init__(self, search_terms):
+        self.parser = SolusParser()
+        self.parse_cache = self.parser.cache
+        self.search_terms = search_terms
+        self.calls = []
+
+    def __getattr__(self, name):
+        def navigate(*args):
+            self.calls.append((name,) + args)
+            if name == "select_alphanum":
+                self.parser.update_html(SUBJECTS_PAGE)
+            elif name == "dropdown_subject":
+                self.parser.update_html(COURSES_PAGE)
+            elif name == "open_course":
+                self.parser.update_html(_fixture("catalog_course.html"), "utf-8")
+            elif name == "go_to_class_search":
+                self.parser.update_html(SEARCH_PAGE.format(u"".join(
+                    u'<option value="{0}">{1}</option>'.format(i, x) for i, x in enumerate(self.search_terms, 2000))))
+            elif name == "search_classes":
+                self.parser.update_html(_fixture("search_results.html"), "utf-8")
+                return True
+        return navigate
+
+
+class SearchEngineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sections = []
+        self.write_section = writer.write_section
+        self.others = writer.write_subject, writer.write_course
+        writer.write_section = lambda x: self.sections.append(as_dict(x))
+        writer.write_subject = writer.write_course = lambda x: None
+
+    def tearDown(self):
+        writer.write_section = self.write_section
+        writer.write_subject, writer.write_course = self.others
+
+    def scrape(self, search_terms):
+        session = _FakeSession(search_terms)
+        SolusScraper(session, ScrapeJob(letters="C", deep=False, engine="search")).start()
+        return session
+
+    def written(self):
+        return sorted((x["basic"]["year"], x["basic"]["season"], x["basic"]["course"], x["_unique"]) for x in self.sections)
+
+    def test_searchable_terms_come_from_the_search(self):
+        session = self.scrape(["2013 Fall"])
+
+        self.assertEqual([x for x in session.calls if x[0] == "switch_to_term"], [])
+        self.assertEqual(len([x for x in session.calls if x[0] == "search_classes"]), 1)
+        self.assertEqual(self.written(), [
+            ("2013", "Fall", "121", "001-LEC (1234)"),
+            ("2013", "Fall", "121", "002-LAB (1235)"),
+            ("2013", "Fall", "121", "003-TUT (1236)"),
+            ("2013", "Fall", "124", "001-LEC (1301)"),
+        ])
+
+    def test_other_terms_come_from_the_catalog(self):
+        # 2013 Fall isn't in the class search anymore
+        session = self.scrape(["2014 Winter"])
+
+        self.assertEqual([x for x in session.calls if x[0] == "switch_to_term"], [("switch_to_term", "2013 Fall")])
+        self.assertEqual([x[2:] for x in self.written() if x[:2] == ("2013", "Fall")], [
+            ("121", "001-LEC (1234)"),
+            ("121", "002-LAB (1235)"),
+            ("121", "003-TUT (1236)"),
+        ])
+        self.assertEqual(len([x for x in self.written() if x[:2] == ("2014", "Winter")]), 4)
+
+
+class _FailingHelper(SolusSession):
+    """A helper session (not logged in) that fails on the way to the course"""
+
+    def __init__(self, name):
+        self.name = name
+        self.history = deque([dict(method="POST", url="https://solus", status=200, action="CRSE_NBR$0",
+                                   start=0, elapsed=0, content=b"<html>course</html>")])
+
+    def go_to_location(self, location):
+        raise Exception("Data Integrity Error")
+
+
+class _Helpers(object):
+
+    def __init__(self, sessions):
+        self.sessions = list(sessions)
+
+    def discard(self, session):
+        self.sessions.remove(session)
+
+
+class HandOffTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.log_dir = navigation.LOG_DIR
+        navigation.LOG_DIR = self.dir
+
+    def tearDown(self):
+        navigation.LOG_DIR = self.log_dir
+        shutil.rmtree(self.dir)
+
+    def test_failed_helper_dumps_its_history(self):
+        helper = _FailingHelper(u"worker0-helper1")
+        helpers = _Helpers([helper])
+
+        # The worker visits the section itself
+        self.assertIsNone(_HandOff(helpers, helper, ["C", None, None, None], ["001-LEC (1234)"]).get("001-LEC (1234)"))
+        self.assertEqual(helpers.sessions, [])
+
+        dumps = os.listdir(self.dir)
+        self.assertEqual(len(dumps), 1)
+        self.assertTrue(dumps[0].endswith("_worker0-helper1.zip"))
+        with zipfile.ZipFile(os.path.join(self.dir, dumps[0])) as z:
+            self.assertEqual(z.read("00.html"), b"<html>course</html>")
+
+
+if __name__ == "__main__":
+    unittest.main()
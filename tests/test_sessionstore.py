@@ -0,0 +1,79 @@
+"""
+Tests of the encrypted session cookies saved between runs.
+
+Usage: python -m pytest tests/test_sessionstore.py
+"""
+
+import os
+import sys
+import stat
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from requests.cookies import RequestsCookieJar
+
+import sessionstore
+from sessionstore import SessionStore
+
+
+@unittest.skipIf(sessionstore.Fernet is None, "needs the cryptography package")
+class SessionStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        # Only slows the tests down
+        self.iterations = sessionstore.KDF_ITERATIONS
+        sessionstore.KDF_ITERATIONS = 1000
+
+        self.cookies = RequestsCookieJar()
+        self.cookies.set("PS_TOKEN", "secret-token", domain="saself.ps.queensu.ca", path="/")
+        self.cookies.set("JSESSIONID", "abc123", domain="my.queensu.ca", path="/", secure=True)
+
+    def tearDown(self):
+        sessionstore.KDF_ITERATIONS = self.iterations
+        shutil.rmtree(self.dir)
+
+    def store(self, user="user", password="pass", key=None):
+        return SessionStore(user, password, directory=self.dir, key=key)
+
+    def test_cookies_are_kept_between_runs(self):
+        self.store().save("worker0", self.cookies)
+
+        jar = self.store().load("worker0")
+        self.assertEqual(dict((c.name, (c.value, c.domain, c.secure)) for c in jar), {
+            "PS_TOKEN": ("secret-token", "saself.ps.queensu.ca", False),
+            "JSESSIONID": ("abc123", "my.queensu.ca", True),
+        })
+        self.assertIsNone(self.store().load("worker1"))
+
+    def test_saved_encrypted_for_the_user_only(self):
+        self.store().save("worker0", self.cookies)
+
+        filename = os.path.join(self.dir, "worker0.cookies")
+        with open(filename, "rb") as f:
+            self.assertNotIn(b"secret-token", f.read())
+        if os.name == "posix":
+            self.assertEqual(stat.S_IMODE(os.stat(filename).st_mode), 0o600)
+        self.assertEqual(os.listdir(self.dir), ["worker0.cookies"])
+
+    def test_not_loaded_with_other_credentials(self):
+        self.store().save("worker0", self.cookies)
+
+        self.assertIsNone(self.store(password="changed").load("worker0"))
+        self.assertIsNone(self.store(user="other").load("worker0"))
+
+        # The key is used instead of the password when it's set
+        self.store(key="k").save("worker0", self.cookies)
+        self.assertIsNotNone(self.store(password="changed", key="k").load("worker0"))
+
+    def test_disabled_without_a_directory(self):
+        store = SessionStore("user", "pass", directory=None)
+        store.save("worker0", self.cookies)
+        self.assertIsNone(store.load("worker0"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,16 +1,62 @@
 import requests
 import re
-import sys
+import time
 import logging
+from threading import Thread, Lock
+from requests.adapters import HTTPAdapter
+from requests.exceptions import RequestException
+try:
+    from queue import Queue, Empty
+except ImportError:
+    # Python 2.x
+    from Queue import Queue, Empty
 from writer import write_textbook
+from httpcache import HTTPCache
 from bs4 import BeautifulSoup
+try:
+    from lxml import html as lxml_html
+except ImportError:
+    lxml_html = None
+
+
+# Ids of the elements holding the information about each book on a course page
+BOOK_ID_PREFIX = "ctl00_ContentBody_ctl00_CourseBooksRepeater_ctl"
+BOOK_ID_FORMAT = BOOK_ID_PREFIX + "{0:02d}_test_{1}"
+BOOK_ID = re.compile("^" + BOOK_ID_PREFIX + r"(\d+)_test_(\w+)$")
 
 
 class TextbookScraper(object):
 
+    booklist_url = "http://www.campusbookstore.com/Textbooks/Booklists/"
+
     def __init__(self, config):
         self.config = config
 
+        # Number of pages to fetch at once and the minimum number of seconds between requests
+        self.config['concurrency'] = max(self.config.get('concurrency', 1), 1)
+        self.config['delay'] = self.config.get('delay', 0)
+
+        # Letters of the courses to get the books of
+        self.config['letters'] = self.config.get('letters') or "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+        # Seconds to wait to connect to the bookstore, and for each read of a response
+        self.config['timeout'] = self.config.get('timeout', (10, 60))
+
+        # Share connections between all the requests
+        self.session = requests.session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.config['concurrency'])
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        # For rate limiting
+        self._rate_lock = Lock()
+        self._next_request = 0
+
+        # Optional on-disk cache so unchanged pages aren't parsed and written again
+        self.cache = None
+        if self.config.get('cache_dir'):
+            self.cache = HTTPCache(self.config['cache_dir'], self.config.get('cache_size', 100 * 1024 * 1024))
+
     def num_available(self, s):
         if s:
             m = re.search(r"\((\d+)", s)
@@ -30,11 +76,39 @@ class TextbookScraper(object):
         logging.info("Starting textbook scrape")
 
         logging.info("Getting a list of courses")
-        r = requests.get("http://www.campusbookstore.com/Textbooks/Booklists/")
+        courses = self.course_links()
+
+        logging.info("Parsing courses")
+        for subject, course, link, text, commit in self.fetch_all(courses):
+
+            if text is None:
+                # Couldn't be fetched (already logged) or hasn't changed since the last scrape
+                continue
+
+            logging.info('Book for {} {}'.format(subject, course))
+
+            for textbook_attrs in self.parse_books(link, text):
+
+                write_textbook(subject, course, textbook_attrs)
+                try:
+                    logging.info("----Parsed book: {title} by {authors} ({isbn_13})".format(**textbook_attrs))
+                except:
+                    logging.info("----Parsed book.")
+
+            # Only now is it safe to skip the page next time if it doesn't change
+            commit()
+
+        if self.cache is not None:
+            logging.info("Cache: {0} fresh, {1} unchanged, {2} changed".format(self.cache.hits, self.cache.revalidated, self.cache.misses))
+
+    def course_links(self):
+        """Returns a list of (subject, course, link) tuples for the courses on the booklist page"""
+
+        text, changed, commit = self.fetch_text(self.booklist_url)
 
         logging.info("Got list...")
 
-        b = BeautifulSoup(r.text)
+        b = BeautifulSoup(text)
         content = b.find("div", {"class":"thecontent"})
         links  = content.find_all("a")
 
@@ -47,100 +121,208 @@ class TextbookScraper(object):
                 if m and m.group(1)[1].upper() in self.config['letters']:
                     temp.append((m.group(1), m.group(2), link.attrs["href"]))
 
-        logging.info("Parsing courses")
-        for subject, course, link in temp:
+        commit()
+        return temp
 
-            logging.info('Book for {} {}'.format(subject, course))
+    #-----------------------Fetching-----------------------------
 
-            response = requests.get(link)
-            b = BeautifulSoup(response.text)
-
-            # Looking at the page source, 49 books seems to be the limit (numbers padded the 2 digits)
-            for i in range (0, 99, 2):
-
-                book_id = "ctl00_ContentBody_ctl00_CourseBooksRepeater_ctl{:02d}_test_ModeFull".format(i)
-
-                book = b.find("div", {"id": book_id})
-                if not book:
-                    break
-
-                temp = book.find("table").find("table").find_all("td")[1]
-
-                textbook_attrs = {"listing_url": link + "#" + book_id}
-
-                # Title
-                title = temp.find("span", {"id": "ctl00_ContentBody_ctl00_CourseBooksRepeater_ctl{:02d}_test_BookTitle".format(i)}).string
-                textbook_attrs["title"] = title
-
-                # Authors
-                authors = temp.find("span", {"id": "ctl00_ContentBody_ctl00_CourseBooksRepeater_ctl{:02d}_test_BookAuthor".format(i)}).string
-                if authors and authors[:4] == " by ":
-                    textbook_attrs["authors"] = authors[4:]
-
-                # Required
-                required = temp.find("span", {"id": "ctl00_ContentBody_ctl00_CourseBooksRepeater_ctl{:02d}_test_StatusLabel".format(i)}).string
-                if required and "REQUIRED" in required.upper():
-                    textbook_attrs["required"] = True
-
-                # ISBN 13
-                isbn_13 = temp.find("span", {"id": "ctl00_ContentBody_ctl00_CourseBooksRepeater_ctl{:02d}_test_ISBN13Label".format(i)}).string
-                if isbn_13 and "[N/A]" in isbn_13:
-                    textbook_attrs["isbn_13"] = None
-                else:
-                    textbook_attrs["isbn_13"] = isbn_13
-
-                # ISBN 10
-                isbn_10 = temp.find("span", {"id": "ctl00_ContentBody_ctl00_CourseBooksRepeater_ctl{:02d}_test_ISBN10Label".format(i)}).string
-                if isbn_10 and "[N/A]" in isbn_10:
-                    textbook_attrs["isbn_10"] = None
-                else:
-                    textbook_attrs["isbn_10"] = isbn_10
-
-                # New data
-                new_price = self.price(temp.find("span", {"id": "ctl00_ContentBody_ctl00_CourseBooksRepeater_ctl{:02d}_test_NewPriceLabel".format(i)}).string)
-                new_available = self.num_available(temp.find("span", {"id": "ctl00_ContentBody_ctl00_CourseBooksRepeater_ctl{:02d}_test_NewAvailabilityLabel".format(i)}).string)
-                if new_price:
-                    textbook_attrs["new_price"] = new_price
-                if new_available:
-                    textbook_attrs["new_available"] = new_available
-
-                # Used data
-                used_price = self.price(temp.find("span", {"id": "ctl00_ContentBody_ctl00_CourseBooksRepeater_ctl{:02d}_test_UsedPriceLabel".format(i)}).string)
-                used_available = self.num_available(temp.find("span", {"id": "ctl00_ContentBody_ctl00_CourseBooksRepeater_ctl{:02d}_test_UsedAvailabilityLabel".format(i)}).string)
-                if used_price:
-                    textbook_attrs["used_price"] = used_price
-                if used_available:
-                    textbook_attrs["used_available"] = used_available
-
-                # Classifieds info
-                classified_info = temp.find("a", {"id": "ctl00_ContentBody_ctl00_CourseBooksRepeater_ctl{:02d}_test_ClassifiedsLabel".format(i)}).string
-                if classified_info:
-                    textbook_attrs["classified_info"] = classified_info
-
-                # Add the textbook
-                if textbook_attrs["isbn_10"] or textbook_attrs["isbn_13"]:
-
-                    write_textbook(subject, course, textbook_attrs)
-                    try:
-                        logging.info("----Parsed book: {title} by {authors} ({isbn_13})".format(**textbook_attrs))
-                    except:
-                        logging.info("----Parsed book.")
+    def fetch(self, url, headers=None):
+        """GETs a url using the shared connection pool, waiting for a turn if rate limited"""
 
+        with self._rate_lock:
+            now = time.time()
+            wait = self._next_request - now
+            self._next_request = max(now, self._next_request) + self.config['delay']
 
-if __name__ == '__main__':
+        if wait > 0:
+            time.sleep(wait)
+
+        return self.session.get(url, headers=headers, timeout=self.config['timeout'])
 
-    root_logger = logging.getLogger()
+    def fetch_text(self, url):
+        """
+        GETs the text of a url, through the cache if there is one.
+        Returns a (text, changed, commit) tuple, see `HTTPCache.get`.
+        `changed` is always True without a cache.
+        """
+        if self.cache is not None:
+            return self.cache.get(self.fetch, url)
+
+        response = self.fetch(url)
+        response.raise_for_status()
+        return response.text, True, lambda: None
+
+    def fetch_all(self, courses):
+        """
+        Fetches the course pages using `concurrency` worker threads.
+
+        Yields (subject, course, link, text, commit) tuples in the order the pages finish downloading.
+        `text` is None if the page couldn't be fetched or hasn't changed since it was cached.
+        `commit()` has to be called once the page is written out (see `HTTPCache.get`).
+        """
+
+        if self.config['concurrency'] == 1:
+            for subject, course, link in courses:
+                yield (subject, course, link) + self._fetch_course_page(link)
+            return
+
+        todo = Queue()
+        for x in courses:
+            todo.put_nowait(x)
+
+        # Bounded so that fetching can't get too far ahead of parsing
+        done = Queue(maxsize=self.config['concurrency'] * 2)
+
+        def worker():
+            while True:
+                try:
+                    subject, course, link = todo.get_nowait()
+                except Empty:
+                    return
+                done.put((subject, course, link) + self._fetch_course_page(link))
+
+        for x in range(self.config['concurrency']):
+            t = Thread(target=worker, name="TextbookFetcher-{0}".format(x))
+            t.daemon = True
+            t.start()
+
+        for x in range(len(courses)):
+            yield done.get()
+
+    def _fetch_course_page(self, link):
+        """Returns the (text, commit) of a course page, text is None if there's nothing to parse"""
+        try:
+            text, changed, commit = self.fetch_text(link)
+        except RequestException as e:
+            logging.error(u"Couldn't fetch {0}: {1}".format(link, e))
+            return None, None
+        except Exception as e:
+            # Don't let a worker thread die without reporting back
+            logging.exception(u"Unexpected error fetching {0}".format(link))
+            return None, None
+
+        if not changed:
+            logging.debug(u"{0} hasn't changed, skipping it".format(link))
+            return None, None
+        return text, commit
+
+    #-----------------------Parsing-----------------------------
+
+    def parse_books(self, link, text):
+        """Yields the attributes of the textbooks on a course page"""
+
+        fields = self.book_fields(text)
+
+        # Looking at the page source, 49 books seems to be the limit (numbers padded the 2 digits)
+        for i in range (0, 99, 2):
+
+            if (i, "ModeFull") not in fields:
+                break
+
+            book_id = BOOK_ID_FORMAT.format(i, "ModeFull")
+
+            textbook_attrs = {"listing_url": link + "#" + book_id}
+
+            # Title
+            textbook_attrs["title"] = fields.get((i, "BookTitle"))
+
+            # Authors
+            authors = fields.get((i, "BookAuthor"))
+            if authors and authors[:4] == " by ":
+                textbook_attrs["authors"] = authors[4:]
+
+            # Required
+            required = fields.get((i, "StatusLabel"))
+            if required and "REQUIRED" in required.upper():
+                textbook_attrs["required"] = True
+
+            # ISBN 13
+            isbn_13 = fields.get((i, "ISBN13Label"))
+            if isbn_13 and "[N/A]" in isbn_13:
+                textbook_attrs["isbn_13"] = None
+            else:
+                textbook_attrs["isbn_13"] = isbn_13
+
+            # ISBN 10
+            isbn_10 = fields.get((i, "ISBN10Label"))
+            if isbn_10 and "[N/A]" in isbn_10:
+                textbook_attrs["isbn_10"] = None
+            else:
+                textbook_attrs["isbn_10"] = isbn_10
+
+            # New data
+            new_price = self.price(fields.get((i, "NewPriceLabel")))
+            new_available = self.num_available(fields.get((i, "NewAvailabilityLabel")))
+            if new_price:
+                textbook_attrs["new_price"] = new_price
+            if new_available:
+                textbook_attrs["new_available"] = new_available
+
+            # Used data
+            used_price = self.price(fields.get((i, "UsedPriceLabel")))
+            used_available = self.num_available(fields.get((i, "UsedAvailabilityLabel")))
+            if used_price:
+                textbook_attrs["used_price"] = used_price
+            if used_available:
+                textbook_attrs["used_available"] = used_available
+
+            # Classifieds info
+            classified_info = fields.get((i, "ClassifiedsLabel"))
+            if classified_info:
+                textbook_attrs["classified_info"] = classified_info
+
+            # Add the textbook
+            if textbook_attrs["isbn_10"] or textbook_attrs["isbn_13"]:
+                yield textbook_attrs
+
+    def book_fields(self, text):
+        """
+        Returns a dict mapping (book index, field) to the string in the element
+        for every book element on the page (ids matching `BOOK_ID`).
+
+        The page is only traversed once, using lxml if it's availible.
+        """
+
+        fields = {}
+
+        if lxml_html is not None:
+            try:
+                root = lxml_html.fromstring(text)
+            except ValueError:
+                # lxml refuses unicode strings with an encoding declaration
+                root = lxml_html.fromstring(text.encode("utf-8"))
+
+            for el in root.xpath('//*[starts-with(@id, "{0}")]'.format(BOOK_ID_PREFIX)):
+                m = BOOK_ID.match(el.get("id"))
+                if m:
+                    fields[(int(m.group(1)), m.group(2))] = _lxml_string(el)
 
-    handler = logging.StreamHandler(sys.stdout)
-    handler.setFormatter(logging.Formatter("[%(asctime)s][%(levelname)s][%(processName)s]: %(message)s"))
+        else:
+            b = BeautifulSoup(text, "html.parser")
+            for el in b.find_all(id=BOOK_ID):
+                m = BOOK_ID.match(el["id"])
+                fields[(int(m.group(1)), m.group(2))] = el.string
+
+        return fields
+
+
+def _lxml_string(el):
+    """The equivalent of BeautifulSoup's `.string` for lxml elements"""
+    if len(el) == 0:
+        return el.text
+    if len(el) == 1 and not el.text and not el[0].tail:
+        return _lxml_string(el[0])
+    return None
+
+
+if __name__ == '__main__':
 
-    root_logger.addHandler(handler)
-    root_logger.setLevel(logging.INFO)
+    from main import TextbookJob, _init_logging
 
-    logging.getLogger("requests").setLevel(logging.WARNING)
+    event_log = _init_logging()
 
-    config = dict(
-        letters='ABCDEFGHIJKLMNOPQRSTUVWXYZ'
-    )
-    scraper = TextbookScraper(config)
-    scraper.scrape()
+    try:
+        scraper = TextbookScraper(dict(TextbookJob()))
+        scraper.scrape()
+    finally:
+        event_log.close()
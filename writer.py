@@ -4,6 +4,8 @@ import os
 from os import path
 
 from config import OUTPUT_DIR
+from models import as_dict
+from profiling import phase
 
 
 def json_datetime_dump(obj):
@@ -33,6 +35,8 @@ def out_path(dirname):
 
 def write_course(course):
 
+    course = as_dict(course)
+
     # Merge the basic and extra information into a single dict
     # I should probably just do this at a lower level, but this works too
     merged_course = course['basic'].copy()
@@ -45,13 +49,24 @@ def write_course(course):
 
 def write_subject(subject):
 
+    subject = as_dict(subject)
+
     filename = '{abbreviation}.json'.format(**subject)
 
     write_json_file(subject, filename, 'subjects')
 
 
+def write_census_subject(subject):
+
+    filename = '{abbreviation}.json'.format(**subject)
+
+    write_json_file(subject, filename, 'census')
+
+
 def write_section(section):
 
+    section = as_dict(section)
+
     merged_section = section['basic']
 
     filename = '{year}_{season}_{subject}_{course}_({solus_id}).json'.format(**merged_section)
@@ -73,6 +88,9 @@ def write_textbook(subject, course, textbook):
         # The file already exists, add this course
         with open(filepath, 'r+t') as f:
             oldtextbook = json.loads(f.read())
+            if course_id in oldtextbook['courses']:
+                # Already recorded by a previous scrape
+                return
             oldtextbook['courses'].append(course_id)
             f.seek(0)
             f.write(json.dumps(oldtextbook, indent=4, sort_keys=True))
@@ -88,5 +106,9 @@ def write_json_file(obj, filename, output_dir):
 
     out = out_path(output_dir)
 
-    with open(os.path.join(out, filename), 'w') as f:
-        f.write(json.dumps(obj, indent=4, default=json_datetime_dump, sort_keys=True))
+    with phase("serialize"):
+        text = json.dumps(obj, indent=4, default=json_datetime_dump, sort_keys=True)
+
+    with phase("disk"):
+        with open(os.path.join(out, filename), 'w') as f:
+            f.write(text)